@@ -26,4 +26,16 @@ NCCA_DIR = os.path.join(HOME_DIR, ".ncca")
 NCCA_KEY_PATH = os.path.join(HOME_DIR, ".ncca_key")
 
 # The NCCA_ENV_PATH holds the users encypted login info. See /ncca_shelftools/ncca_renderfarm/login.py and /ncca_shelftools/ncca_renderfarm/crypt.py for more info.
-NCCA_ENV_PATH = os.path.join(HOME_DIR, ".ncca_env")
\ No newline at end of file
+NCCA_ENV_PATH = os.path.join(HOME_DIR, ".ncca_env")
+
+# The NCCA_IGNORE_PATH holds the user's own ignore patterns, used for every project they upload. See /ncca_shelftools/utils/ignore.py for more info.
+NCCA_IGNORE_PATH = os.path.join(HOME_DIR, ".nccaignore")
+
+# The BROKER_INFO_PATH holds the port and token of the connection broker, readable only by the user. See /ncca_shelftools/utils/broker.py for more info.
+BROKER_INFO_PATH = os.path.join(HOME_DIR, ".ncca_broker")
+
+# The NCCA_LISTING_CACHE_PATH holds the farm folder listings cached by the viewer. See /ncca_shelftools/utils/listing_cache.py for more info.
+NCCA_LISTING_CACHE_PATH = os.path.join(NCCA_DIR, "listing_cache.db")
+
+# The NCCA_PROFILE_DIR holds the startup reports written in profiling mode. See /ncca_shelftools/profiling.py for more info.
+NCCA_PROFILE_DIR = os.path.join(NCCA_DIR, "profiles")
\ No newline at end of file
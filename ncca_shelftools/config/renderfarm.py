@@ -5,6 +5,84 @@ RENDERFARM_PORT = 22
 
 MAX_CONNECTION_ATTEMPTS = 3
 
+# CONNECT_TIMEOUT is the number of seconds to wait for the renderfarm to answer, for both the TCP connection and the SSH key exchange.
+# AUTH_TIMEOUT is the number of seconds to wait for the renderfarm to accept or reject the username and password.
+# Failed connections are tried again after CONNECTION_BACKOFF seconds, doubling after each attempt up to CONNECTION_BACKOFF_MAX, with some random jitter.
+CONNECT_TIMEOUT = 10
+AUTH_TIMEOUT = 15
+CONNECTION_BACKOFF = 1.0
+CONNECTION_BACKOFF_MAX = 8.0
+
+# One connection is shared by every tool in a Maya or Houdini session, see /ncca_shelftools/utils/sftp_session.py
+# SESSION_KEEPALIVE_INTERVAL is the number of seconds between keepalive messages, so an idle connection isn't closed by the renderfarm.
+# SESSION_POOL_SIZE is the number of spare SFTP channels kept open for uploads and downloads.
+SESSION_KEEPALIVE_INTERVAL = 30
+SESSION_POOL_SIZE = 4
+
+# With BROKER_ENABLED, the first login also starts a broker process that keeps the connection open for Maya and Houdini at the same time, see /ncca_shelftools/utils/broker.py
+# BROKER_IDLE_TIMEOUT is the number of seconds without any tool connected before the broker stops.
+# BROKER_CONNECT_TIMEOUT is the number of seconds to wait for the broker to answer, before logging in without it.
+BROKER_ENABLED = False
+BROKER_IDLE_TIMEOUT = 3600
+BROKER_CONNECT_TIMEOUT = 1.0
+
+# UPLOAD_WORKERS is the number of SFTP channels opened on the login connection when uploading a project.
+# Each channel uploads one file at a time, so more workers hide more network latency. Keep it small, the farm has a limit on open channels per connection.
+UPLOAD_WORKERS = 4
+
+# When a project is re-submitted, only the files that changed since the last upload are sent. The state of the last upload is kept in a manifest file next to the remote project.
+# UPLOAD_MANIFEST_HASH also stores a content hash of each file, so files that were touched but not changed (e.g. re-saved or copied) are not uploaded again. This is slower, as every file has to be read.
+UPLOAD_MANIFEST_SUFFIX = ".ncca_manifest"
+UPLOAD_MANIFEST_HASH = False
+
+# Projects made of many small files upload faster as a single archive, streamed straight into 'tar -x' on the farm.
+# Archive uploads are used automatically when there are at least ARCHIVE_UPLOAD_MIN_FILES files, and the average file is smaller than ARCHIVE_UPLOAD_MAX_AVERAGE_SIZE bytes.
+ARCHIVE_UPLOAD_MIN_FILES = 200
+ARCHIVE_UPLOAD_MAX_AVERAGE_SIZE = 1024 * 1024
+
+# Downloads request blocks ahead of time, so the network stays busy while earlier blocks are written to disk.
+# Partial downloads are kept as '.part' files, and are resumed up to DOWNLOAD_RETRIES times if the connection drops.
+# A '.part' file is only resumed if the remote file hasn't changed since it was started. See /ncca_shelftools/utils/sftp_transfer.py for more info.
+DOWNLOAD_BLOCK_SIZE = 32768
+DOWNLOAD_RETRIES = 3
+
+# The farm viewer lists a folder it hasn't cached, and every folder inside it, with a single 'find' on the renderfarm, instead of one request per folder.
+# Set VIEWER_SCAN_TREE to False to only list folders over SFTP as they are expanded. See /ncca_shelftools/utils/sftp_exec.py for more info.
+VIEWER_SCAN_TREE = True
+
+# Files with these extensions are already compressed, so compressing them again wastes time. The archive is only compressed if most of its bytes are in other files.
+ARCHIVE_COMPRESSED_EXTENSIONS = [
+    ".exr", ".png", ".jpg", ".jpeg", ".rat", ".tx", ".tex",
+    ".sc", ".gz", ".zip", ".7z", ".bz2", ".xz", ".vdb",
+    ".mp4", ".mov", ".mp3"
+]
+
+# Files and folders matching these patterns are never uploaded. Projects can add their own patterns in a UPLOAD_IGNORE_FILE at the top of the project folder.
+# See /ncca_shelftools/utils/ignore.py for the pattern syntax.
+UPLOAD_IGNORE_DEFAULTS = [
+    "backup",
+    "__pycache__",
+    ".mayaSwatches",
+    ".DS_Store",
+    "Thumbs.db"
+]
+UPLOAD_IGNORE_FILE = ".nccaignore"
+
+# With UPLOAD_OBJECT_STORE, every uploaded file is stored once in /home/username/farm/OBJECT_STORE_DIR, named after the hash of its contents.
+# Projects are made of links to the stored files, so files shared between projects are only uploaded once. See /ncca_shelftools/utils/sftp_objects.py for more info.
+# OBJECT_STORE_LINK can be 'hardlink' or 'symlink'. Renders must not write into their input files, as the stored file would change for every project.
+UPLOAD_OBJECT_STORE = False
+OBJECT_STORE_DIR = ".objects"
+OBJECT_STORE_LINK = "hardlink"
+
+# Stored files are only cleaned up once they haven't been uploaded or reused for OBJECT_STORE_GC_GRACE minutes, so deleting a project in the viewer
+# never removes a file that an upload running at the same time is about to link. See /ncca_shelftools/utils/sftp_objects.py for more info.
+OBJECT_STORE_GC_GRACE = 1440
+
+# When only the scene files are uploaded, file sequences (e.g. geo.$F4.bgeo.sc) are limited to the frames being rendered.
+# DEPENDENCY_FRAME_HANDLES extra frames either side of each rendered frame are uploaded too, for motion blur and sims that read neighbouring frames.
+DEPENDENCY_FRAME_HANDLES = 1
+
 # DEFAULT_CPU_USAGE can be left at 2, but if more CPUS are added to the renderfarm make sure to increase MAX_CPUS.
 DEFAULT_CPU_USAGE = 2
 MAX_CPUS = 8
@@ -12,6 +12,30 @@ SUPPORTED_IMAGE_FORMATS = [
     ".tif",
 ] + SUPPORTED_EXR_IMAGE_FORMATS
 
+# STARTUP_IMPORT_BUDGET is the most time, in seconds, that importing config, utils and ncca_renderfarm may take when a shelf button is clicked.
+# PySide2 is not counted, as Maya and Houdini have already imported it. See 'Startup Time' in DEVEL.md for how to measure it.
+STARTUP_IMPORT_BUDGET = 0.1
+
+# VIEWER_FETCH_BATCH_SIZE is the number of files first added to the viewer's tree when a folder has been listed. The rest are added in growing batches, so large render folders don't freeze the viewer.
+# See /ncca_shelftools/ncca_renderfarm/viewer/qfarmsystemmodel.py for more info.
+VIEWER_FETCH_BATCH_SIZE = 1000
+
+# The viewer shows numbered files, such as rendered frames, as a single sequence when a folder has at least VIEWER_SEQUENCE_MIN_FRAMES of them.
+# See /ncca_shelftools/utils/sequences.py for more info.
+VIEWER_SEQUENCE_MIN_FRAMES = 3
+
+# In watch mode, the viewer checks the expanded and pinned folders for new files every VIEWER_WATCH_MIN_INTERVAL seconds.
+# Each check that finds nothing doubles the wait, up to VIEWER_WATCH_MAX_INTERVAL seconds, and a check that finds something resets it.
+# The new frames per second readout counts the files added in the last VIEWER_WATCH_RATE_WINDOW seconds.
+# See /ncca_shelftools/ncca_renderfarm/viewer/ncca_renderfarm_viewer.py for more info.
+VIEWER_WATCH_MIN_INTERVAL = 2.0
+VIEWER_WATCH_MAX_INTERVAL = 30.0
+VIEWER_WATCH_RATE_WINDOW = 60.0
+
+# LISTING_CACHE_MAX_SIZE is the most disk space, in bytes, used by the viewer's cache of farm folder listings. The least recently used listings are removed first.
+# See /ncca_shelftools/utils/listing_cache.py for more info.
+LISTING_CACHE_MAX_SIZE = 32 * 1024 * 1024
+
 # All available render engines for Maya
 # Some render engines are excluded as the NCCA does not use them. (they also don't work)
 # "Hardware Renderer" : "hw2"
@@ -35,6 +59,27 @@ MAYA_FILE_EXTENSIONS = {
     "Maya": "maya"
 }
 
+# Houdini parameters that write files rather than read them. The files they point to are render outputs, so they are never uploaded.
+# Other parameters are uploaded, even on nodes in the /out (Driver) context, as render nodes can read files too (e.g. include files).
+# See /ncca_shelftools/ncca_for_houdini/submit_hou.py for more info.
+HOUDINI_OUTPUT_PARMS = [
+    "sopoutput",
+    "dopoutput",
+    "lopoutput",
+    "copoutput",
+    "vm_picture",
+    "vm_dcmfilename",
+    "soho_diskfile",
+    "picture",
+    "outputimage"
+]
+
+# Parameters that only write files on nodes in the /out (Driver) context, e.g. the Alembic ROP's output file.
+# On other nodes they may read files, so they are only skipped on Driver nodes. See /ncca_shelftools/ncca_for_houdini/submit_hou.py for more info.
+HOUDINI_DRIVER_OUTPUT_PARMS = [
+    "filename"
+]
+
 
 # QUBE_PY_PATH contains the path to the qb python module. Be aware that on Windows you must install Qube from Apps Anywhere before running.
 # See /ncca_shelftools/ncca_renderfarm/submit.py for more info.
@@ -28,6 +28,21 @@ QUBE_PY_ERROR = {
     "message" : "Qb could not be found! Make sure that you have installed Qube from Apps Anywhere. If you are on Linux, or this issue continues to occur, please report a bug or contact the NCCA admin. \n\nError: {}" 
 }
 
+UPLOAD_ERROR = {
+    "title" : "Upload Error",
+    "message" : "{} file(s) failed to upload to the NCCA Renderfarm, so the job was not submitted. Please try submitting again. \n\n{}"
+}
+
+UPLOAD_CANCELLED_MESSAGE = {
+    "title" : "Upload Cancelled",
+    "message" : "The upload of '{}' was cancelled and the job was not submitted. The files that were already uploaded have been kept, so submitting again with 'Only Upload Changes' ticked will continue from where it stopped."
+}
+
+DOWNLOAD_ERROR = {
+    "title" : "Download Error",
+    "message" : "'{}' could not be downloaded from the NCCA Renderfarm. Please try again. \n\nError: {}"
+}
+
 IMAGE_ERROR = {
     "title" : "Image Error",
     "message" : "Error converting {} to .png"
@@ -41,6 +56,18 @@ NCCA_SUBMIT_MESSAGE = {
     "message" : "'{}' has been successfully added to the NCCA Renderfarm! \n\nID: {}"
 }
 
+NCCA_SUBMIT_BYTES_AVOIDED_MESSAGE = "\n\nOnly the scene files were uploaded, {} of unused project files were skipped."
+
+DEPENDENCIES_OUTSIDE_DIALOG = {
+    "title" : "Files Outside Project",
+    "message" : "{} file(s) used by the scene are outside of the project folder, so they won't be uploaded to the NCCA Renderfarm. Do you wish to submit anyway? \n\n{}"
+}
+
+DEPENDENCIES_MISSING_DIALOG = {
+    "title" : "Missing Files",
+    "message" : "{} file(s) used by the scene could not be found, so they won't be uploaded to the NCCA Renderfarm. Do you wish to submit anyway? \n\n{}"
+}
+
 OVERRIDE_DIALOG = {
     "title" : "Confirm Override",
     "message" : "A project with the job name '{}' already exists. Do you wish to override this project?"
@@ -52,6 +79,35 @@ DELETE_DIALOG = {
 }
 
 
+# STATUS MESSAGES
+# These are shown in the status bar of the renderfarm viewer
+NCCA_VIEWER_DELETING_STATUS = "Deleting '{}'..."
+NCCA_VIEWER_DELETED_STATUS = "Deleted '{}'"
+NCCA_VIEWER_DELETE_FAILED_STATUS = "Failed to delete '{}'"
+NCCA_VIEWER_WATCH_STATUS = "Watching {} folders, {:.1f} new frames/s"
+
+
+# PROGRESS MESSAGES
+# These are shown in the progress dialog while a project is uploaded and submitted
+NCCA_UPLOAD_DIALOG_TITLE = "NCCA Renderfarm Upload"
+NCCA_UPLOAD_STAGE_DELETING = "Removing the old project from the farm..."
+NCCA_UPLOAD_STAGE_CHECKING = "Checking for changes..."
+NCCA_UPLOAD_STAGE_REMOVING = "Removing deleted files from the farm..."
+NCCA_UPLOAD_STAGE_HASHING = "Checking for files already on the farm..."
+NCCA_UPLOAD_STAGE_UPLOADING = "Uploading..."
+NCCA_UPLOAD_STAGE_SUBMITTING = "Submitting the job..."
+NCCA_UPLOAD_STAGE_CANCELLING = "Cancelling, finishing the current files..."
+NCCA_UPLOAD_PROGRESS = "{}\n\n{} of {} files\n{} of {} ({}/s)\nTime left: {}"
+NCCA_UPLOAD_CANCEL_LABEL = "Cancel"
+
+# These are shown in the login dialog while connecting to the renderfarm
+NCCA_LOGIN_STAGE_LOOKUP = "Looking up {}..."
+NCCA_LOGIN_STAGE_CONNECTING = "Connecting to {}..."
+NCCA_LOGIN_STAGE_HANDSHAKE = "Securing the connection..."
+NCCA_LOGIN_STAGE_AUTHENTICATING = "Logging in..."
+NCCA_LOGIN_STAGE_RETRYING = "Connection failed, trying again in {:.1f} seconds (attempt {} of {})..."
+
+
 # LABELS
 # These are the Labels that go alongside certain elements
 NCCA_LOGIN_DIALOG_TITLE = "NCCA Renderfarm Login"
@@ -64,8 +120,15 @@ NCCA_VIEWER_DIALOG_TITLE = "NCCA Renderfarm Viewer"
 NCCA_VIEWER_ACTION_OPEN_LABEL = "Open"
 NCCA_VIEWER_ACTION_DOWNLOAD_LABEL = "Download"
 NCCA_VIEWER_ACTION_DELETE_LABEL = "Delete"
+NCCA_VIEWER_ACTION_PIN_LABEL = "Pin"
+NCCA_VIEWER_ACTION_UNPIN_LABEL = "Unpin"
+NCCA_VIEWER_WATCH_LABEL = "Watch"
+NCCA_VIEWER_WATCH_TOOLTIP = "Check the expanded and pinned folders for new files while a job renders"
 NCCA_VIEWER_FILE_PROMPT="Save File As"
 NCCA_VIEWER_FOLDER_PROMPT="Select Destination Folder"
+NCCA_VIEWER_LOADING_LABEL = "Loading…"
+NCCA_VIEWER_SEQUENCE_LABEL = "{} [{}-{}]"
+NCCA_VIEWER_SEQUENCE_MISSING_LABEL = "{} [{}-{}, {} missing]"
 
 NCCA_SUBMIT_DIALOG_TITLE = "NCCA Renderfarm Submit Tool"
 NCCA_SUBMIT_PROJECTNAME_LABEL="Project Name"
@@ -76,6 +139,8 @@ NCCA_SUBMIT_PROJECTFOLDER_CAPTION = "Choose Folder on Farm"
 NCCA_SUBMIT_STARTFRAME_LABEL="Start Frame"
 NCCA_SUBMIT_ENDFRAME_LABEL="End Frame"
 NCCA_SUBMIT_BYFRAME_LABEL="By Frame"
+NCCA_SUBMIT_INCREMENTAL_LABEL="Only Upload Changes"
+NCCA_SUBMIT_DEPENDENCIES_LABEL="Only Upload Scene Files"
 NCCA_SUBMIT_CLOSE_LABEL="Close"
 NCCA_SUBMIT_SUBMIT_LABEL="Submit"
 
@@ -97,6 +162,8 @@ NCCA_SUBMIT_PROJECTFOLDER_TOOLTIP = "Select the project folder to upload. Make s
 NCCA_SUBMIT_STARTFRAME_TOOLTIP = "Start frame for rendering, set from settings but can be changed here."
 NCCA_SUBMIT_ENDFRAME_TOOLTIP = "End frame for rendering, set from settings but can be changed here."
 NCCA_SUBMIT_BYFRAME_TOOLTIP = "Frame step for rendering, set from settings but can be changed here."
+NCCA_SUBMIT_INCREMENTAL_TOOLTIP = "If the project is already on the farm, only upload the files that have changed since the last submit. Untick this to upload the whole project again."
+NCCA_SUBMIT_DEPENDENCIES_TOOLTIP = "Only upload the files that the scene uses (caches, textures, references), instead of the whole project folder. Leave this unticked if the render needs files that the scene doesn't reference directly."
 NCCA_SUBMIT_CLOSE_TOOLTIP = "Close the submit dialog."
 NCCA_SUBMIT_SUBMIT_TOOLTIP = "Submit job to the NCCA Renderfarm."
 
@@ -0,0 +1 @@
+import profiling  # Imported first, so profiling mode can time the imports of the other modules
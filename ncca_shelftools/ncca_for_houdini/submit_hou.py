@@ -5,8 +5,10 @@ import re
 from PySide2 import QtCore, QtWidgets
 
 from config import *
-from ncca_renderfarm.login import RenderFarmLoginDialog
+from utils import SEQUENCE_TOKEN_PATTERN, is_inside
+from ncca_renderfarm.login import login
 from ncca_renderfarm.submit import RenderFarmSubmitDialog
+import profiling
 
 class Houdini_RenderFarmSubmitDialog(RenderFarmSubmitDialog):
     """"""
@@ -79,6 +81,58 @@ class Houdini_RenderFarmSubmitDialog(RenderFarmSubmitDialog):
 
         super().submit_project(command=full_command)
 
+    def collect_dependencies(self):
+        """
+        List the files that the hip file reads, from hou.fileReferences().
+
+        Returns:
+        - list: The hip file, every file referenced by a parameter, and any digital assets saved in the project folder.
+        """
+        dependencies = [hou.hipFile.path()]
+
+        for parm, path in hou.fileReferences():
+            # op: paths point to other nodes, not files on disk
+            if not path or path.startswith("op:"):
+                continue
+
+            # Render outputs are written by the farm, so they don't need uploading. Other parameters of render nodes are kept, as they may read files
+            if parm is not None:
+                if parm.name() in HOUDINI_OUTPUT_PARMS:
+                    continue
+                if parm.name() in HOUDINI_DRIVER_OUTPUT_PARMS and parm.node().type().category() == hou.driverNodeTypeCategory():
+                    continue
+
+            dependencies.append(self.expand_path(path))
+
+        for hda_file in hou.hda.loadedFiles():
+            if is_inside(hda_file, self.project_path.text()):
+                dependencies.append(hda_file)
+
+        return dependencies
+
+    def expand_path(self, path):
+        """
+        Expand the Houdini variables in a file path, such as $HIP or $JOB, but keep the frame and UDIM tokens so the whole sequence is found.
+
+        Args:
+        - path (str): The unexpanded file path.
+
+        Returns:
+        - str: The expanded file path.
+        """
+        tokens = []
+        def protect(match):
+            tokens.append(match.group(0))
+            return f"__NCCA_TOKEN_{len(tokens) - 1}__"
+
+        path = hou.text.expandString(SEQUENCE_TOKEN_PATTERN.sub(protect, path))
+        path = re.sub(r"__NCCA_TOKEN_(\d+)__", lambda match: tokens[int(match.group(1))], path)
+
+        if not os.path.isabs(path):
+            path = os.path.join(str(hou.getenv("HIP")), path)
+
+        return path
+
     def select_project_path(self):        
         folder_path=hou.ui.selectFile(
             start_directory=os.path.dirname(str(hou.getenv("HIP"))),
@@ -126,10 +180,10 @@ class Houdini_RenderFarmSubmitDialog(RenderFarmSubmitDialog):
 
 def main():
     if os.path.exists(QUBE_PYPATH.get(OPERATING_SYSTEM)):        
-        login_dialog = RenderFarmLoginDialog()
-        if login_dialog.exec_() == QtWidgets.QDialog.Accepted:
-            login_info = login_dialog.get_login_info()
-            dialog = Houdini_RenderFarmSubmitDialog(info=login_info)
+        login_info = login()
+        if login_info is not None:
+            with profiling.section("Houdini_RenderFarmSubmitDialog", "dialog"):
+                dialog = Houdini_RenderFarmSubmitDialog(info=login_info)
             dialog.setParent(hou.qt.mainWindow(), QtCore.Qt.Window)
             dialog.show()
     else:
@@ -7,7 +7,8 @@ import re
 from config import *
 
 from ncca_renderfarm.submit import RenderFarmSubmitDialog
-from ncca_renderfarm.login import RenderFarmLoginDialog
+from ncca_renderfarm.login import login
+import profiling
 from utils import get_maya_window
 
 class Maya_RenderFarmSubmitDialog(RenderFarmSubmitDialog):
@@ -177,6 +178,35 @@ class Maya_RenderFarmSubmitDialog(RenderFarmSubmitDialog):
 
         super().submit_project(command)
 
+    def collect_dependencies(self):
+        """
+        List the files that the Maya scene reads, from its references, file texture nodes and the file path editor.
+
+        Returns:
+        - list: The scene file, and every file or file pattern it uses.
+        """
+        dependencies = [cmds.file(q=True, sn=True)]
+
+        # References and the other files Maya knows the scene uses. Reference paths can end with a copy number, e.g. {1}
+        dependencies += [re.sub(r"\{\d+\}$", "", path) for path in cmds.file(q=True, list=True) or []]
+
+        # The pattern keeps the <UDIM> and <f> tokens, so every tile and frame of a texture is found
+        for node in cmds.ls(type="file") or []:
+            dependencies.append(cmds.getAttr(f"{node}.computedFileTextureNamePattern") or cmds.getAttr(f"{node}.fileTextureName"))
+
+        # Caches, audio and anything else with a file path attribute
+        for directory in cmds.filePathEditor(query=True, listDirectories="") or []:
+            for file_name in cmds.filePathEditor(query=True, listFiles=directory) or []:
+                dependencies.append(os.path.join(directory, file_name))
+
+        # Render is run with -proj, so the project's workspace.mel is needed too
+        workspace_file = os.path.join(self.project_path.text(), "workspace.mel")
+        if os.path.isfile(workspace_file):
+            dependencies.append(workspace_file)
+
+        # Relative paths are relative to the Maya project
+        return [cmds.workspace(expandName=path) for path in dependencies if path]
+
     def check_for_submit(self):
         self.submit.setEnabled(True if self.project_path.text() else False)
 
@@ -232,10 +262,10 @@ class Maya_RenderFarmSubmitDialog(RenderFarmSubmitDialog):
 def main():
     if os.path.exists(QUBE_PYPATH.get(OPERATING_SYSTEM)):
         main_window = get_maya_window()
-        login_dialog = RenderFarmLoginDialog(main_window)
-        if login_dialog.exec_() == QtWidgets.QDialog.Accepted:
-            login_info = login_dialog.get_login_info()
-            dialog = Maya_RenderFarmSubmitDialog(info=login_info, parent=main_window)
+        login_info = login(main_window)
+        if login_info is not None:
+            with profiling.section("Maya_RenderFarmSubmitDialog", "dialog"):
+                dialog = Maya_RenderFarmSubmitDialog(info=login_info, parent=main_window)
             dialog.show()
     else:
         QtWidgets.QMessageBox.warning(None, QUBE_PY_ERROR.get("title"), QUBE_PY_ERROR.get("message").format("Qube not installed!"))
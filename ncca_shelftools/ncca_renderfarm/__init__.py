@@ -1,3 +1,4 @@
 import os
+import profiling  # Imported first, so profiling mode can time the imports of the other modules
 
 NCCA_RENDERFARM_PATH=os.path.dirname(os.path.abspath(__file__))
\ No newline at end of file
@@ -2,12 +2,17 @@
 # Users have the option to remember their user info. 
 # The user info is saved and encrypted into NCCA_ENV_PATH and NCCA_KEY_PATH, which can be found in /ncca_shelftools/config/__init__.py
 # The script uses paramiko to connect the renderfarm's SFTP server. 
-# The server address, address port, and connection attempts can be found in /ncca_shelftools/config/renderfarm.py
+# The connection is kept by the session manager (see /ncca_shelftools/utils/sftp_session.py), so the other tools can use it without logging in again.
+# With BROKER_ENABLED, the connection is also shared with Maya or Houdini running at the same time, through a broker process (see /ncca_shelftools/utils/broker.py).
+# Connecting happens on a worker thread (see /ncca_shelftools/ncca_renderfarm/worker.py), so Maya and Houdini don't freeze if the renderfarm can't be reached.
+# The server address, address port, connection attempts and timeouts can be found in /ncca_shelftools/config/renderfarm.py
 
 from PySide2 import QtWidgets 
 from config import *  
 from .crypt import * 
+from .worker import *
 from utils import *
+import profiling
 
 class NCCA_ConnectionFailedException(Exception):
     """
@@ -28,6 +33,7 @@ class RenderFarmLoginDialog(QtWidgets.QDialog):
 
     username = ""  # Initialize class variable for storing username
     sftp = None  # Initialize class variable for SFTP connection
+    session = None  # Initialize class variable for the shared session
 
     def __init__(self, parent=None):
         """
@@ -68,6 +74,12 @@ class RenderFarmLoginDialog(QtWidgets.QDialog):
         self.login_button = QtWidgets.QPushButton(NCCA_LOGIN_LOGIN_LABEL, self)
         self.login_button.pressed.connect(self.confirm_login)
         self.gridLayout.addWidget(self.login_button, 3, 0, 1, 2)
+
+        # Connection progress, shown while logging in
+        self.status_label = QtWidgets.QLabel("", self)
+        self.status_label.setWordWrap(True)
+        self.status_label.hide()
+        self.gridLayout.addWidget(self.status_label, 4, 0, 1, 2)
         
         # Set default button states and tooltips
         self.login_button.setEnabled(True)
@@ -87,48 +99,150 @@ class RenderFarmLoginDialog(QtWidgets.QDialog):
         """
         Attempt to log in to the NCCA Renderfarm using entered credentials.
 
-        This function validates the entered username and password,
-        attempts to establish an SFTP connection, and handles exceptions.
+        The connection is made on a worker thread, and the dialog shows its progress.
+        on_login_finished or on_login_failed is called when it is done.
         """
         username = self.username_input.text()  # Get entered username
         password = self.password_input.text()  # Get entered password
-        save_info = self.save_info_checkbox.isChecked()  # Check if save info checkbox is checked
-        
-        for attempt in range(MAX_CONNECTION_ATTEMPTS):  # Try to connect multiple times
-            try:
-                install(["paramiko"])
-                import paramiko, socket
-                # Attempt to establish SFTP connection here
-                
-                transport = paramiko.Transport((RENDERFARM_ADDRESS, RENDERFARM_PORT))
-                transport.connect(None, username, password)
-
-                self.sftp = paramiko.SFTPClient.from_transport(transport)  # Initialize SFTP connection variable
-                self.username = username  # Set class username variable
-
-                if save_info:
-                    save_user_info(self.key, username, password)  # Save user info if checkbox is checked
-                else:
-                    remove_user_info()  # Remove saved user info if checkbox is not checked
-
-                # Close dialog on successful login
-                return self.accept()
-
-            except paramiko.AuthenticationException:
-                QtWidgets.QMessageBox.warning(self, NCCA_INVALID_LOGIN_ERROR.get("title"), NCCA_INVALID_LOGIN_ERROR.get("message"))
-                return None
-            except (paramiko.SSHException, socket.gaierror):
-                if attempt >= MAX_CONNECTION_ATTEMPTS - 1:
-                    QtWidgets.QMessageBox.warning(self, NCCA_CONNECTION_ERROR.get("title"), NCCA_CONNECTION_ERROR.get("message"))
-                    return None
-        
-        return None  # Return None if login fails
+
+        install(["paramiko"])
+
+        self.set_connecting(True)
+
+        self.login_worker = RenderFarmWorker(self.connect, username, password)
+        self.login_worker.kwargs["progress"] = self.login_worker.signals.progress.emit
+        self.login_worker.signals.progress.connect(self.status_label.setText)
+        self.login_worker.signals.finished.connect(self.on_login_finished)
+        self.login_worker.signals.failed.connect(self.on_login_failed)
+        self.login_worker.start()
+
+    def connect(self, username="", password="", progress=None):
+        """
+        Log in to the renderfarm. This runs on the worker thread.
+
+        Args:
+        - username (str): The username to log in with.
+        - password (str): The password to log in with.
+        - progress: Optional function called with a message as each step of connecting starts.
+
+        Returns:
+        - RenderFarmSession: The logged in session.
+
+        Raises:
+        - NCCA_InvalidCredentialsException: If the username or password is wrong.
+        - NCCA_ConnectionFailedException: If the renderfarm can't be reached.
+        """
+        import paramiko, socket
+
+        try:
+            session = get_session_manager().login(username, password, progress)
+        except paramiko.AuthenticationException as e:
+            raise NCCA_InvalidCredentialsException(str(e))
+        except (paramiko.SSHException, socket.error) as e:
+            raise NCCA_ConnectionFailedException(str(e))
+
+        # Start a broker if there isn't one running. Connecting to check opens a connection, so close it again
+        if BROKER_ENABLED:
+            broker_session = connect_broker()
+            if broker_session is None:
+                start_broker(username, password)
+            else:
+                broker_session.close()
+
+        return session
+
+    def on_login_finished(self, session=None):
+        """
+        Called on the main thread when the worker has logged in.
+
+        Args:
+        - session (RenderFarmSession): The logged in session.
+        """
+        self.set_connecting(False)
+
+        # The dialog may have been closed while connecting
+        if not self.isVisible():
+            return
+
+        self.session = session
+        self.sftp = session.sftp  # Initialize SFTP connection variable
+        self.username = session.username  # Set class username variable
+
+        if self.save_info_checkbox.isChecked():
+            save_user_info(self.key, session.username, session.password)  # Save user info if checkbox is checked
+        else:
+            remove_user_info()  # Remove saved user info if checkbox is not checked
+
+        # Close dialog on successful login
+        self.accept()
+
+    def on_login_failed(self, error=None):
+        """
+        Called on the main thread when the worker could not log in.
+
+        Args:
+        - error (Exception): The exception the worker raised.
+        """
+        self.set_connecting(False)
+
+        if not self.isVisible():
+            return
+
+        if isinstance(error, NCCA_InvalidCredentialsException):
+            QtWidgets.QMessageBox.warning(self, NCCA_INVALID_LOGIN_ERROR.get("title"), NCCA_INVALID_LOGIN_ERROR.get("message"))
+        else:
+            QtWidgets.QMessageBox.warning(self, NCCA_CONNECTION_ERROR.get("title"), NCCA_CONNECTION_ERROR.get("message"))
+
+    def set_connecting(self, connecting=False):
+        """
+        Show or hide the connection progress, and stop the login details from being changed while connecting.
+
+        Args:
+        - connecting (bool): Whether a login is in progress.
+        """
+        self.username_input.setEnabled(not connecting)
+        self.password_input.setEnabled(not connecting)
+        self.save_info_checkbox.setEnabled(not connecting)
+        self.login_button.setEnabled(not connecting)
+
+        self.status_label.setText("")
+        self.status_label.setVisible(connecting)
     
     def get_login_info(self):
         """
         Retrieve the logged-in username and SFTP connection.
 
         Returns:
-        - dict: Dictionary containing 'username' and 'sftp' keys.
+        - dict: Dictionary containing 'username', 'sftp' and 'session' keys.
         """
-        return {"username": self.username, "sftp" : self.sftp}
+        return {"username": self.username, "sftp" : self.sftp, "session": self.session}
+
+def login(parent=None):
+    """
+    Get the login info for a tool. If the user has already logged in during this Maya or Houdini session, or through the broker,
+    the connection is reused without asking again. Otherwise, the login dialog is shown.
+
+    Args:
+    - parent: Optional parent widget for the login dialog (default is None).
+
+    Returns:
+    - dict: Dictionary containing 'username', 'sftp' and 'session' keys, or None if the user cancelled the login.
+    """
+    session = get_session_manager().get_active_session()
+    if session is not None:
+        return session.get_login_info()
+
+    # The user may have logged in from another application already
+    if BROKER_ENABLED:
+        session = connect_broker()
+        if session is not None:
+            return session.get_login_info()
+
+    with profiling.section("RenderFarmLoginDialog", "dialog"):
+        login_dialog = RenderFarmLoginDialog(parent)
+
+    profiling.mark("login dialog shown")
+    if login_dialog.exec_() == QtWidgets.QDialog.Accepted:
+        return login_dialog.get_login_info()
+
+    return None
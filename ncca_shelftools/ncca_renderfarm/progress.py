@@ -0,0 +1,95 @@
+# RenderFarmProgressDialog shows how far an upload has got while it runs on a RenderFarmWorker (see /ncca_shelftools/ncca_renderfarm/worker.py).
+# It receives the snapshots made by TransferProgress (see /ncca_shelftools/utils/sftp_transfer.py) and lets the user cancel the upload.
+
+from PySide2 import QtCore, QtWidgets
+from config import *
+
+def format_size(size=0):
+    """
+    Format a number of bytes as a human readable string, e.g. 1.5 GB.
+
+    Args:
+    - size (float): The number of bytes.
+
+    Returns:
+    - str: The formatted size.
+    """
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def format_time(seconds=None):
+    """
+    Format a number of seconds as a human readable string, e.g. 2m 05s.
+
+    Args:
+    - seconds (float): The number of seconds, or None if it is not known yet.
+
+    Returns:
+    - str: The formatted time.
+    """
+    if seconds is None:
+        return "..."
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+class RenderFarmProgressDialog(QtWidgets.QProgressDialog):
+    """
+    Progress dialog for uploads to the NCCA Renderfarm.
+    """
+
+    # The progress bar works in thousandths, as a byte count can be too large for the int that QProgressDialog uses
+    PROGRESS_RANGE = 1000
+
+    def __init__(self, parent=None):
+        """
+        Initialize RenderFarmProgressDialog instance.
+
+        Args:
+        - parent: Optional parent widget (default is None).
+        """
+        super().__init__(NCCA_UPLOAD_STAGE_CHECKING, NCCA_UPLOAD_CANCEL_LABEL, 0, self.PROGRESS_RANGE, parent)
+        self.setWindowTitle(NCCA_UPLOAD_DIALOG_TITLE)
+        self.setWindowModality(QtCore.Qt.WindowModal)
+        self.setMinimumWidth(400)
+        self.setMinimumDuration(0)
+
+        # Don't close or reset the dialog when the bar is full, the job still needs to be submitted
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+        self.setValue(0)
+
+    def update_progress(self, snapshot):
+        """
+        Show a snapshot from TransferProgress. Connect this to the worker's progress signal.
+
+        Args:
+        - snapshot (dict): The snapshot, see TransferProgress.snapshot.
+        """
+        stage = NCCA_UPLOAD_STAGE_CANCELLING if snapshot["cancelled"] else snapshot["stage"]
+
+        if snapshot["stage"] != NCCA_UPLOAD_STAGE_UPLOADING:
+            self.setLabelText(stage)
+            return
+
+        self.setLabelText(NCCA_UPLOAD_PROGRESS.format(
+            stage,
+            snapshot["files_done"], snapshot["total_files"],
+            format_size(snapshot["bytes_sent"]), format_size(snapshot["total_bytes"]),
+            format_size(snapshot["throughput"]),
+            format_time(snapshot["eta"])
+        ))
+
+        if snapshot["total_bytes"] > 0:
+            self.setValue(min(self.PROGRESS_RANGE, int(self.PROGRESS_RANGE * snapshot["bytes_sent"] / snapshot["total_bytes"])))
+        elif snapshot["total_files"] > 0:
+            self.setValue(int(self.PROGRESS_RANGE * snapshot["files_done"] / snapshot["total_files"]))
@@ -5,6 +5,8 @@ import sys, traceback
 
 from config import *
 from utils import *
+from .worker import RenderFarmWorker
+from .progress import RenderFarmProgressDialog, format_size
 
 class RenderFarmSubmitDialog(QMainWindow):
     """"""
@@ -86,6 +88,17 @@ class RenderFarmSubmitDialog(QMainWindow):
         self.Cancel.clicked.connect(self.close)
         self.gridLayout.addWidget(self.Cancel, 6, 0, 1, 1)
 
+        self.incremental_upload = QtWidgets.QCheckBox(NCCA_SUBMIT_INCREMENTAL_LABEL, self)
+        self.incremental_upload.setToolTip(NCCA_SUBMIT_INCREMENTAL_TOOLTIP)
+        self.incremental_upload.setChecked(True)
+        self.gridLayout.addWidget(self.incremental_upload, 6, 1, 1, 2)
+
+        self.dependency_upload = QtWidgets.QCheckBox(NCCA_SUBMIT_DEPENDENCIES_LABEL, self)
+        self.dependency_upload.setToolTip(NCCA_SUBMIT_DEPENDENCIES_TOOLTIP)
+        # Off by default, as the dependencies are worked out from the scene and may miss files that are only read at render time
+        self.dependency_upload.setChecked(False)
+        self.gridLayout.addWidget(self.dependency_upload, 6, 3, 1, 2)
+
         # Screen Shot button
 
         self.submit = QtWidgets.QPushButton(NCCA_SUBMIT_SUBMIT_LABEL, self)
@@ -100,15 +113,25 @@ class RenderFarmSubmitDialog(QMainWindow):
         local_project_dir = self.project_path.text()
         remote_project_dir = os.path.join("/home", self.username, "farm", "projects", self.project_name.text()).replace("\\", "/")
 
+        delete_project = False
         if (sftp_exists(self.sftp, remote_project_dir)):
-            if self.confirm_override(self.project_name.text()):
-                sftp_delete(self.sftp, remote_project_dir)
-            else:
+            if not self.confirm_override(self.project_name.text()):
                 return
 
-        sftp_upload(self.sftp, local_project_dir, remote_project_dir, ignore=["backup"])
-        # Submit the job
+            # Without an incremental upload, the old project is removed and everything is uploaded again
+            delete_project = not self.incremental_upload.isChecked()
+
+        # The ignore patterns are read and compiled once for the whole upload
+        ignore = load_ignore_rules(local_project_dir)
+
+        # Work out the files the scene needs here, as the DCC can't be used from the worker thread
+        upload_tree = None
+        if self.dependency_upload.isChecked():
+            upload_tree = self.collect_scene_tree(local_project_dir, remote_project_dir, ignore)
+            if upload_tree is False:
+                return
 
+        # Load qb before uploading, so a missing Qube install is reported straight away
         frame_range=f"{self.start_frame.value()}-{self.end_frame.value()}x{self.by_frame.value()}"
         render_home_dir = os.path.join("/render", self.username).replace("\\", "/")
 
@@ -137,16 +160,167 @@ class RenderFarmSubmitDialog(QMainWindow):
             
         job['agenda'] = qb.genframes(frame_range)
 
+        # Upload and submit on a worker thread, so the DCC doesn't freeze while a large project uploads
+        self.submit.setEnabled(False)
+        self.progress_dialog = RenderFarmProgressDialog(self)
+        self.upload_progress = TransferProgress()
+
+        self.submit_worker = RenderFarmWorker(self.upload_and_submit, local_project_dir, remote_project_dir, job, delete_project, self.upload_progress, ignore, upload_tree)
+        self.upload_progress.callback = self.submit_worker.signals.progress.emit
+        self.submit_worker.signals.progress.connect(self.progress_dialog.update_progress)
+        self.submit_worker.signals.finished.connect(self.on_submit_finished)
+        self.submit_worker.signals.error.connect(self.on_submit_error)
+        self.progress_dialog.canceled.connect(self.upload_progress.cancel)
+
+        self.progress_dialog.show()
+        self.submit_worker.start()
+
+    def collect_dependencies(self):
+        """
+        List the files that the scene needs to render. Submitters that can read their scene's file references override this.
+
+        Returns:
+        - list: Paths of the files, directories or frame sequences the scene uses, or None to upload the whole project folder.
+        """
+        return None
+
+    def collect_scene_tree(self, local_project_dir, remote_project_dir, ignore):
+        """
+        Work out which project files to upload from the scene's dependencies, and warn about any that are outside of the project folder.
+
+        Args:
+        - local_project_dir (str): Path to the local project directory.
+        - remote_project_dir (str): Path to the project directory on the farm.
+        - ignore (IgnoreRules): Files and folders that are never uploaded.
+
+        Returns:
+        - tuple: (dirs, files) to upload, None to upload the whole project folder, or False if the user cancelled the submit.
+        """
+        dependencies = self.collect_dependencies()
+        if dependencies is None:
+            return None
+
+        # Only the frames being rendered are uploaded from file sequences
+        frames = range(self.start_frame.value(), self.end_frame.value() + 1, self.by_frame.value())
+        dependency_tree = collect_dependency_tree(local_project_dir, remote_project_dir, dependencies, ignore, frames)
+
+        # Ask before uploading, as the render would fail or look wrong without these files
+        missing = dependency_tree["missing"]
+        if missing:
+            reply = QMessageBox.question(None, DEPENDENCIES_MISSING_DIALOG.get("title"),
+                DEPENDENCIES_MISSING_DIALOG.get("message").format(len(missing), "\n".join(missing[:10])),
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return False
+
+        outside = dependency_tree["outside"]
+        if outside:
+            reply = QMessageBox.question(None, DEPENDENCIES_OUTSIDE_DIALOG.get("title"),
+                DEPENDENCIES_OUTSIDE_DIALOG.get("message").format(len(outside), "\n".join(outside[:10])),
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return False
+
+        return dependency_tree["dirs"], dependency_tree["files"]
+
+    def upload_and_submit(self, local_project_dir, remote_project_dir, job, delete_project, progress, ignore, upload_tree=None):
+        """
+        Upload the project and submit the job. This runs on a worker thread, so it must not touch any widgets.
+
+        Args:
+        - local_project_dir (str): Path to the local project directory.
+        - remote_project_dir (str): Path to the project directory on the farm.
+        - job (dict): The Qube job to submit.
+        - delete_project (bool): Remove the old project from the farm before uploading.
+        - progress (TransferProgress): Progress of the upload, also used to cancel it.
+        - ignore (IgnoreRules): Files and folders that are never uploaded.
+        - upload_tree (tuple): Optional (dirs, files) to upload instead of the whole project, see collect_scene_tree.
+
+        Returns:
+        - dict: 'failures' is a list of upload results that failed, 'ids' is a list of submitted job ids (None if the job was not submitted).
+                'bytes_avoided' is the size of the project files that weren't needed by the scene (None if the whole project was uploaded).
+        """
+        import qb
+
+        if delete_project:
+            progress.set_stage(NCCA_UPLOAD_STAGE_DELETING)
+            ssh_delete(self.sftp, self.username, [remote_project_dir, get_manifest_path(remote_project_dir)])
+
+        # If the upload is cancelled, the manifest still records the files that made it, so the next submit continues from there
+        store_path = get_object_store_path(self.username) if UPLOAD_OBJECT_STORE else None
+        results = sftp_upload_incremental(self.sftp, local_project_dir, remote_project_dir, ignore=ignore, progress=progress, tree=upload_tree, store_path=store_path)
+
+        # The farm viewer's cached listings of the project are out of date now, see /ncca_shelftools/utils/listing_cache.py
+        listing_cache = ListingCache(self.username)
+        listing_cache.invalidate(remote_project_dir)
+        if store_path is not None:
+            listing_cache.invalidate(store_path)
+
+        bytes_avoided = None
+        if upload_tree is not None:
+            bytes_avoided = get_bytes_avoided(local_project_dir, upload_tree[1], ignore)
+
+        # Don't submit the job if any of the project files are missing on the farm
+        failures = sftp_upload_failures(results)
+        if failures or progress.cancelled:
+            return {"failures": failures, "ids": None, "bytes_avoided": bytes_avoided}
+
+        # Submit the job
+        progress.set_stage(NCCA_UPLOAD_STAGE_SUBMITTING)
+
         listOfJobsToSubmit = [job]
-        try:
-            listOfSubmittedJobs = qb.submit(listOfJobsToSubmit)
-            id_list = []
-            for job in listOfSubmittedJobs:
-                id_list.append(job['id'])
-            QtWidgets.QMessageBox.warning(None, NCCA_SUBMIT_MESSAGE.get("title"), NCCA_SUBMIT_MESSAGE.get("message").format(self.project_name.text(), id_list))
-        except Exception as e:
-            QtWidgets.QMessageBox.warning(None, NCCA_ERROR.get("title"), NCCA_ERROR.get("message").format(e))
-        
+        listOfSubmittedJobs = qb.submit(listOfJobsToSubmit)
+        id_list = []
+        for submitted_job in listOfSubmittedJobs:
+            id_list.append(submitted_job['id'])
+
+        return {"failures": [], "ids": id_list, "bytes_avoided": bytes_avoided}
+
+    def on_submit_finished(self, result):
+        """
+        Called on the main thread when upload_and_submit has finished.
+
+        Args:
+        - result (dict): The return value of upload_and_submit.
+        """
+        self.close_progress_dialog()
+
+        if self.upload_progress.cancelled:
+            QtWidgets.QMessageBox.warning(None, UPLOAD_CANCELLED_MESSAGE.get("title"), UPLOAD_CANCELLED_MESSAGE.get("message").format(self.project_name.text()))
+            self.check_for_submit()
+            return
+
+        failures = result["failures"]
+        if failures:
+            failed_files = "\n".join(f"{failure['local_path']}: {failure['error']}" for failure in failures[:10])
+            QtWidgets.QMessageBox.warning(None, UPLOAD_ERROR.get("title"), UPLOAD_ERROR.get("message").format(len(failures), failed_files))
+            self.check_for_submit()
+            return
+
+        message = NCCA_SUBMIT_MESSAGE.get("message").format(self.project_name.text(), result["ids"])
+        if result["bytes_avoided"]:
+            message += NCCA_SUBMIT_BYTES_AVOIDED_MESSAGE.format(format_size(result["bytes_avoided"]))
+
+        QtWidgets.QMessageBox.warning(None, NCCA_SUBMIT_MESSAGE.get("title"), message)
+        self.close()
+
+    def close_progress_dialog(self):
+        """
+        Close the progress dialog once the worker has finished.
+        """
+        # QProgressDialog emits canceled when it is closed, which must not count as the user cancelling
+        self.progress_dialog.canceled.disconnect(self.upload_progress.cancel)
+        self.progress_dialog.close()
+
+    def on_submit_error(self, error):
+        """
+        Called on the main thread if upload_and_submit raised an exception.
+
+        Args:
+        - error (str): The traceback of the exception.
+        """
+        self.close_progress_dialog()
+        QtWidgets.QMessageBox.warning(None, NCCA_ERROR.get("title"), NCCA_ERROR.get("message").format(error))
         self.close()
 
     def confirm_override(self, project_name):
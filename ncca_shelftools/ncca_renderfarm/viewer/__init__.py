@@ -1,9 +1,10 @@
 from PySide2 import QtCore, QtWidgets
 
 from config import *
-from ncca_renderfarm.login import RenderFarmLoginDialog
+from ncca_renderfarm.login import login
 from .ncca_renderfarm_viewer import NCCA_RenderFarmViewer
 from utils import get_maya_window
+import profiling
 
 def main(dcc=""):
     """
@@ -18,13 +19,13 @@ def main(dcc=""):
     if dcc == "maya":
         parent = get_maya_window()
 
-    # Initialize and execute the login dialog
-    login_dialog = RenderFarmLoginDialog(parent)
+    # Log in, or reuse the connection if the user has already logged in
+    login_info = login(parent)
 
     # If SFTP login is successful, initialize the RenderFarmViewer
-    if login_dialog.exec_() == QtWidgets.QDialog.Accepted:
-        login_info = login_dialog.get_login_info()
-        dialog = NCCA_RenderFarmViewer(info=login_info, parent=parent)
+    if login_info is not None:
+        with profiling.section("NCCA_RenderFarmViewer", "dialog"):
+            dialog = NCCA_RenderFarmViewer(info=login_info, parent=parent)
 
         # If the DCC is Houdini, set the Houdini main window as parent
         if dcc == "houdini":
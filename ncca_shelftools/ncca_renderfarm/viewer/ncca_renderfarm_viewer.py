@@ -1,10 +1,12 @@
 from config import * 
-from PySide2.QtWidgets import QMainWindow, QTreeView, QVBoxLayout, QMenu, QAction, QMessageBox, QFileDialog, QPushButton, QHBoxLayout
-from PySide2.QtCore import QDir, Qt, QModelIndex
-import tempfile, shutil
+from PySide2.QtWidgets import QMainWindow, QTreeView, QVBoxLayout, QMenu, QAction, QMessageBox, QFileDialog, QPushButton, QHBoxLayout, QLabel
+from PySide2.QtCore import QDir, Qt, QModelIndex, QTimer
+import tempfile, shutil, time
+from collections import deque
 
 from .qfarmsystemmodel import QFarmSystemModel 
 from .qimagedialog import QImageDialog
+from ncca_renderfarm.worker import RenderFarmWorker
 
 from utils import *  # Import utility functions
 
@@ -45,6 +47,7 @@ class NCCA_RenderFarmViewer(QMainWindow):
         self.tree_view.setModel(self.file_system_model)  # Set model for the tree view
         #self.tree_view.setRootIndex(self.file_system_model.index(QDir.rootPath()))  # Set root index
         self.tree_view.setSortingEnabled(True)  # Enable sorting
+        self.tree_view.setUniformRowHeights(True)  # Every row is the same height, so Qt doesn't have to measure each one in large folders
 
         # Set the columns to display
         self.tree_view.setHeaderHidden(True)  # Hide the header
@@ -58,7 +61,14 @@ class NCCA_RenderFarmViewer(QMainWindow):
         self.refresh_button.clicked.connect(self.refresh)
         self.refresh_button.setFixedSize(25, 25)
 
+        # Watch mode checks the expanded and pinned folders for new files while a job renders, see poll_watched_folders
+        self.watch_button = QPushButton(NCCA_VIEWER_WATCH_LABEL)
+        self.watch_button.setCheckable(True)
+        self.watch_button.setToolTip(NCCA_VIEWER_WATCH_TOOLTIP)
+        self.watch_button.toggled.connect(self.set_watching)
+
         h_layout.addStretch()
+        h_layout.addWidget(self.watch_button)
         h_layout.addWidget(self.refresh_button)
 
         self.layout.addLayout(h_layout)
@@ -71,7 +81,26 @@ class NCCA_RenderFarmViewer(QMainWindow):
         self.tree_view.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tree_view.customContextMenuRequested.connect(self.on_custom_context_menu)
 
+        # The paths of the expanded folders, so watch mode doesn't have to check every folder in the tree, see get_watched_folders
         self.expanded_paths = set()
+        self.tree_view.expanded.connect(self.on_expanded)
+        self.tree_view.collapsed.connect(self.on_collapsed)
+
+        # Keep a reference to running workers, so they aren't garbage collected before they finish
+        self.workers = set()
+
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.timeout.connect(self.poll_watched_folders)
+        self.watch_interval = VIEWER_WATCH_MIN_INTERVAL
+        self.watch_polling = False
+        self.watch_started = 0.0
+        self.watch_folder_count = 0
+        self.watch_added = deque()  # (time, files added) for every check that found new files
+
+        self.watch_label = QLabel()
+        self.statusBar().addPermanentWidget(self.watch_label)
+        self.file_system_model.refreshed.connect(self.on_refreshed)
 
         self.root_index = self.file_system_model.index(0, 0, QModelIndex())
 
@@ -85,11 +114,12 @@ class NCCA_RenderFarmViewer(QMainWindow):
         - index (QModelIndex): Index of the double-clicked item.
         """
         file_path = self.file_system_model.filePath(index)  # Get file path from model
+        sequence_paths = self.file_system_model.sequencePaths(index)
 
         file_name, file_ext = os.path.splitext(os.path.basename(file_path))  # Split filename and extension
 
         if file_ext.lower() in SUPPORTED_IMAGE_FORMATS:
-            self.open_item(file_path)  # Open the item if it's an image
+            self.open_item(sequence_paths[0] if sequence_paths else file_path)  # Open the item if it's an image, or the first frame of a sequence
 
     def keyPressEvent(self, event):
         """
@@ -102,7 +132,7 @@ class NCCA_RenderFarmViewer(QMainWindow):
             index = self.tree_view.currentIndex()  # Get current index
             if index.isValid():
                 file_path = self.file_system_model.filePath(index)  # Get file path from model
-                self.delete_item(file_path)  # Delete the item
+                self.delete_item(file_path, self.file_system_model.sequencePaths(index))  # Delete the item, or every frame of a sequence
         else:
             super().keyPressEvent(event)  # Call superclass keyPressEvent for other key events
 
@@ -118,22 +148,40 @@ class NCCA_RenderFarmViewer(QMainWindow):
             return
 
         file_path = self.file_system_model.filePath(index)  # Get file path from model
+        if not file_path:
+            return  # The 'Loading...' row has no actions
+
         file_name, file_ext = os.path.splitext(os.path.basename(file_path))  # Split filename and extension
 
+        # A sequence is opened, downloaded and deleted as a whole
+        sequence_paths = self.file_system_model.sequencePaths(index)
+
         context_menu = QMenu(self)  # Create a QMenu for the context menu
 
         if file_ext.lower() in SUPPORTED_IMAGE_FORMATS:
             open_action = QAction(NCCA_VIEWER_ACTION_OPEN_LABEL, self)  # Create action to open the file
-            open_action.triggered.connect(lambda: self.open_item(file_path))  # Connect action to open_item method
+            open_action.triggered.connect(lambda: self.open_item(sequence_paths[0] if sequence_paths else file_path))  # Connect action to open_item method
             context_menu.addAction(open_action)  # Add action to context menu
 
         download_action = QAction(NCCA_VIEWER_ACTION_DOWNLOAD_LABEL, self)  # Create action to download the file
-        download_action.triggered.connect(lambda: self.download_item(file_path))  # Connect action to download_item method
+        is_dir = self.file_system_model.isDir(index)
+
+        # Pinned folders are watched for new files even when they are collapsed
+        if is_dir:
+            pinned = file_path in self.file_system_model.pinned
+            pin_action = QAction(NCCA_VIEWER_ACTION_UNPIN_LABEL if pinned else NCCA_VIEWER_ACTION_PIN_LABEL, self)
+            pin_action.triggered.connect(lambda: self.file_system_model.setPinned(index, not pinned))
+            context_menu.addAction(pin_action)
+
+        if sequence_paths:
+            download_action.triggered.connect(lambda: self.download_sequence(sequence_paths))
+        else:
+            download_action.triggered.connect(lambda: self.download_item(file_path, is_dir))  # Connect action to download_item method
         context_menu.addAction(download_action)  # Add action to context menu
 
         if (file_path != self.root_path and file_path != os.path.join(self.root_path, "projects").replace("\\", "/")):
             delete_action = QAction(NCCA_VIEWER_ACTION_DELETE_LABEL, self)  # Create action to delete the file
-            delete_action.triggered.connect(lambda: self.delete_item(file_path))  # Connect action to delete_item method
+            delete_action.triggered.connect(lambda: self.delete_item(file_path, sequence_paths))  # Connect action to delete_item method
             context_menu.addAction(delete_action)  # Add action to context menu
 
         context_menu.exec_(self.tree_view.viewport().mapToGlobal(point))  # Execute context menu at global point
@@ -149,7 +197,8 @@ class NCCA_RenderFarmViewer(QMainWindow):
 
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_file_path = os.path.join(temp_dir, file_name)  # Create temporary file path
-            sftp_download(self.sftp, file_path, temp_file_path)
+            if not self.download_files([(file_path, temp_file_path)]):
+                return
 
             if os.path.exists(temp_file_path):
                 dialog = QImageDialog(temp_file_path)  # Create QImageDialog instance
@@ -157,30 +206,67 @@ class NCCA_RenderFarmViewer(QMainWindow):
             else:
                 print(f"{temp_file_path} Does not exist: ")
 
-    def download_item(self, file_path):
+    def download_item(self, file_path, is_dir=None):
         """
         Download the selected item.
 
         Args:
         - file_path (str): Path of the file to download.
+        - is_dir (bool): Whether the item is a folder, if already known from the model.
         """
         destination_path = ""
 
-        if os.path.isdir(file_path):
+        # file_path is on the renderfarm, so it has to be checked there rather than with os.path
+        if is_dir is None:
+            is_dir = sftp_isdir(self.sftp, file_path)
+
+        if is_dir:
             destination_path = QFileDialog.getExistingDirectory(self, NCCA_VIEWER_FOLDER_PROMPT)  # Get destination folder for directory
-            destination_path = os.path.join(destination_path, os.path.basename(file_path))  # Set destination path for directory
+            if destination_path:
+                destination_path = os.path.join(destination_path, os.path.basename(file_path))  # Set destination path for directory
         else:
             destination_path, _ = QFileDialog.getSaveFileName(self, NCCA_VIEWER_FILE_PROMPT, os.path.basename(file_path))  # Get save file path
          
         if destination_path:
-            sftp_download(self.sftp, file_path, destination_path)  # Download file using SFTP
+            self.download_files([(file_path, destination_path)])
 
-    def delete_item(self, file_path):
+    def download_sequence(self, sequence_paths=[]):
+        """
+        Download every frame of a sequence into a folder.
+
+        Args:
+        - sequence_paths (list): Paths of the frames to download.
+        """
+        destination_path = QFileDialog.getExistingDirectory(self, NCCA_VIEWER_FOLDER_PROMPT)
+
+        if destination_path:
+            self.download_files([(frame_path, os.path.join(destination_path, os.path.basename(frame_path))) for frame_path in sequence_paths])
+
+    def download_files(self, downloads=[]):
+        """
+        Download files or folders from the renderfarm, and tell the user if one of them fails. The downloads stop at the first failure.
+
+        Args:
+        - downloads (list): (remote_path, local_path) tuples.
+
+        Returns:
+        - bool: True if everything was downloaded.
+        """
+        for remote_path, local_path in downloads:
+            try:
+                sftp_download(self.sftp, remote_path, local_path)  # Download file using SFTP
+            except Exception as e:
+                QMessageBox.warning(self, DOWNLOAD_ERROR.get("title"), DOWNLOAD_ERROR.get("message").format(remote_path, e))
+                return False
+        return True
+
+    def delete_item(self, file_path, sequence_paths=[]):
         """
         Delete the selected item.
 
         Args:
         - file_path (str): Path of the file to delete.
+        - sequence_paths (list): Paths of the frames to delete, if the item is a sequence.
         """
         if (file_path != self.root_path and file_path != os.path.join(self.root_path, "projects").replace("\\", "/")):
             reply = QMessageBox.question(self, DELETE_DIALOG.get("title"), 
@@ -188,42 +274,184 @@ class NCCA_RenderFarmViewer(QMainWindow):
                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)  # Confirmation dialog
 
             if reply == QMessageBox.Yes:
-                sftp_delete(self.sftp, file_path)  # Delete file using SFTP
-                self.refresh()
+                delete_paths = list(sequence_paths) or [file_path]
 
-    def get_expanded_paths(self):
-        expanded_paths = []
+                # Deleting a project, or anything inside it, also deletes its upload manifest, so the next submit doesn't skip
+                # the deleted files as already uploaded. See /ncca_shelftools/utils/sftp_manifest.py
+                projects_path = os.path.join(self.root_path, "projects").replace("\\", "/")
+                if file_path.startswith(projects_path + "/"):
+                    project_name = file_path[len(projects_path) + 1:].split("/")[0]
+                    delete_paths.append(get_manifest_path(projects_path + "/" + project_name))
 
-        def traverse(item):
-            if item is None or "path" not in item:
-                return
+                # Delete on the renderfarm in the background, so the viewer stays responsive
+                worker = RenderFarmWorker(self.delete_remote_paths, delete_paths)
+                worker.signals.finished.connect(lambda deleted: self.on_delete_finished(worker, file_path, deleted))
+                worker.signals.error.connect(lambda error: self.on_delete_finished(worker, file_path, False, error))
+                self.workers.add(worker)
+
+                self.statusBar().showMessage(NCCA_VIEWER_DELETING_STATUS.format(file_path))
+                worker.start()
+
+    def delete_remote_paths(self, delete_paths):
+        """
+        Delete files on the renderfarm, then remove any stored files that were only used by them. This runs on a worker thread.
 
-            index = self.file_system_model.findIndex(item["path"])
-            if index.isValid() and self.tree_view.isExpanded(index):
-                expanded_paths.append(item["path"])
+        Args:
+        - delete_paths (list): Remote paths to delete.
 
-                if item['children'] is None:
-                    return
+        Returns:
+        - bool: True if everything was deleted.
+        """
+        deleted = ssh_delete(self.sftp, self.username, delete_paths)
 
-                for child in item["children"]:
-                    traverse(child)
-    
-        root_item = self.root_index.internalPointer()
-        traverse(root_item)
+        # See /ncca_shelftools/utils/sftp_objects.py
+        if deleted:
+            sftp_collect_garbage(self.sftp, self.username)
 
-        return expanded_paths
+        # Even a failed delete may have removed some of the files, so their cached listings can't be trusted
+        self.file_system_model.cache.invalidate_many(delete_paths + [get_object_store_path(self.username)])
 
-    def restore_expanded(self, expanded_paths):
-        for path in expanded_paths:
-            index = self.file_system_model.findIndex(path)
-            if index.isValid():
-                self.tree_view.expand(index)
+        return deleted
+
+    def on_delete_finished(self, worker, file_path, deleted, error=""):
+        """
+        Called on the main thread when a delete started by delete_item has finished.
+
+        Args:
+        - worker (RenderFarmWorker): The worker that ran the delete.
+        - file_path (str): Path of the deleted file.
+        - deleted (bool): True if the file was deleted.
+        - error (str): The traceback if the delete raised an exception.
+        """
+        self.workers.discard(worker)
+
+        if error:
+            print(error)
+
+        self.statusBar().showMessage((NCCA_VIEWER_DELETED_STATUS if deleted else NCCA_VIEWER_DELETE_FAILED_STATUS).format(file_path), 5000)
+        self.refresh()
 
     def refresh(self):
-        expanded_paths = self.get_expanded_paths()
+        """
+        Update the folders that have changed on the farm. Only the rows that changed are touched, so expanded folders stay open.
+        """
+        self.file_system_model.refresh_children()
+
+    def set_watching(self, watching=False):
+        """
+        Start or stop watch mode, which checks the expanded and pinned folders for new files until it is stopped.
 
-        self.file_system_model.beginResetModel()
-        self.file_system_model.rootItem["children"] = None
-        self.file_system_model.endResetModel()
+        Args:
+        - watching (bool): Whether to watch the folders.
+        """
+        self.watch_timer.stop()
+
+        if watching:
+            self.watch_interval = VIEWER_WATCH_MIN_INTERVAL
+            self.watch_started = time.monotonic()
+            self.watch_added.clear()
+            self.poll_watched_folders()
+        else:
+            self.watch_polling = False
+            self.watch_label.clear()
 
-        self.restore_expanded(expanded_paths)
\ No newline at end of file
+    def on_expanded(self, index):
+        """
+        Remember a folder that was expanded, so watch mode checks it.
+        """
+        node = self.file_system_model.get_node(index)
+        if node.is_dir:
+            self.expanded_paths.add(node.path)
+
+    def on_collapsed(self, index):
+        """
+        Forget a folder that was collapsed, so watch mode stops checking it unless it is pinned.
+        """
+        self.expanded_paths.discard(self.file_system_model.get_node(index).path)
+
+    def get_watched_folders(self):
+        """
+        Get the listed folders that are expanded in the tree, or pinned. Folders that have been removed from the tree are forgotten.
+
+        Returns:
+        - list: The folder nodes.
+        """
+        folders = []
+        for path in self.expanded_paths | self.file_system_model.pinned:
+            node = self.file_system_model.nodes.get(path)
+            if node is None:
+                self.expanded_paths.discard(path)
+            elif node.children is not None:
+                folders.append(node)
+        return folders
+
+    def poll_watched_folders(self):
+        """
+        Check the watched folders for changes. Only folders whose modified time has changed are listed again, see refresh_children
+        in /ncca_shelftools/ncca_renderfarm/viewer/qfarmsystemmodel.py. The next check is scheduled when this one has finished.
+        """
+        folders = self.get_watched_folders()
+        self.watch_folder_count = len(folders)
+
+        self.watch_polling = self.file_system_model.refresh_children(folders)
+        if not self.watch_polling:
+            # Every folder is still being listed or checked, so try again later
+            self.schedule_poll(False)
+
+        self.update_watch_label()
+
+    def schedule_poll(self, changed=False):
+        """
+        Schedule the next check of the watched folders. The wait is reset when something changed, and doubled when nothing did.
+
+        Args:
+        - changed (bool): Whether the last check found any changes.
+        """
+        if changed:
+            self.watch_interval = VIEWER_WATCH_MIN_INTERVAL
+        else:
+            self.watch_interval = min(self.watch_interval * 2, VIEWER_WATCH_MAX_INTERVAL)
+
+        self.watch_timer.start(int(self.watch_interval * 1000))
+
+    def on_refreshed(self, added=0, changed=0):
+        """
+        Called when the model has finished checking folders for changes, by a refresh or by watch mode.
+
+        Args:
+        - added (int): The number of files that were added.
+        - changed (int): The number of folders that changed.
+        """
+        if not self.watch_button.isChecked():
+            return
+
+        if added:
+            self.watch_added.append((time.monotonic(), added))
+
+        # A refresh may finish while watch mode is waiting for its own check, which schedules the next one when it finishes
+        if self.watch_polling:
+            self.watch_polling = False
+            self.schedule_poll(changed > 0)
+
+        self.update_watch_label()
+
+    def update_watch_label(self):
+        """
+        Show the number of watched folders, and the number of new frames per second over the last VIEWER_WATCH_RATE_WINDOW seconds.
+        """
+        now = time.monotonic()
+        while self.watch_added and self.watch_added[0][0] < now - VIEWER_WATCH_RATE_WINDOW:
+            self.watch_added.popleft()
+
+        # Just after watch mode starts, a single check would give a very high rate, so wait at least one check's worth
+        window = max(min(VIEWER_WATCH_RATE_WINDOW, now - self.watch_started), VIEWER_WATCH_MIN_INTERVAL)
+        rate = sum(added for added_time, added in self.watch_added) / window
+
+        self.watch_label.setText(NCCA_VIEWER_WATCH_STATUS.format(self.watch_folder_count, rate))
+
+    def closeEvent(self, event):
+        """
+        Stop watch mode when the viewer is closed, so it doesn't keep checking the farm in the background.
+        """
+        self.watch_button.setChecked(False)
+        super().closeEvent(event)
@@ -1,92 +1,692 @@
-from PySide2.QtCore import QAbstractItemModel, QModelIndex, Qt, QTimer
-from PySide2.QtGui import QIcon
-import stat
+# QFarmSystemModel shows the user's farm folder in the viewer's tree.
+# Folders are listed when they are first expanded, on a worker thread (see /ncca_shelftools/ncca_renderfarm/worker.py), so a slow network
+# or a folder with thousands of frames never freezes the viewer. While a folder is being listed it shows a single 'Loading...' row,
+# and its children are then added in batches of VIEWER_FETCH_BATCH_SIZE (see /ncca_shelftools/config/software.py), so the view stays responsive.
+# Qt asks for the parent of an index constantly, so each node stores its own row, and the model keeps a dictionary of the listed nodes by path.
+# Refreshing only lists the folders whose modified time has changed, and compares the listing with the nodes that are already there,
+# so the rows that were added, removed or changed are updated in place and the view keeps its expanded folders, selection and scroll position.
+# Listings are also kept in a local cache (see /ncca_shelftools/utils/listing_cache.py), so a folder the viewer has listed before is shown
+# straight away, then checked in the background like a refresh. A folder that isn't cached is scanned with everything inside it in one
+# request (see ssh_scan_tree in /ncca_shelftools/utils/sftp_exec.py), so the folders inside it are cached before they are expanded.
+# Numbered files, such as rendered frames, are shown as a single sequence node with a node for each frame inside it (see /ncca_shelftools/utils/sequences.py).
+# Qt calls data() for every visible row on each repaint, so each node stores its display name, icon and sort key when it is created,
+# and the icons are loaded once and shared by every node.
+
+from PySide2.QtCore import QAbstractItemModel, QModelIndex, Qt, QTimer, Signal
+from PySide2.QtGui import QIcon, QFont
 import os
+import re
+import time
+from operator import attrgetter
 from utils import *
+from ncca_renderfarm.worker import RenderFarmWorker
+
+# Qt asks for the flags of every visible row on each repaint, so they are only built once
+ITEM_FLAGS = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+PLACEHOLDER_FLAGS = Qt.ItemIsEnabled
+
+# SFTP modified times are in whole seconds, so a folder that changed this recently may change again without its modified time changing
+MTIME_RESOLUTION = 2
+
+def get_listed_mtime(mtime=None):
+    """
+    Get the modified time to remember for a folder that is being listed. Folders that changed within MTIME_RESOLUTION
+    seconds are remembered as None, so they are listed again on the next refresh.
+    """
+    if mtime is None or time.time() - mtime < MTIME_RESOLUTION:
+        return None
+    return mtime
+
+ICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
+
+# The file names of the icons in ICON_DIR that nodes are shown with
+ICON_NAMES = ["farm.png", "project.png", "folder.png", "image.png", "file.png"]
+
+# The icons by file name, loaded by load_icons when the model is created
+ICONS = {}
+
+def load_icons():
+    """
+    Load the viewer's icons into ICONS. Icons can only be created on the main thread, while nodes are also created on worker
+    threads, so this is done before any nodes are created and the workers only read them.
+    """
+    for icon_name in ICON_NAMES:
+        if icon_name not in ICONS:
+            ICONS[icon_name] = QIcon(os.path.join(ICON_DIR, icon_name))
+
+def get_icon(icon_name=""):
+    """
+    Get one of the viewer's icons. This is safe to call from a worker thread, as it only reads ICONS.
+
+    Args:
+    - icon_name (str): The file name of the icon in ICON_DIR, e.g. folder.png
+
+    Returns:
+    - QIcon: The icon, shared by every node that shows it.
+    """
+    return ICONS[icon_name]
+
+# Splits a name into its numbers and the text between them
+NATURAL_SORT_PATTERN = re.compile(r"(\d+)")
+
+def get_natural_sort_key(name=""):
+    """
+    Get the key that sorts names the way people count, so 'shot2' comes before 'shot10', ignoring case.
+
+    Args:
+    - name (str): The file name.
+
+    Returns:
+    - tuple: The text and numbers of the name, in turn, starting with text. Comparing two keys only ever compares text with text and numbers with numbers.
+    """
+    parts = NATURAL_SORT_PATTERN.split(name.lower())
+    parts[1::2] = map(int, parts[1::2])
+    return tuple(parts)
+
+# Get the key that nodes are sorted by in the viewer, which each node stores when it is created
+get_sort_key = attrgetter("sort_key")
+
+class FarmNode():
+    """
+    A file or folder shown in the viewer. The attributes come from the listing of its parent folder,
+    so checking its type, size or modified time never needs a network request.
+    __slots__ keeps each node small, as a render folder can hold thousands of frames.
+    """
+
+    __slots__ = ("path", "parent", "row", "children", "name", "sort_key", "icon", "is_dir", "mode", "size", "mtime", "listed_mtime", "sequence", "is_placeholder")
+
+    def __init__(self, path="", parent=None, entry=None, icon=None, is_placeholder=False):
+        """
+        Initialize FarmNode instance.
+
+        Args:
+        - path (str): The remote path.
+        - parent (FarmNode): The folder the node is in, or None for the root.
+        - entry: The SFTPAttributes of the path, from sftp_listdir_attr or sftp_stat.
+        - icon (QIcon): The icon shown next to the node, from get_icon.
+        - is_placeholder (bool): Whether this is the 'Loading...' row of a folder that is being listed.
+        """
+        self.path = path
+        self.parent = parent
+        self.row = 0  # The position of the node in its parent's children, kept up to date by the model
+        self.children = None  # None until the folder has been listed
+
+        file_name = path.rsplit("/", 1)[-1]
+        self.name = NCCA_VIEWER_LOADING_LABEL if is_placeholder else file_name  # The text shown in the viewer
+        self.sort_key = get_natural_sort_key(file_name)
+        self.icon = icon
+
+        self.is_dir = sftp_entry_isdir(entry)
+        self.mode = getattr(entry, "st_mode", None)
+        self.size = getattr(entry, "st_size", None)
+        self.mtime = getattr(entry, "st_mtime", None)
+        self.listed_mtime = None  # The modified time of the folder when its children were listed
+        self.sequence = None  # The FileSequence, if this is a sequence of frames
+        self.is_placeholder = is_placeholder
 
 class QFarmSystemModel(QAbstractItemModel):
     """
     Custom QFileSystemModel subclass for the NCCA Renderfarm Viewer.
     """
 
+    # Emitted when refresh_children has finished, with the number of files that were added and the number of folders that changed
+    refreshed = Signal(int, int)
+
     def __init__(self, sftp, username, root_path="/home/user", parent=None):
         super(QFarmSystemModel, self).__init__(parent)
 
         self.sftp = sftp
         self.username = username
         self.home_path=root_path
-        self.rootItem = self.create_item(os.path.dirname(self.home_path), None)
-
-    def populateChildren(self, parent_item):
-        """Recursively populate children for a given parent item."""
-        parent_path = parent_item['path']
-        
-        # Only load children if the parent item does not have placeholder children
-        if parent_item['children'] is None or parent_item['children'] == [None]:
-            parent_item['children'] = [None]  # Placeholder item indicating the directory is not loaded yet
-        else:
-            return  # Children are already loaded, no need to populate again
-        
-        # If the parent item represents a directory, populate its children
-        if sftp_isdir(self.sftp, parent_path):
-            children = sftp_listdir(self.sftp, parent_path)
-            parent_item['children'] = [self.create_item(os.path.join(parent_path, child).replace("\\", "/"), parent_item) for child in children]
-            self.sort_children(parent_item['children'], Qt.DescendingOrder)
-
-    def create_item(self, path, parent):
+        self.projects_path = self.home_path + "/projects"
+
+        # Listings from earlier sessions, shown while the farm is checked for changes
+        self.cache = ListingCache(username)
+        self.scan_tree = VIEWER_SCAN_TREE
+
+        # Counts the network round trips made by the model, see sftp_new_stats in /ncca_shelftools/utils/sftp_utils.py
+        self.stats = sftp_new_stats()
+
+        # Keep a reference to running workers, so they aren't garbage collected before they finish
+        self.workers = set()
+
+        # The folders that are being listed, until all of their children have been added
+        self.loading = set()
+        # The folders that are being checked for changes
+        self.refreshing = set()
+
+        # The paths of the folders the user has pinned, so the viewer watches them even when they are collapsed
+        self.pinned = set()
+        self.pinned_font = QFont()
+        self.pinned_font.setBold(True)
+        self.sort_order = Qt.AscendingOrder
+
+        load_icons()
+
+        # The root is /home, and its only child is the user's farm folder, so /home itself is never listed
+        root_path = os.path.dirname(self.home_path)
+        self.rootItem = self.create_item(root_path, None, sftp_stat(self.sftp, root_path, self.stats))
+        self.rootItem.children = [self.create_item(self.home_path, self.rootItem, sftp_stat(self.sftp, self.home_path, self.stats))]
+
+        # Every node in the tree by path, so findIndex doesn't have to walk the tree
+        self.nodes = {}
+        self.add_nodes(self.rootItem.children)
+
+    def get_node(self, index=QModelIndex()):
+        """
+        Get the node of an index. The invalid index is the root.
+        """
+        if not index.isValid():
+            return self.rootItem
+        return index.internalPointer()
+
+    def get_node_index(self, node=None):
+        """
+        Get the index of a node that is in the tree.
+        """
+        if node is None or node.parent is None:
+            return QModelIndex()
+        return self.createIndex(node.row, 0, node)
+
+    def is_in_tree(self, node=None):
+        """
+        Check if a node is still in the tree. Listings of folders that were removed while they were being listed are thrown away.
+        """
+        return self.nodes.get(node.path) is node
+
+    def add_nodes(self, nodes, first_row=0):
+        """
+        Number the nodes from first_row and add them to the path dictionary. The 'Loading...' row isn't added, as it has no path of its own.
+
+        Args:
+        - nodes (list): The nodes, in the order they are in their parent's children.
+        - first_row (int): The row of the first node.
+        """
+        for row, node in enumerate(nodes, first_row):
+            node.row = row
+            if not node.is_placeholder:
+                self.nodes[node.path] = node
+
+            # The frames of a sequence are added with it
+            if node.sequence is not None:
+                self.add_nodes(node.children)
+
+    def remove_nodes(self, node=None):
+        """
+        Remove a node and everything below it from the path dictionary.
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            self.loading.discard(node)
+            if self.nodes.get(node.path) is node:
+                del self.nodes[node.path]
+            if node.children:
+                stack.extend(node.children)
+
+    def list_children(self, parent_item):
+        """
+        List the children of a folder and sort them, from the cache if the folder has been listed before.
+        Otherwise the folder is scanned along with every folder inside it, or listed over SFTP if the renderfarm can't run the scan.
+        Either way the listing includes the attributes of each child, so this is a single network round trip.
+        This runs on a worker thread, so it must not touch the model, and it lists on its own SFTP channel.
+
+        Args:
+        - parent_item (FarmNode): The folder to list.
+
+        Returns:
+        - tuple: (children, listed_mtime, from_cache). children are the child nodes, sorted in the model's sort order,
+                 and listed_mtime is the folder's modified time when it was listed.
+        """
+        parent_path = parent_item.path
+
+        cached = self.cache.load(parent_path)
+        if cached is not None:
+            entries, listed_mtime = cached
+            return self.create_children(parent_item, entries), listed_mtime, True
+
+        # Several folders can be listed at once, and an SFTP channel can't be shared between threads
+        channel = sftp_open_channel(self.sftp)
+        try:
+            scanned = self.scan_folder(channel, parent_item) if self.scan_tree else None
+
+            if scanned is not None:
+                entries, listed_mtime = scanned
+            else:
+                try:
+                    entries = sftp_listdir_attr(channel, parent_path, self.stats, follow_links=True, raise_errors=True)
+                except IOError as e:
+                    # Nothing is cached, and the folder is listed again on the next refresh
+                    print(f"An error occurred: {e}")
+                    return [], None, False
+
+                listed_mtime = parent_item.listed_mtime
+                self.cache.store(parent_path, listed_mtime, entries)
+        finally:
+            sftp_close_channel(self.sftp, channel)
+
+        return self.create_children(parent_item, entries), listed_mtime, False
+
+    def scan_folder(self, channel, parent_item):
+        """
+        List a folder and every folder inside it with a single command on the renderfarm, and store them all in the cache.
+        This runs on a worker thread, so it must not touch the model.
+
+        Args:
+        - channel: The worker's SFTP channel, from sftp_open_channel.
+        - parent_item (FarmNode): The folder to scan.
+
+        Returns:
+        - tuple: (entries, listed_mtime) of the folder, or None if it couldn't be scanned and should be listed over SFTP instead.
+        """
+        try:
+            listings = ssh_scan_tree(channel, parent_item.path, self.stats)
+        except NCCA_ExecUnavailableException:
+            # The renderfarm doesn't allow commands, so don't ask again until the viewer is opened again
+            self.scan_tree = False
+            return None
+
+        # Folders that can't be read are left out, so they aren't cached as empty, and are listed over SFTP when they are expanded
+        if parent_item.path not in listings:
+            return None
+
+        listings = [(path, get_listed_mtime(mtime), entries) for path, (mtime, entries) in listings.items()]
+        self.cache.store_many(listings)
+
+        for path, listed_mtime, entries in listings:
+            if path == parent_item.path:
+                return entries, listed_mtime
+
+    def hasChildren(self, parent=QModelIndex()):
+        """
+        Folders always show an expand arrow, so they don't have to be listed until they are expanded.
+        """
+        parent_item = self.get_node(parent)
+        if parent_item.children is not None:
+            return len(parent_item.children) > 0 or parent_item in self.loading
+        return parent_item.is_dir
+
+    def canFetchMore(self, parent=QModelIndex()):
+        """
+        A folder can be fetched if it hasn't been listed yet.
+        """
+        parent_item = self.get_node(parent)
+        return parent_item.is_dir and parent_item.children is None
+
+    def fetchMore(self, parent=QModelIndex()):
+        """
+        Start listing a folder on a worker thread. A 'Loading...' row is shown until the listing arrives.
+        """
+        parent_item = self.get_node(parent)
+        if not self.canFetchMore(parent):
+            return
+
+        parent_item.children = []
+        parent_item.listed_mtime = get_listed_mtime(parent_item.mtime)
+        self.loading.add(parent_item)
+
+        # Qt doesn't allow rows to be inserted from inside fetchMore, as it can be called while the view is handling another change
+        QTimer.singleShot(0, lambda: self.show_placeholder(parent_item))
+
+        worker = RenderFarmWorker(self.list_children, parent_item)
+        worker.signals.finished.connect(lambda result: self.on_children_listed(worker, parent_item, *result))
+        worker.signals.error.connect(lambda error: self.on_children_listed(worker, parent_item, [], None, False, error))
+        self.workers.add(worker)
+        worker.start()
+
+    def show_placeholder(self, parent_item):
+        """
+        Show the 'Loading...' row of a folder, if it is still being listed.
+        """
+        if parent_item not in self.loading or parent_item.children:
+            return
+
+        self.beginInsertRows(self.get_node_index(parent_item), 0, 0)
+        parent_item.children = [FarmNode(parent_item.path + "/", parent_item, None, None, True)]
+        self.endInsertRows()
+
+    def on_children_listed(self, worker, parent_item, children, listed_mtime=None, from_cache=False, error=""):
+        """
+        Called on the main thread when a folder has been listed. The 'Loading...' row is replaced by the children, a batch at a time.
+
+        Args:
+        - worker (RenderFarmWorker): The worker that listed the folder.
+        - parent_item (FarmNode): The folder that was listed.
+        - children (list): The child nodes.
+        - listed_mtime (int): The folder's modified time when it was listed, or None if it should be listed again on the next refresh.
+        - from_cache (bool): Whether the children came from the cache, and should be checked for changes once they have been added.
+        - error (str): The traceback if the listing raised an exception.
+        """
+        self.workers.discard(worker)
+
+        if error:
+            print(error)
+
+        if parent_item not in self.loading:
+            return
+
+        if parent_item.children:
+            self.beginRemoveRows(self.get_node_index(parent_item), 0, len(parent_item.children) - 1)
+            parent_item.children = []
+            self.endRemoveRows()
+
+        parent_item.listed_mtime = listed_mtime
+        self.insert_children(parent_item, children, revalidate=from_cache)
+
+    def insert_children(self, parent_item, children, batch_size=VIEWER_FETCH_BATCH_SIZE, revalidate=False):
+        """
+        Add the next batch of children to a folder, and schedule the batch after it, so the view can repaint in between.
+        The view lays out the whole folder again after every insert, so each batch is twice as large as the one before.
+        If revalidate is True, the folder is checked for changes once all of its children have been added.
+        """
+        if parent_item not in self.loading:
+            return
+
+        batch = children[:batch_size]
+        if batch:
+            first_row = len(parent_item.children)
+            self.beginInsertRows(self.get_node_index(parent_item), first_row, first_row + len(batch) - 1)
+            parent_item.children.extend(batch)
+            self.add_nodes(batch, first_row)
+            self.endInsertRows()
+
+        remaining = children[batch_size:]
+        if remaining:
+            QTimer.singleShot(0, lambda: self.insert_children(parent_item, remaining, batch_size * 2, revalidate))
+            return
+
+        self.loading.discard(parent_item)
+        if revalidate:
+            self.refresh_children([parent_item])
+
+    def refresh_children(self, folders=None):
+        """
+        Check listed folders for changes on a worker thread, and update the rows that changed.
+        Folders that are still being listed, or are already being checked, are left alone.
+
+        Args:
+        - folders (list): The folders to check, or None for every listed folder.
+
+        Returns:
+        - bool: True if a check was started, in which case refreshed is emitted when it has finished.
+        """
+        if folders is None:
+            folders = [node for node in self.nodes.values() if node.is_dir and node.children is not None]
+
+        folders = [folder for folder in folders if folder not in self.loading and folder not in self.refreshing]
+        if not folders:
+            return False
+
+        # Parents are checked first, so folders that have been deleted are removed before they would be listed
+        folders.sort(key=lambda node: node.path.count("/"))
+
+        self.refreshing.update(folders)
+        worker = RenderFarmWorker(self.list_changed_folders, folders)
+        worker.signals.finished.connect(lambda changes: self.on_folders_refreshed(worker, folders, changes))
+        worker.signals.error.connect(lambda error: self.on_folders_refreshed(worker, folders, [], error))
+        self.workers.add(worker)
+        worker.start()
+
+        return True
+
+    def list_changed_folders(self, folders):
+        """
+        List the folders that have changed since they were last listed. A folder's modified time changes when a file
+        is added to it, removed or renamed, so the others only cost a stat. This runs on a worker thread, so it must not touch the model,
+        and it checks the folders on its own SFTP channel, as fetchMore and watch mode may be listing folders at the same time.
+
+        Args:
+        - folders (list): The listed folders to check.
+
+        Returns:
+        - list: A (folder, modified time, child nodes) tuple for each folder that changed.
+        """
+        changes = []
+
+        channel = sftp_open_channel(self.sftp)
+        try:
+            for folder in folders:
+                attributes = sftp_stat(channel, folder.path, self.stats)
+                if attributes is None or attributes.st_mtime == folder.listed_mtime:
+                    continue
+
+                try:
+                    entries = sftp_listdir_attr(channel, folder.path, self.stats, follow_links=True, raise_errors=True)
+                except IOError as e:
+                    print(f"An error occurred: {e}")
+                    continue
+
+                listed_mtime = get_listed_mtime(attributes.st_mtime)
+                self.cache.store(folder.path, listed_mtime, entries)
+
+                changes.append((folder, listed_mtime, self.create_children(folder, entries)))
+        finally:
+            sftp_close_channel(self.sftp, channel)
+
+        return changes
+
+    def on_folders_refreshed(self, worker, folders, changes, error=""):
+        """
+        Called on the main thread when refresh_children has finished checking the folders.
+
+        Args:
+        - worker (RenderFarmWorker): The worker that checked the folders.
+        - folders (list): The folders that were checked.
+        - changes (list): The tuples returned by list_changed_folders.
+        - error (str): The traceback if the check raised an exception.
+        """
+        self.workers.discard(worker)
+        self.refreshing.difference_update(folders)
+
+        if error:
+            print(error)
+
+        added = 0
+        for folder, mtime, children in changes:
+            # The folder may have been removed by its parent's changes, or fetched again while it was being checked
+            if not self.is_in_tree(folder) or folder in self.loading:
+                continue
+
+            added += self.update_children(folder, children)
+            folder.listed_mtime = mtime
+
+        self.refreshed.emit(added, len(changes))
+
+    def update_children(self, parent_item, children):
+        """
+        Compare a new listing of a folder with its nodes, and remove, update and insert rows to match it.
+        Rows are only added and removed where they changed, so the view keeps everything else as it was.
+
+        Args:
+        - parent_item (FarmNode): The folder that was listed.
+        - children (list): The new child nodes, in any order.
+
+        Returns:
+        - int: The number of files that were added, counting each frame of a new sequence.
+        """
+        parent_index = self.get_node_index(parent_item)
+        old_children = parent_item.children
+        new_children = {child.path: child for child in children}
+
+        def is_kept(node):
+            new_node = new_children.get(node.path)
+            return new_node is not None and new_node.is_dir == node.is_dir and (new_node.sequence is None) == (node.sequence is None)
+
+        # Remove the rows that are gone, a run of rows at a time from the bottom up, so the rows above stay where they are
+        row = len(old_children) - 1
+        while row >= 0:
+            if is_kept(old_children[row]):
+                row -= 1
+                continue
+
+            last_row = row
+            while row >= 0 and not is_kept(old_children[row]):
+                row -= 1
+
+            self.beginRemoveRows(parent_index, row + 1, last_row)
+            for node in old_children[row + 1:last_row + 1]:
+                self.remove_nodes(node)
+            del old_children[row + 1:last_row + 1]
+            self.add_nodes(old_children[row + 1:], row + 1)
+            self.endRemoveRows()
+
+        # Update the rows that are still there. The frames of a sequence are compared in the same way
+        added = 0
+        changed_rows = []
+        for node in old_children:
+            new_node = new_children.pop(node.path)
+            if node.sequence is not None:
+                added += self.update_children(node, new_node.children)
+                if node.sequence.label != new_node.sequence.label:
+                    changed_rows.append(node.row)
+                node.sequence = new_node.sequence
+                node.name = new_node.name
+
+            if (node.mode, node.size, node.mtime) != (new_node.mode, new_node.size, new_node.mtime):
+                node.mode, node.size, node.mtime = new_node.mode, new_node.size, new_node.mtime
+                changed_rows.append(node.row)
+
+        if changed_rows:
+            self.dataChanged.emit(self.index(min(changed_rows), 0, parent_index), self.index(max(changed_rows), 0, parent_index))
+
+        # Insert the new rows where they belong in the sort order, each run of rows between two old rows at once
+        descending = self.sort_order == Qt.DescendingOrder
+        added_children = sorted(new_children.values(), key=get_sort_key, reverse=descending)
+
+        runs = []
+        for node in added_children:
+            row = self.find_sorted_row(old_children, get_sort_key(node), descending)
+            if runs and runs[-1][0] == row:
+                runs[-1][1].append(node)
+            else:
+                runs.append((row, [node]))
+
+        # From the bottom up, so the rows that the earlier runs go before haven't moved
+        for row, nodes in reversed(runs):
+            for node in nodes:
+                node.parent = parent_item
+
+            self.beginInsertRows(parent_index, row, row + len(nodes) - 1)
+            old_children[row:row] = nodes
+            self.add_nodes(old_children[row:], row)
+            self.endInsertRows()
+
+        for node in added_children:
+            if node.sequence is not None:
+                added += len(node.children)
+            elif not node.is_dir:
+                added += 1
+
+        return added
+
+    def find_sorted_row(self, children, key, descending=False):
+        """
+        Find the row that a node with the given sort key would be inserted at, after any nodes with the same key.
+
+        Args:
+        - children (list): Nodes sorted by get_sort_key.
+        - key (str): The sort key of the new node.
+        - descending (bool): Whether the nodes are in descending order.
+
+        Returns:
+        - int: The row.
+        """
+        low, high = 0, len(children)
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = get_sort_key(children[middle])
+            if (key > middle_key) if descending else (key < middle_key):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def create_children(self, parent_item, entries=[]):
+        """
+        Create the child nodes of a folder from its listing, with numbered files grouped into sequences, sorted in the model's sort order.
+
+        Args:
+        - parent_item (FarmNode): The folder that was listed.
+        - entries (list): The SFTPAttributes of the folder's entries.
+
+        Returns:
+        - list: The child nodes.
+        """
+        parent_path = parent_item.path
+        entries, sequences = group_sequences(entries)
+
+        children = [self.create_item(parent_path + "/" + entry.filename, parent_item, entry) for entry in entries]
+        children += [self.create_sequence_item(parent_item, sequence) for sequence in sequences]
+        self.sort_children(children, self.sort_order)
+
+        return children
+
+    def create_sequence_item(self, parent_item, sequence):
+        """
+        Create the node of a sequence, with a node for each of its frames inside it.
+        Its size is the size of every frame, and its modified time is the time of the newest frame.
+
+        Args:
+        - parent_item (FarmNode): The folder the sequence is in.
+        - sequence (FileSequence): The sequence.
+
+        Returns:
+        - FarmNode: The sequence node.
+        """
+        node = self.create_item(parent_item.path + "/" + sequence.name, parent_item)
+        node.sequence = sequence
+        node.name = sequence.label
+        node.size = sum(entry.st_size or 0 for entry in sequence.entries)
+        node.mtime = max(entry.st_mtime or 0 for entry in sequence.entries)
+
+        node.children = [self.create_item(parent_item.path + "/" + entry.filename, node, entry) for entry in sequence.entries]
+        self.sort_children(node.children, self.sort_order)
+
+        return node
+
+    def create_item(self, path, parent, entry=None):
         """Creates a custom item to be shown in the file browser"""
 
-        icon_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
+        # The entry comes from the parent's listing, so checking for a directory doesn't need a network request
+        is_dir = sftp_entry_isdir(entry)
 
         # Sets folder icons
-        if sftp_isdir(self.sftp, path):
+        if is_dir:
             if path == self.home_path:
-                icon_path = os.path.join(icon_path, "farm.png") # Custom icon for the home folder
-            elif path == os.path.join(self.home_path, "projects").replace("\\", "/"):
-                icon_path = os.path.join(icon_path, "project.png")
+                icon_name = "farm.png" # Custom icon for the home folder
+            elif path == self.projects_path:
+                icon_name = "project.png"
             else:
-                icon_path = os.path.join(icon_path, "folder.png")
+                icon_name = "folder.png"
                 
         # Set custom file icons
         else:
             _, file_ext = os.path.splitext(path)
 
             if file_ext.lower() in SUPPORTED_IMAGE_FORMATS:
-                icon_path = os.path.join(icon_path, "image.png")
+                icon_name = "image.png"
             else:
-                icon_path = os.path.join(icon_path, "file.png")
+                icon_name = "file.png"
+
+        node = FarmNode(path, parent, entry, get_icon(icon_name))
+
+        # The home folder is shown as the user's name
+        if path == self.home_path:
+            node.name = self.username
 
-        return {'path': path, 'parent': parent, 'children': None, 'icon': icon_path}
+        return node
 
 
     def rowCount(self, parent=QModelIndex()):
         """
-        Returns the number of rows under the given parent. When the parent is valid, 
-        it means returning the number of children of the parent.
+        Returns the number of rows under the given parent. Folders that haven't been fetched have no rows yet.
         """
-        if not parent.isValid():
-            parent_item = self.rootItem
-            # If it's the root item, include it in the count
-        else:
-            parent_item = parent.internalPointer()
-
-        if not parent_item['children']:
-            parent_path = parent_item['path']
-
-            # Check if parent_path is a directory
-            try:
-                if sftp_isdir(self.sftp, parent_path):
-                    children = sftp_listdir(self.sftp, parent_path)
-                    parent_item['children'] = [self.create_item(os.path.join(parent_path, child).replace("\\", "/"), parent_item) for child in children]
-                    self.sort_children(parent_item['children'], Qt.AscendingOrder)
-                else:
-                    # If it's not a directory, return 0 as it has no children
-                    return 0
-            except FileNotFoundError:
-                # Handle cases where the parent_path does not exist
-                return 0
-
-        return len(parent_item['children'])
+        parent_item = self.get_node(parent)
+
+        if parent_item.children is None:
+            return 0
+
+        return len(parent_item.children)
 
     def columnCount(self, parent=QModelIndex()):
         """Return the number of columns (fixed to 1)."""
@@ -99,80 +699,53 @@ class QFarmSystemModel(QAbstractItemModel):
 
         item = index.internalPointer()
 
-
-        icon_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
-
+        # Everything shown is stored on the node, so repainting doesn't build any strings or icons
         if role == Qt.DisplayRole:
-            if item["path"] == self.home_path:
-                return self.username
-            return os.path.basename(item["path"])
+            return item.name
 
+        elif role == Qt.FontRole:
+            # Pinned folders are shown in bold
+            if item.path in self.pinned:
+                return self.pinned_font
 
         elif role == Qt.DecorationRole:
-            return QIcon(item["icon"])
+            return item.icon
 
         return None
 
     def index(self, row, column, parent=QModelIndex()):
         """
         Returns the index of the item in the model specified by the given row, column, and parent index.
-        This method ensures that data fits nicely within the file browser.
         """
-
-        # Check if the item has a parent. If not, that means the item is /home/username, therefore its parent in /home/ 
-        # /home/ is the rootItem
-        if not parent.isValid():
-            parent_item = self.rootItem
-        else:
-            parent_item = parent.internalPointer()
-
-        # Add all the children to the item
-        if not parent_item['children']:
-            parent_path = parent_item['path']
-
-            children = sftp_listdir(self.sftp, parent_path)
-            parent_item['children'] = [self.create_item(os.path.join(parent_path, child).replace("\\", "/"), parent_item) for child in children]
-            self.sort_children(parent_item['children'], Qt.AscendingOrder)
+        parent_item = self.get_node(parent)
 
         # Check if the row is within the bounds of the parent's children
-        if row < len(parent_item['children']):
-            child_item = parent_item['children'][row]
-            if child_item is None:
-                return QModelIndex()
-
-            # Only show files that exist within /home/username/farm
-            if child_item['path'].startswith(self.home_path):
-                return self.createIndex(row, column, child_item)
+        if parent_item.children is not None and 0 <= row < len(parent_item.children):
+            return self.createIndex(row, column, parent_item.children[row])
 
         return QModelIndex()
 
-
-    def parent(self, index):
+    def flags(self, index):
         """
-        Returns the parent of the model item with the given index.
+        The 'Loading...' row can't be selected.
         """
         if not index.isValid():
-            return QModelIndex()
-
-        item = index.internalPointer()
-        if 'parent' not in item:
-            return QModelIndex()
+            return Qt.NoItemFlags
 
-        parent_item = item['parent']
+        if index.internalPointer().is_placeholder:
+            return PLACEHOLDER_FLAGS
 
-        if parent_item is None:
-            return QModelIndex()
+        return ITEM_FLAGS
 
-        grandparent_item = parent_item['parent']
-        
-        if grandparent_item is None:
+    def parent(self, index):
+        """
+        Returns the parent of the model item with the given index.
+        """
+        if not index.isValid():
             return QModelIndex()
 
-        # Check if children list exists before accessing its attributes
-        if 'children' in grandparent_item and parent_item in grandparent_item['children']:
-            parent_index = self.createIndex(grandparent_item['children'].index(parent_item), 0, parent_item)
-            return parent_index
-        return QModelIndex()
+        # The root is the invalid index, so the children of the root have no parent index
+        return self.get_node_index(index.internalPointer().parent)
 
     def filePath(self, index):
         """
@@ -185,35 +758,82 @@ class QFarmSystemModel(QAbstractItemModel):
             str: The file path of the item.
         """
         item = index.internalPointer()
-        if item:
-            return item.get('path', '')
+        if item and not item.is_placeholder:
+            return item.path
         return ''
 
-    def findIndex(self, path, parent=QModelIndex()):
+    def isDir(self, index):
         """
-        Finds the QModelIndex corresponding to the given path.
+        Check if the item at an index is a folder, without a network request.
+
+        Args:
+            index (QModelIndex): The index of the item.
+
+        Returns:
+            bool: True if the item is a folder.
         """
-        if not path:
-            return QModelIndex()
+        item = index.internalPointer()
+        return item is not None and item.is_dir
+
+    def isSequence(self, index):
+        """
+        Check if the item at an index is a sequence of frames.
+
+        Args:
+            index (QModelIndex): The index of the item.
+
+        Returns:
+            bool: True if the item is a sequence.
+        """
+        item = index.internalPointer()
+        return item is not None and item.sequence is not None
+
+    def sequencePaths(self, index):
+        """
+        Get the file paths of the frames of a sequence, so it can be opened, downloaded or deleted as one.
+
+        Args:
+            index (QModelIndex): The index of the sequence.
+
+        Returns:
+            list: The paths of the frames, in frame order. Empty if the item isn't a sequence.
+        """
+        if not self.isSequence(index):
+            return []
+
+        item = index.internalPointer()
+        return [item.parent.path + "/" + entry.filename for entry in item.sequence.entries]
+
+    def setPinned(self, index, pinned=True):
+        """
+        Pin or unpin a folder, so the viewer watches it for new files even when it is collapsed.
+        A pinned folder that hasn't been listed yet is listed straight away.
+
+        Args:
+            index (QModelIndex): The index of the folder.
+            pinned (bool): Whether the folder should be pinned.
+        """
+        item = index.internalPointer()
+        if item is None or not item.is_dir:
+            return
 
-        # Start from the root item if no parent is specified
-        if not parent.isValid():
-            parent_item = self.rootItem
+        if pinned:
+            self.pinned.add(item.path)
+            if self.canFetchMore(index):
+                self.fetchMore(index)
         else:
-            parent_item = parent.internalPointer()
-
-        # Traverse the model to find the index corresponding to the path
-        for row in range(self.rowCount(parent)):
-            child_index = self.index(row, 0, parent)
-            if child_index.isValid():
-                child_item = child_index.internalPointer()
-                if child_item['path'] == path:
-                    return child_index
-                elif sftp_isdir(self.sftp, child_item['path']) and path.startswith(child_item['path']):
-                    # Recursively search for the index in child items
-                    return self.findIndex(path, child_index)
+            self.pinned.discard(item.path)
 
-        return QModelIndex()
+        self.dataChanged.emit(index, index)
+
+    def findIndex(self, path):
+        """
+        Finds the QModelIndex corresponding to the given path. Only folders that have already been listed are searched.
+        """
+        node = self.nodes.get(path)
+        if node is None:
+            return QModelIndex()
+        return self.get_node_index(node)
 
     def sort(self, column, order=Qt.SortOrder.AscendingOrder):
         """
@@ -222,19 +842,28 @@ class QFarmSystemModel(QAbstractItemModel):
         if column != 0:
             return
 
+        self.sort_order = order
+
         # Recursively sort all children of the root item
         def recursive_sort(item):
-            if item['children']:
-                item['children'].sort(key=lambda x: os.path.basename(x['path']).lower(), reverse=(order == Qt.SortOrder.DescendingOrder))
-                for child in item['children']:
+            if item.children:
+                item.children.sort(key=get_sort_key, reverse=(order == Qt.SortOrder.DescendingOrder))
+                for row, child in enumerate(item.children):
+                    child.row = row
                     recursive_sort(child)
 
         self.layoutAboutToBeChanged.emit()
+        persistent_indexes = self.persistentIndexList()
+        persistent_nodes = [index.internalPointer() for index in persistent_indexes]
+
         recursive_sort(self.rootItem)
+
+        # The rows have moved, so the view's indexes have to follow their nodes
+        self.changePersistentIndexList(persistent_indexes, [self.get_node_index(node) for node in persistent_nodes])
         self.layoutChanged.emit()
 
     def sort_children(self, children, order):
         """
-        Sorts the children list alphabetically.
+        Sorts the children list by name, with the numbers in names in numeric order, see get_natural_sort_key.
         """
-        children.sort(key=lambda x: os.path.basename(x['path']).lower(), reverse=(order == Qt.SortOrder.DescendingOrder))
\ No newline at end of file
+        children.sort(key=get_sort_key, reverse=(order == Qt.SortOrder.DescendingOrder))
\ No newline at end of file
@@ -0,0 +1,52 @@
+# Anything that talks to the renderfarm can take a while, and running it on the Qt main thread freezes Maya and Houdini until it is done.
+# RenderFarmWorker runs a function on a background thread from the global QThreadPool, and reports back to the main thread with signals.
+# Signals are always delivered on the thread the receiving object lives on, so slots connected from the GUI can safely update widgets.
+
+import traceback
+from PySide2 import QtCore
+
+class RenderFarmWorkerSignals(QtCore.QObject):
+    """
+    Signals emitted by RenderFarmWorker. QRunnable is not a QObject, so it can't have signals of its own.
+    """
+    finished = QtCore.Signal(object)  # Emitted with the return value of the function
+    error = QtCore.Signal(str)  # Emitted with the traceback if the function raised an exception
+    failed = QtCore.Signal(object)  # Emitted with the exception itself, for slots that handle some errors differently
+    progress = QtCore.Signal(object)  # Emitted by the function itself, through the progress callback
+
+class RenderFarmWorker(QtCore.QRunnable):
+    """
+    QRunnable that runs a function on a background thread.
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        """
+        Initialize RenderFarmWorker instance.
+
+        Args:
+        - function: The function to run.
+        - args, kwargs: Arguments passed to the function.
+        """
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = RenderFarmWorkerSignals()
+
+    def run(self):
+        """
+        Run the function and emit finished or error when it is done.
+        """
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(e)
+            self.signals.error.emit(traceback.format_exc())
+        else:
+            self.signals.finished.emit(result)
+
+    def start(self):
+        """
+        Queue the worker on the global thread pool.
+        """
+        QtCore.QThreadPool.globalInstance().start(self)
@@ -0,0 +1,307 @@
+# Profiling mode measures how long the tools take to open, so startup time can be tracked from one release to the next.
+# It is turned on by setting the NCCA_PROFILE environment variable before starting Maya or Houdini:
+#
+#   NCCA_PROFILE=1            write reports to NCCA_PROFILE_DIR (see /ncca_shelftools/config/__init__.py)
+#   NCCA_PROFILE=/some/folder write reports to that folder
+#
+# It records the import time of every module in config, utils, ncca_renderfarm, ncca_for_maya and ncca_for_houdini, and of the
+# packages they import on first use (e.g. paramiko), along with the time taken to build each dialog, to connect and to make the first SFTP call.
+#
+# Each report is a JSON file in the Chrome trace event format, which can be opened in chrome://tracing, https://ui.perfetto.dev or https://www.speedscope.app
+# to see a flame graph. A 'summary' section lists the totals, and a '.folded' file next to it can be read by flamegraph.pl.
+#
+# This file only uses the standard library and does not import config, so that it can be imported before anything else and time the rest.
+# When NCCA_PROFILE is not set, section and mark do nothing.
+
+import os, sys, time, json, threading, atexit, hashlib, platform
+from contextlib import contextmanager, nullcontext
+
+PROFILE_ENV_VAR = "NCCA_PROFILE"
+
+# Every module in these packages is timed
+PROFILED_PACKAGES = ["config", "utils", "ncca_renderfarm", "ncca_for_maya", "ncca_for_houdini"]
+
+# Only the top module of these is timed, as they are imported by the tools when first needed
+PROFILED_DEPENDENCIES = ["paramiko", "cryptography", "OpenEXR", "numpy", "PIL"]
+
+class StartupProfiler():
+    """
+    Records timed sections and writes them to a report.
+    """
+
+    def __init__(self, output_dir=""):
+        """
+        Initialize StartupProfiler instance.
+
+        Args:
+        - output_dir (str): The folder to write the report to, or an empty string for NCCA_PROFILE_DIR.
+        """
+        self.output_dir = output_dir
+        self.start_time = time.perf_counter()
+        self.started_at = time.strftime("%Y%m%d-%H%M%S")
+
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.events = []
+        self.folded = {}
+        self.summary = {"imports": {}, "dialogs": {}, "network": {}, "marks": {}}
+        self.once = set()
+        self.tools_hash = None
+
+    def get_stack(self):
+        """
+        Get the sections that are running on the current thread, outermost first.
+        """
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def section(self, name="", category="section"):
+        """
+        Time a block of code. Sections inside each other are shown nested in the flame graph.
+
+        Args:
+        - name (str): The name of the section, e.g. the module or dialog name.
+        - category (str): 'import', 'dialog', 'network' or 'section'.
+        """
+        stack = self.get_stack()
+        entry = {"name": name, "children": 0.0}
+        stack.append(entry)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+
+            duration = end - start
+            if stack:
+                stack[-1]["children"] += duration
+
+            self.record(name, category, start, duration, duration - entry["children"], [item["name"] for item in stack] + [name])
+
+            # Imports are written at the end, everything else as it happens, as Maya or Houdini may stay open for hours
+            if category != "import":
+                self.write_report()
+
+    def record(self, name="", category="", start=0.0, duration=0.0, self_time=0.0, stack=[]):
+        """
+        Add a finished section to the report.
+        """
+        with self.lock:
+            self.events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self.start_time) * 1e6, 1),
+                "dur": round(duration * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": threading.get_ident()
+            })
+
+            folded_stack = ";".join(stack)
+            self.folded[folded_stack] = self.folded.get(folded_stack, 0.0) + self_time
+
+            milliseconds = round(duration * 1000, 3)
+            if category == "import":
+                self.summary["imports"][name] = milliseconds
+                # Only the outermost imports count towards the total, the rest are inside them
+                if len(stack) == 1:
+                    self.summary["import_total_ms"] = round(self.summary.get("import_total_ms", 0.0) + milliseconds, 3)
+            elif category == "dialog":
+                self.summary["dialogs"][name] = milliseconds
+            elif category == "network":
+                self.summary["network"][name] = milliseconds
+
+    def mark(self, name=""):
+        """
+        Record the time since profiling started, e.g. when the login dialog appears. Only the first time is kept.
+
+        Args:
+        - name (str): The name of the moment.
+        """
+        now = time.perf_counter()
+
+        with self.lock:
+            if name in self.summary["marks"]:
+                return
+            self.summary["marks"][name] = round((now - self.start_time) * 1000, 3)
+            self.events.append({
+                "name": name,
+                "cat": "mark",
+                "ph": "i",
+                "s": "p",
+                "ts": round((now - self.start_time) * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": threading.get_ident()
+            })
+
+        self.write_report()
+
+    def get_report_path(self):
+        """
+        Get the path of the JSON report. Every Maya or Houdini session writes its own report.
+        """
+        output_dir = self.output_dir
+        if not output_dir:
+            from config import NCCA_PROFILE_DIR
+            output_dir = NCCA_PROFILE_DIR
+
+        return os.path.join(output_dir, f"startup_{self.started_at}_{os.getpid()}.json")
+
+    def get_metadata(self):
+        """
+        Describe what was profiled, so reports from different releases and machines can be compared.
+        """
+        from config import STARTUP_IMPORT_BUDGET
+
+        # The tools have no version number, so a hash of their source code tells releases apart
+        if self.tools_hash is None:
+            tools_dir = os.path.dirname(os.path.abspath(__file__))
+            source_hash = hashlib.sha1()
+            for folder, dirs, files in sorted(os.walk(tools_dir)):
+                for file_name in sorted(files):
+                    if file_name.endswith(".py"):
+                        with open(os.path.join(folder, file_name), "rb") as file:
+                            source_hash.update(file.read())
+            self.tools_hash = source_hash.hexdigest()[:12]
+
+        return {
+            "tools_hash": self.tools_hash,
+            "application": os.path.basename(sys.executable),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": self.started_at,
+            "import_budget_ms": STARTUP_IMPORT_BUDGET * 1000
+        }
+
+    def write_report(self):
+        """
+        Write the JSON report and the folded stacks.
+        """
+        try:
+            report_path = self.get_report_path()
+            os.makedirs(os.path.dirname(report_path), exist_ok=True)
+
+            metadata = self.get_metadata()
+
+            with self.lock:
+                summary = dict(self.summary)
+                summary["over_import_budget"] = summary.get("import_total_ms", 0.0) > metadata["import_budget_ms"]
+                report = {"traceEvents": list(self.events), "displayTimeUnit": "ms", "metadata": metadata, "summary": summary}
+                folded = dict(self.folded)
+
+            with open(report_path, "w") as file:
+                json.dump(report, file, indent=2)
+
+            # flamegraph.pl expects whole numbers, so the folded stacks are in microseconds
+            with open(os.path.splitext(report_path)[0] + ".folded", "w") as file:
+                for stack, seconds in sorted(folded.items()):
+                    file.write(f"{stack} {int(seconds * 1e6)}\n")
+        except Exception as e:
+            # Profiling must never stop the tools from working
+            print(f"Failed to write the profiling report: {e}")
+
+class ProfilingLoader():
+    """
+    Wraps the loader of a module, timing how long the module takes to run.
+    """
+
+    def __init__(self, loader=None, profiler=None):
+        self.loader = loader
+        self.profiler = profiler
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self.profiler.section(module.__name__, "import"):
+            self.loader.exec_module(module)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+class ProfilingFinder():
+    """
+    Placed first in sys.meta_path, so every module that should be timed is found through it and loaded with a ProfilingLoader.
+    """
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+
+    def is_profiled(self, fullname=""):
+        return fullname.split(".")[0] in PROFILED_PACKAGES or fullname in PROFILED_DEPENDENCIES
+
+    def find_spec(self, fullname, path=None, target=None):
+        if not self.is_profiled(fullname):
+            return None
+
+        # Let the other finders find the module, then wrap its loader
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = ProfilingLoader(spec.loader, self.profiler)
+
+        return spec
+
+profiler = None
+
+def start(output_dir=""):
+    """
+    Start profiling, if it hasn't started already.
+
+    Args:
+    - output_dir (str): The folder to write the report to, or an empty string for NCCA_PROFILE_DIR.
+    """
+    global profiler
+
+    if profiler is not None:
+        return
+
+    profiler = StartupProfiler(output_dir)
+    sys.meta_path.insert(0, ProfilingFinder(profiler))
+    atexit.register(profiler.write_report)
+
+def section(name="", category="section"):
+    """
+    Time a block of code when profiling is on, e.g. 'with profiling.section("RenderFarmLoginDialog", "dialog"):'
+
+    Args:
+    - name (str): The name of the section.
+    - category (str): 'import', 'dialog', 'network' or 'section'.
+    """
+    if profiler is None:
+        return nullcontext()
+    return profiler.section(name, category)
+
+def section_once(name="", category="section"):
+    """
+    Like section, but only the first time it is called with this name, e.g. for the first SFTP call.
+    """
+    if profiler is None or name in profiler.once:
+        return nullcontext()
+    profiler.once.add(name)
+    return profiler.section(name, category)
+
+def mark(name=""):
+    """
+    Record the time since profiling started when profiling is on, e.g. when the login dialog appears.
+
+    Args:
+    - name (str): The name of the moment.
+    """
+    if profiler is not None:
+        profiler.mark(name)
+
+profile_setting = os.getenv(PROFILE_ENV_VAR, "")
+if profile_setting and profile_setting.lower() not in ("0", "false", "no", "off"):
+    start("" if profile_setting.lower() in ("1", "true", "yes", "on") else profile_setting)
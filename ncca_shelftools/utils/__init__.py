@@ -1,6 +1,16 @@
 from .modules import *
 from .exr import *
+from .ignore import *
 from .sftp_utils import *
+from .sftp_exec import *
+from .sftp_transfer import *
+from .sftp_objects import *
+from .sftp_manifest import *
+from .sftp_session import *
+from .listing_cache import *
+from .sequences import *
+from .broker import *
+from .dependencies import *
 
 from PySide2 import QtWidgets, QtCore
 from shiboken2 import wrapInstance 
@@ -0,0 +1,704 @@
+# Artists often have Maya and Houdini open at the same time, and each of them has to log in to the renderfarm separately.
+# With BROKER_ENABLED (see /ncca_shelftools/config/renderfarm.py), the first login also starts a small broker process in the background.
+# The broker holds its own logged in session (see /ncca_shelftools/utils/sftp_session.py), and listens on localhost for the other tools.
+# Any tool started afterwards, in any application, sends its SFTP and exec requests through the broker instead of logging in again.
+#
+# Only the user who started the broker can use it. Its port and a random token are written to BROKER_INFO_PATH (see /ncca_shelftools/config/__init__.py),
+# which only that user can read, and every connection has to send the token first.
+# The broker stops by itself after BROKER_IDLE_TIMEOUT seconds without any connections.
+#
+# The broker can be run by hand against any SSH server, e.g. a local test server:
+#   python -c "from utils.broker import main; main()" --address 127.0.0.1 --port 2222 < credentials.json
+# where credentials.json contains {"username": "...", "password": "..."}
+
+import os, sys, json, socket, struct, threading, subprocess, secrets, hmac, time
+
+from config import *
+import profiling
+
+# Methods of paramiko.SFTPClient that can be called through the broker
+BROKER_SFTP_METHODS = [
+    "listdir", "listdir_attr", "stat", "lstat", "mkdir", "rmdir", "remove", "unlink",
+    "rename", "posix_rename", "symlink", "readlink", "chmod", "utime", "normalize"
+]
+
+BROKER_ATTRIBUTES = ["filename", "longname", "st_size", "st_uid", "st_gid", "st_mode", "st_atime", "st_mtime"]
+
+def send_message(connection=None, header={}, payload=b""):
+    """
+    Send a message to the other end of a broker connection. A message is a JSON header, followed by an optional binary payload.
+
+    Args:
+    - connection (socket.socket): The connection.
+    - header (dict): The header. Its 'size' is set to the length of the payload.
+    - payload (bytes): The binary payload, e.g. the contents of a file.
+    """
+    header = dict(header, size=len(payload))
+    header_data = json.dumps(header).encode()
+    connection.sendall(struct.pack("!I", len(header_data)) + header_data + payload)
+
+def receive_exactly(connection=None, size=0):
+    """
+    Receive an exact number of bytes from a connection.
+
+    Raises:
+    - EOFError: If the connection is closed first.
+    """
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(min(size - len(data), 1024 * 1024))
+        if not chunk:
+            raise EOFError("The broker connection was closed.")
+        data += chunk
+    return bytes(data)
+
+def receive_message(connection=None):
+    """
+    Receive a message sent with send_message.
+
+    Returns:
+    - tuple: (header, payload)
+    """
+    header_size = struct.unpack("!I", receive_exactly(connection, 4))[0]
+    header = json.loads(receive_exactly(connection, header_size).decode())
+    return header, receive_exactly(connection, header["size"])
+
+def attributes_to_dict(attributes=None):
+    """
+    Convert paramiko SFTPAttributes to a dictionary, so they can be sent as JSON.
+    """
+    return {name: getattr(attributes, name, None) for name in BROKER_ATTRIBUTES}
+
+def dict_to_attributes(values={}):
+    """
+    Convert a dictionary from attributes_to_dict back to paramiko SFTPAttributes.
+    """
+    import paramiko
+
+    attributes = paramiko.SFTPAttributes()
+    for name, value in values.items():
+        if value is not None:
+            setattr(attributes, name, value)
+    return attributes
+
+#
+# BROKER PROCESS
+#
+
+class BrokerServer():
+    """
+    Serves SFTP and exec requests from local tools, using a logged in RenderFarmSession.
+    """
+
+    def __init__(self, session=None, token="", idle_timeout=BROKER_IDLE_TIMEOUT):
+        """
+        Initialize BrokerServer instance.
+
+        Args:
+        - session (RenderFarmSession): The logged in session that requests are run on.
+        - token (str): The token that every connection must send first.
+        - idle_timeout (float): Number of seconds without any connections before the broker stops.
+        """
+        self.session = session
+        self.token = token
+        self.idle_timeout = idle_timeout
+
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.last_activity = time.time()
+
+    def serve(self, server_socket=None):
+        """
+        Accept connections until the broker has been idle for idle_timeout seconds.
+
+        Args:
+        - server_socket (socket.socket): A listening socket.
+        """
+        server_socket.settimeout(1.0)
+
+        while True:
+            try:
+                connection, address = server_socket.accept()
+            except socket.timeout:
+                with self.lock:
+                    if self.connections == 0 and time.time() - self.last_activity > self.idle_timeout:
+                        return
+                continue
+
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self.handle_connection, args=(connection,), daemon=True).start()
+
+    def handle_connection(self, connection=None):
+        """
+        Run the requests of one connection, one at a time, until it is closed. This runs on its own thread.
+        """
+        state = {"sftp": None, "files": {}, "channel": None}
+
+        try:
+            connection.settimeout(BROKER_CONNECT_TIMEOUT)
+            header, payload = receive_message(connection)
+            if header.get("op") != "auth" or not hmac.compare_digest(str(header.get("token", "")), self.token):
+                send_message(connection, {"error": "PermissionError", "message": "Invalid broker token"})
+                return
+            send_message(connection, {"result": self.session.username})
+
+            connection.settimeout(None)
+            while True:
+                header, payload = receive_message(connection)
+                try:
+                    result, result_payload = self.handle_request(state, header, payload)
+                    send_message(connection, {"result": result}, result_payload)
+                except Exception as e:
+                    send_message(connection, {"error": type(e).__name__, "message": getattr(e, "strerror", None) or str(e), "errno": getattr(e, "errno", None)})
+        except (EOFError, OSError):
+            pass
+        finally:
+            self.close_state(state)
+            connection.close()
+            with self.lock:
+                self.connections -= 1
+                self.last_activity = time.time()
+
+    def get_sftp(self, state={}):
+        """
+        Get the SFTP channel of a connection, taken from the session's pool the first time it is needed.
+        """
+        if state["sftp"] is None:
+            state["sftp"] = self.session.acquire_sftp()
+        return state["sftp"]
+
+    def handle_request(self, state={}, header={}, payload=b""):
+        """
+        Run a single request.
+
+        Args:
+        - state (dict): The open channel, files and exec channel of the connection.
+        - header (dict): The request. 'op' is the operation to run.
+        - payload (bytes): Data sent with the request.
+
+        Returns:
+        - tuple: (result, payload) to send back.
+        """
+        op = header["op"]
+
+        if op == "call":
+            method = header["method"]
+            if method not in BROKER_SFTP_METHODS:
+                raise ValueError(f"{method} can't be called through the broker")
+
+            result = getattr(self.get_sftp(state), method)(*header.get("args", []))
+
+            if method in ("stat", "lstat"):
+                return attributes_to_dict(result), b""
+            if method == "listdir_attr":
+                return [attributes_to_dict(entry) for entry in result], b""
+            return result if isinstance(result, (str, int, list, type(None))) else None, b""
+
+        # Files
+        if op == "open":
+            remote_file = self.get_sftp(state).open(header["path"], header["mode"])
+            if "w" in header["mode"] or "a" in header["mode"]:
+                # Don't wait for each write to be confirmed, errors are reported when the file is closed
+                remote_file.set_pipelined(True)
+            file_id = str(len(state["files"]) + 1) + "_" + secrets.token_hex(4)
+            state["files"][file_id] = remote_file
+            return file_id, b""
+        if op == "read":
+            return None, state["files"][header["file"]].read(header.get("length"))
+        if op == "write":
+            state["files"][header["file"]].write(payload)
+            return None, b""
+        if op == "seek":
+            state["files"][header["file"]].seek(header["offset"])
+            return None, b""
+        if op == "prefetch":
+            state["files"][header["file"]].prefetch(header.get("length"))
+            return None, b""
+        if op == "file_stat":
+            return attributes_to_dict(state["files"][header["file"]].stat()), b""
+        if op == "close":
+            state["files"].pop(header["file"]).close()
+            return None, b""
+
+        # Exec channels
+        if op == "exec":
+            channel = self.session.get_transport().open_session()
+            state["channel"] = channel
+            channel.settimeout(header.get("timeout"))
+            channel.exec_command(header["command"])
+            return None, b""
+        if op == "send":
+            state["channel"].sendall(payload)
+            return None, b""
+        if op == "shutdown_write":
+            state["channel"].shutdown_write()
+            return None, b""
+        if op == "recv":
+            return None, state["channel"].recv(header["length"])
+        if op == "recv_stderr":
+            return None, state["channel"].recv_stderr(header["length"])
+        if op == "exit_status":
+            return state["channel"].recv_exit_status(), b""
+
+        raise ValueError(f"Unknown broker operation {op}")
+
+    def close_state(self, state={}):
+        """
+        Close everything a connection opened, and give its SFTP channel back to the session's pool.
+        """
+        for remote_file in state["files"].values():
+            try:
+                remote_file.close()
+            except Exception:
+                pass
+
+        if state["channel"] is not None:
+            state["channel"].close()
+
+        if state["sftp"] is not None:
+            self.session.release_sftp(state["sftp"])
+
+def write_broker_info(port=0, token="", username=""):
+    """
+    Write the broker's port and token to BROKER_INFO_PATH, so that only the current user can read them.
+    """
+    temp_path = BROKER_INFO_PATH + ".tmp"
+
+    # The mode is only applied to a new file, so a temp file left behind by a broker that crashed is removed first,
+    # and O_EXCL makes sure the token is never written into a file (or link) that someone else created
+    try:
+        os.remove(temp_path)
+    except FileNotFoundError:
+        pass
+
+    file_descriptor = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(file_descriptor, "w") as file:
+        # The umask can't loosen the mode, but make sure of it before the token is written
+        os.chmod(temp_path, 0o600)
+        json.dump({"port": port, "token": token, "username": username, "pid": os.getpid()}, file)
+
+    os.replace(temp_path, BROKER_INFO_PATH)
+
+def read_broker_info():
+    """
+    Read the broker's port and token.
+
+    Returns:
+    - dict: The broker info, or None if no broker has been started.
+    """
+    try:
+        with open(BROKER_INFO_PATH, "r") as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return None
+
+def run_broker(username="", password="", address=RENDERFARM_ADDRESS, port=RENDERFARM_PORT, idle_timeout=BROKER_IDLE_TIMEOUT):
+    """
+    Log in to the renderfarm and serve local tools until the broker has been idle for idle_timeout seconds.
+
+    Args:
+    - username (str): The username to log in with.
+    - password (str): The password to log in with.
+    - address (str): The address of the SSH server.
+    - port (int): The port of the SSH server.
+    - idle_timeout (float): Number of seconds without any connections before the broker stops.
+    """
+    from .sftp_session import RenderFarmSession
+
+    session = RenderFarmSession(username, password, address, port)
+    session.ensure_connected()
+
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(("127.0.0.1", 0))
+    server_socket.listen()
+
+    token = secrets.token_hex(32)
+    write_broker_info(server_socket.getsockname()[1], token, username)
+
+    try:
+        BrokerServer(session, token, idle_timeout).serve(server_socket)
+    finally:
+        server_socket.close()
+        session.close()
+
+        # Only remove the info if a newer broker hasn't replaced it
+        info = read_broker_info()
+        if info is not None and info.get("pid") == os.getpid():
+            os.remove(BROKER_INFO_PATH)
+
+def start_broker(username="", password="", address=RENDERFARM_ADDRESS, port=RENDERFARM_PORT):
+    """
+    Start the broker in a new background process. The credentials are sent through its standard input, so they don't show up in the process list.
+
+    Args:
+    - username (str): The username to log in with.
+    - password (str): The password to log in with.
+    - address (str): The address of the SSH server.
+    - port (int): The port of the SSH server.
+    """
+    from .modules import get_python_executable
+
+    # utils is already imported by the time 'python -m utils.broker' would run this file, so main is called directly
+    command = [get_python_executable(), "-c", "from utils.broker import main; main()", "--address", address, "--port", str(port)]
+    shelftools_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    # Detach the broker, so it keeps running if the application that started it is closed
+    if OPERATING_SYSTEM == "windows":
+        options = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {"start_new_session": True}
+
+    process = subprocess.Popen(command, cwd=shelftools_dir, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **options)
+    process.stdin.write(json.dumps({"username": username, "password": password}).encode())
+    process.stdin.close()
+
+    return process
+
+#
+# TOOLS
+#
+
+class BrokerConnection():
+    """
+    A connection to the broker. Requests are sent one at a time.
+    """
+
+    def __init__(self, port=0, token=""):
+        """
+        Initialize BrokerConnection instance, connecting and sending the token.
+
+        Raises:
+        - OSError: If the broker can't be reached.
+        - PermissionError: If the broker does not accept the token.
+        """
+        self.lock = threading.Lock()
+        self.socket = socket.create_connection(("127.0.0.1", port), timeout=BROKER_CONNECT_TIMEOUT)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        try:
+            self.username = self.request({"op": "auth", "token": token})[0]
+        except Exception:
+            self.socket.close()
+            raise
+
+        self.socket.settimeout(None)
+
+    def request(self, header={}, payload=b""):
+        """
+        Send a request and wait for its result.
+
+        Returns:
+        - tuple: (result, payload)
+
+        Raises:
+        - The error the request raised in the broker. IOError and OSError keep their errno, so e.g. a missing file raises FileNotFoundError.
+        """
+        import paramiko
+
+        with self.lock:
+            send_message(self.socket, header, payload)
+            response, response_payload = receive_message(self.socket)
+
+        if "error" not in response:
+            return response["result"], response_payload
+
+        error, message = response["error"], response["message"]
+        if response.get("errno") is not None:
+            raise OSError(response["errno"], message)
+        if error in ("SSHException", "ChannelException"):
+            raise paramiko.SSHException(message)
+        if error == "PermissionError":
+            raise PermissionError(message)
+        if error == "EOFError":
+            raise EOFError(message)
+        raise IOError(f"{error}: {message}")
+
+    def close(self):
+        """
+        Close the connection.
+        """
+        self.socket.close()
+
+class BrokerSession():
+    """
+    Stands in for a RenderFarmSession (see /ncca_shelftools/utils/sftp_session.py) when the connection is held by the broker.
+    """
+
+    def __init__(self, info={}):
+        """
+        Initialize BrokerSession instance.
+
+        Args:
+        - info (dict): The broker info, see read_broker_info.
+        """
+        self.port = info["port"]
+        self.token = info["token"]
+        self.transport = BrokerTransport(self)
+
+        self.sftp = BrokerSFTPClient(self)
+        self.username = self.sftp.connection.username
+
+    def connect(self):
+        """
+        Open a new connection to the broker.
+        """
+        return BrokerConnection(self.port, self.token)
+
+    def acquire_sftp(self):
+        """
+        Open another SFTP channel, as a new connection to the broker.
+        """
+        return BrokerSFTPClient(self)
+
+    def release_sftp(self, client=None):
+        """
+        Close an SFTP channel from acquire_sftp. The broker pools the channels itself.
+        """
+        client.close()
+
+    def get_login_info(self):
+        """
+        Get the login info that the tools are created with.
+
+        Returns:
+        - dict: Dictionary containing 'username', 'sftp' and 'session' keys.
+        """
+        return {"username": self.username, "sftp": self.sftp, "session": self}
+
+class BrokerTransport():
+    """
+    Stands in for a paramiko Transport, for opening exec channels through the broker.
+    """
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def is_active(self):
+        return True
+
+    def open_session(self):
+        """
+        Open an exec channel, as a new connection to the broker.
+        """
+        return BrokerExecChannel(self.session.connect())
+
+class BrokerChannel():
+    """
+    Returned by BrokerSFTPClient.get_channel, so sftp_get_transport works the same as with paramiko.
+    """
+
+    def __init__(self, session=None):
+        self.session = session
+        self.closed = False
+
+    def get_transport(self):
+        return self.session.transport
+
+class BrokerSFTPClient():
+    """
+    Stands in for a paramiko SFTPClient, running every call in the broker.
+    """
+
+    def __init__(self, session=None):
+        """
+        Initialize BrokerSFTPClient instance, connecting to the broker.
+
+        Args:
+        - session (BrokerSession): The broker session.
+        """
+        self.session = session
+        self.connection = session.connect()
+
+    def call(self, method="", *args):
+        """
+        Call a method of the broker's SFTP channel.
+        """
+        with profiling.section_once("first SFTP call", "network"):
+            result, payload = self.connection.request({"op": "call", "method": method, "args": list(args)})
+
+        if method in ("stat", "lstat"):
+            return dict_to_attributes(result)
+        if method == "listdir_attr":
+            return [dict_to_attributes(entry) for entry in result]
+        return result
+
+    def __getattr__(self, name):
+        if name not in BROKER_SFTP_METHODS:
+            raise AttributeError(name)
+        return lambda *args: self.call(name, *args)
+
+    def get_channel(self):
+        return BrokerChannel(self.session)
+
+    def open(self, filename="", mode="r", bufsize=-1):
+        """
+        Open a remote file.
+
+        Returns:
+        - BrokerFile: The open file.
+        """
+        file_id = self.connection.request({"op": "open", "path": filename, "mode": mode})[0]
+        return BrokerFile(self.connection, file_id)
+
+    def put(self, localpath="", remotepath="", callback=None, confirm=True):
+        """
+        Upload a local file, in the same way as paramiko's SFTPClient.put.
+        """
+        file_size = os.path.getsize(localpath)
+        transferred = 0
+
+        with open(localpath, "rb") as local_file, self.open(remotepath, "wb") as remote_file:
+            for chunk in iter(lambda: local_file.read(DOWNLOAD_BLOCK_SIZE), b""):
+                remote_file.write(chunk)
+                transferred += len(chunk)
+                if callback is not None:
+                    callback(transferred, file_size)
+
+        if confirm:
+            remote_size = self.stat(remotepath).st_size
+            if remote_size != file_size:
+                raise IOError(f"size mismatch in put!  {remote_size} != {file_size}")
+
+    def close(self):
+        """
+        Close the connection to the broker.
+        """
+        self.connection.close()
+
+class BrokerFile():
+    """
+    Stands in for a paramiko SFTPFile, for a file opened through the broker.
+    """
+
+    def __init__(self, connection=None, file_id=""):
+        self.connection = connection
+        self.file_id = file_id
+
+    def read(self, size=None):
+        return self.connection.request({"op": "read", "file": self.file_id, "length": size})[1]
+
+    def write(self, data=b""):
+        if isinstance(data, str):
+            data = data.encode()
+        self.connection.request({"op": "write", "file": self.file_id}, data)
+
+    def seek(self, offset=0):
+        self.connection.request({"op": "seek", "file": self.file_id, "offset": offset})
+
+    def prefetch(self, file_size=None):
+        self.connection.request({"op": "prefetch", "file": self.file_id, "length": file_size})
+
+    def stat(self):
+        return dict_to_attributes(self.connection.request({"op": "file_stat", "file": self.file_id})[0])
+
+    def close(self):
+        if self.file_id is not None:
+            self.connection.request({"op": "close", "file": self.file_id})
+            self.file_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class BrokerExecChannel():
+    """
+    Stands in for a paramiko Channel running a command, for commands run through the broker.
+    """
+
+    def __init__(self, connection=None):
+        self.connection = connection
+        self.timeout = None
+
+    def settimeout(self, timeout=None):
+        self.timeout = timeout
+
+    def exec_command(self, command=""):
+        self.connection.request({"op": "exec", "command": command, "timeout": self.timeout})
+
+    def sendall(self, data=b""):
+        self.connection.request({"op": "send"}, data)
+
+    def shutdown_write(self):
+        self.connection.request({"op": "shutdown_write"})
+
+    def recv(self, size=DOWNLOAD_BLOCK_SIZE):
+        return self.connection.request({"op": "recv", "length": size})[1]
+
+    def recv_stderr(self, size=DOWNLOAD_BLOCK_SIZE):
+        return self.connection.request({"op": "recv_stderr", "length": size})[1]
+
+    def recv_exit_status(self):
+        return self.connection.request({"op": "exit_status"})[0]
+
+    def makefile(self, mode="rb"):
+        return BrokerChannelFile(self, "stdout")
+
+    def makefile_stderr(self, mode="rb"):
+        return BrokerChannelFile(self, "stderr")
+
+    def close(self):
+        self.connection.close()
+
+class BrokerChannelFile():
+    """
+    Stands in for the file objects returned by paramiko's Channel.makefile and makefile_stderr.
+    """
+
+    def __init__(self, channel=None, stream="stdout"):
+        self.channel = channel
+        self.stream = stream
+
+    def read(self, size=-1):
+        receive = self.channel.recv_stderr if self.stream == "stderr" else self.channel.recv
+
+        if size is not None and size >= 0:
+            return receive(size)
+
+        data = bytearray()
+        for chunk in iter(lambda: receive(DOWNLOAD_BLOCK_SIZE), b""):
+            data += chunk
+        return bytes(data)
+
+    def write(self, data=b""):
+        self.channel.sendall(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def connect_broker():
+    """
+    Connect to the broker, if one is running.
+
+    Returns:
+    - BrokerSession: The broker session, or None if no broker is running.
+    """
+    info = read_broker_info()
+    if info is None:
+        return None
+
+    try:
+        return BrokerSession(info)
+    except Exception:
+        return None
+
+def main():
+    """
+    Run the broker. The credentials are read as JSON from standard input, see start_broker.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="NCCA Renderfarm connection broker")
+    parser.add_argument("--address", default=RENDERFARM_ADDRESS)
+    parser.add_argument("--port", type=int, default=RENDERFARM_PORT)
+    parser.add_argument("--idle-timeout", type=float, default=BROKER_IDLE_TIMEOUT)
+    args = parser.parse_args()
+
+    credentials = json.loads(sys.stdin.read())
+    run_broker(credentials["username"], credentials["password"], args.address, args.port, args.idle_timeout)
@@ -0,0 +1,212 @@
+# Most project folders are full of old caches and renders that the scene being submitted doesn't use.
+# Instead of uploading the whole folder, the Houdini and Maya submitters can list the files their scene reads (see collect_dependencies
+# in /ncca_shelftools/ncca_for_houdini/submit_hou.py and /ncca_shelftools/ncca_for_maya/submit_maya.py).
+# These functions turn that list into the exact set of files to upload, keeping their layout relative to the project folder.
+
+import os, re, glob
+
+from config import *
+from .sftp_transfer import collect_upload_tree
+from .ignore import get_ignore_rules
+
+# Matches the parts of a file path that change per frame, e.g. $F4, ${F}, ####, %04d, <f>
+FRAME_TOKEN_PATTERN = r"\$\{F\d*\}|\$F\d*(?![A-Za-z0-9_])|#+|<f\d*>|%\d*d"
+
+# Matches the parts of a file path that change per UDIM tile, e.g. <UDIM>, <UVTILE>
+TILE_TOKEN_PATTERN = r"<UDIM>|<udim>|<UVTILE>|<uvtile>"
+
+SEQUENCE_TOKEN_PATTERN = re.compile(f"{FRAME_TOKEN_PATTERN}|{TILE_TOKEN_PATTERN}")
+
+def has_sequence_token(path=""):
+    """
+    Check if a file path refers to a sequence of files, rather than a single file.
+
+    Args:
+    - path (str): The file path.
+
+    Returns:
+    - bool: True if the path has a frame or UDIM token in it.
+    """
+    return SEQUENCE_TOKEN_PATTERN.search(path) is not None
+
+def get_needed_frames(frames=None, handles=DEPENDENCY_FRAME_HANDLES):
+    """
+    Get every frame of a sequence that a render needs, including the handles around each rendered frame.
+
+    Args:
+    - frames (iterable): The frames being rendered, e.g. range(start, end + 1, by).
+    - handles (int): Number of extra frames needed either side of each rendered frame.
+
+    Returns:
+    - set: The frame numbers.
+    """
+    return {frame + offset for frame in frames for offset in range(-handles, handles + 1)}
+
+def resolve_sequence(path="", frames=None, handles=DEPENDENCY_FRAME_HANDLES):
+    """
+    Find the files on disk that belong to a file sequence, limited to the frames being rendered.
+
+    Args:
+    - path (str): A path with frame or UDIM tokens in it, e.g. /project/geo/sim.$F4.bgeo.sc
+    - frames (iterable): The frames being rendered. If None, every frame on disk is found.
+    - handles (int): Number of extra frames needed either side of each rendered frame.
+
+    Returns:
+    - list: Paths of the existing files in the sequence. Every UDIM tile is always included.
+    """
+    # Every frame or tile that exists on disk
+    candidates = sorted(glob.glob(SEQUENCE_TOKEN_PATTERN.sub("*", glob.escape(path))))
+
+    if frames is None or not re.search(FRAME_TOKEN_PATTERN, path):
+        return candidates
+
+    # Turn the path into a pattern that captures the frame number. A path can use the frame more than once, e.g. /cache/$F/sim.$F4.bgeo
+    pattern = ""
+    position = 0
+    has_frame_group = False
+    for match in SEQUENCE_TOKEN_PATTERN.finditer(path):
+        pattern += re.escape(path[position:match.start()])
+        if re.fullmatch(TILE_TOKEN_PATTERN, match.group(0)):
+            pattern += r".+?"
+        elif has_frame_group:
+            pattern += r"-?\d+"
+        else:
+            pattern += r"(?P<frame>-?\d+)"
+            has_frame_group = True
+        position = match.end()
+    pattern = re.compile(pattern + re.escape(path[position:]))
+
+    needed_frames = get_needed_frames(frames, handles)
+
+    sequence = []
+    for candidate in candidates:
+        match = pattern.fullmatch(candidate)
+        if match and int(match.group("frame")) in needed_frames:
+            sequence.append(candidate)
+
+    return sequence
+
+def resolve_dependency(path="", frames=None, handles=DEPENDENCY_FRAME_HANDLES):
+    """
+    Find the files on disk that a dependency refers to.
+
+    Args:
+    - path (str): A file path, a directory, or a path with frame or UDIM tokens in it.
+    - frames (iterable): The frames being rendered, used to limit file sequences. If None, every frame on disk is found.
+    - handles (int): Number of extra frames needed either side of each rendered frame.
+
+    Returns:
+    - list: Paths of the existing files. Directories are expanded to every file inside of them.
+    """
+    if not path:
+        return []
+
+    if has_sequence_token(path):
+        return resolve_sequence(path, frames, handles)
+
+    if os.path.isdir(path):
+        return [os.path.join(root, file_name) for root, dir_names, file_names in os.walk(path) for file_name in file_names]
+
+    if os.path.isfile(path):
+        return [path]
+
+    return []
+
+def is_inside(path="", directory=""):
+    """
+    Check if a local path is inside of a directory.
+
+    Args:
+    - path (str): The path to check.
+    - directory (str): The directory.
+
+    Returns:
+    - bool: True if path is inside directory.
+    """
+    path = os.path.normcase(os.path.abspath(path))
+    directory = os.path.normcase(os.path.abspath(directory))
+
+    try:
+        return os.path.commonpath([path, directory]) == directory
+    except ValueError:
+        # Paths on different drives on Windows
+        return False
+
+def collect_dependency_tree(local_path="", remote_path="", dependencies=[], ignore=[], frames=None, handles=DEPENDENCY_FRAME_HANDLES):
+    """
+    Work out which files need to be uploaded for a list of scene dependencies, in the same format as collect_upload_tree.
+
+    Args:
+    - local_path (str): Path to the local project directory.
+    - remote_path (str): Path to the remote project directory.
+    - dependencies (list): Paths of the files the scene needs. These can be directories, or have frame or UDIM tokens in them.
+    - ignore: IgnoreRules, or a list of ignore patterns (see /ncca_shelftools/utils/ignore.py).
+    - frames (iterable): The frames being rendered, used to limit file sequences. If None, every frame on disk is uploaded.
+    - handles (int): Number of extra frames needed either side of each rendered frame.
+
+    Returns:
+    - dict: 'dirs' and 'files' in the same format as collect_upload_tree.
+            'outside' lists the files that are outside of the project folder, so can't be uploaded.
+            'missing' lists the dependencies that don't match any file.
+    """
+    files = {}
+    outside = []
+    missing = []
+    rules = get_ignore_rules(ignore)
+
+    for dependency in dependencies:
+        resolved = resolve_dependency(dependency, frames, handles)
+        if not resolved:
+            missing.append(dependency)
+            continue
+
+        for path in resolved:
+            if not is_inside(path, local_path):
+                outside.append(path)
+                continue
+
+            relative_path = os.path.relpath(os.path.abspath(path), os.path.abspath(local_path))
+            if rules.is_path_ignored(relative_path):
+                continue
+
+            files[relative_path] = (path, os.path.join(remote_path, relative_path).replace("\\", "/"))
+
+    # Every parent directory of a file is needed, and collect_upload_tree puts parents before their children
+    dirs = {remote_path}
+    for relative_path in files:
+        parent = os.path.dirname(relative_path)
+        while parent:
+            dirs.add(os.path.join(remote_path, parent).replace("\\", "/"))
+            parent = os.path.dirname(parent)
+
+    return {
+        "dirs": sorted(dirs, key=lambda remote_dir: (remote_dir.count("/"), remote_dir)),
+        "files": [files[relative_path] for relative_path in sorted(files)],
+        "outside": sorted(set(outside)),
+        "missing": missing
+    }
+
+def get_bytes_avoided(local_path="", files=[], ignore=[]):
+    """
+    Work out how many bytes are saved by uploading only the scene's dependencies, instead of the whole project folder.
+
+    Args:
+    - local_path (str): Path to the local project directory.
+    - files (list): The (local_path, remote_path) tuples that will be uploaded.
+    - ignore: IgnoreRules, or a list of ignore patterns (see /ncca_shelftools/utils/ignore.py).
+
+    Returns:
+    - int: The size of the project folder, minus the size of the files that will be uploaded.
+    """
+    def total_size(paths):
+        size = 0
+        for path in paths:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    project_dirs, project_files = collect_upload_tree(local_path, "", ignore)
+
+    return total_size(path for path, _ in project_files) - total_size(path for path, _ in files)
@@ -0,0 +1,201 @@
+# Some files in a project folder should never be uploaded to the renderfarm, such as backups, caches of the DCC, or old renders.
+# They are listed with gitignore-style patterns, in UPLOAD_IGNORE_DEFAULTS (see /ncca_shelftools/config/renderfarm.py),
+# in the user's own ignore file (NCCA_IGNORE_PATH, see /ncca_shelftools/config/__init__.py), and in a '.nccaignore' file at the top of the project folder.
+#
+# Each line of an ignore file is a pattern, for example:
+#
+#   *.hip.bak*       ignore every file or folder ending in .hip.bak followed by anything, anywhere in the project
+#   render/          ignore every folder called render, but not files called render
+#   /cache/old       ignore cache/old, relative to the project folder only
+#   geo/**/*.tmp     ignore .tmp files anywhere under geo
+#   *.exr            ignore every .exr file
+#   !keep.exr        upload keep.exr anyway, as it matches a later pattern
+#   # comment        lines starting with # are ignored
+#
+# The patterns are compiled once per upload, and later patterns override earlier ones, just like a .gitignore.
+# Also like a .gitignore, the files in an ignored folder can't be uploaded with '!', as the upload never looks inside ignored folders.
+
+import os, re
+
+from config import *
+
+def translate_ignore_pattern(pattern=""):
+    """
+    Translate a gitignore-style glob into a regular expression.
+
+    Args:
+    - pattern (str): The glob, without any leading '!' or trailing '/'.
+
+    Returns:
+    - str: The regular expression, matching a whole path with '/' separators.
+    """
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+
+        if pattern.startswith("**/", i):
+            # Zero or more directories
+            regex += r"(?:.*/)?"
+            i += 3
+            continue
+
+        if pattern.startswith("**", i):
+            # Everything, including '/'
+            regex += r".*"
+            i += 2
+            continue
+
+        if char == "*":
+            regex += r"[^/]*"
+        elif char == "?":
+            regex += r"[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                char_class = pattern[i + 1:end]
+                if char_class.startswith("!"):
+                    char_class = "^" + char_class[1:]
+                regex += "[" + char_class.replace("\\", "\\\\") + "]"
+                i = end
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            regex += re.escape(pattern[i])
+        else:
+            regex += re.escape(char)
+
+        i += 1
+
+    return regex
+
+class IgnoreRules():
+    """
+    A compiled list of gitignore-style patterns.
+    """
+
+    def __init__(self, patterns=[]):
+        """
+        Initialize IgnoreRules instance.
+
+        Args:
+        - patterns (list): The patterns, in order. Plain names (e.g. 'backup') ignore any file or folder with that name.
+        """
+        self.rules = []
+
+        for pattern in patterns:
+            pattern = pattern.rstrip("\n").rstrip()
+            if not pattern or pattern.startswith("#"):
+                continue
+
+            negate = pattern.startswith("!")
+            if negate:
+                pattern = pattern[1:]
+            elif pattern.startswith("\\"):
+                # \# and \! match a leading # or !
+                pattern = pattern[1:]
+
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+
+            # Patterns with a '/' in them are relative to the project folder, others match a name at any depth
+            anchored = "/" in pattern
+            pattern = pattern.lstrip("/")
+
+            if not pattern:
+                continue
+
+            self.rules.append((re.compile(translate_ignore_pattern(pattern) + r"\Z"), negate, dir_only, anchored))
+
+        # Later rules override earlier ones, so they are checked first
+        self.rules.reverse()
+
+    def is_ignored(self, relative_path="", is_dir=False):
+        """
+        Check if a file or folder matches the rules. The folders above it are not checked, see is_path_ignored.
+
+        Args:
+        - relative_path (str): Path relative to the project folder.
+        - is_dir (bool): Whether the path is a folder.
+
+        Returns:
+        - bool: True if the path should not be uploaded.
+        """
+        relative_path = relative_path.replace("\\", "/")
+        name = relative_path.rsplit("/", 1)[-1]
+
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative_path if anchored else name):
+                return not negate
+
+        return False
+
+    def is_path_ignored(self, relative_path="", is_dir=False):
+        """
+        Check if a file or folder, or any folder above it, matches the rules.
+
+        Args:
+        - relative_path (str): Path relative to the project folder.
+        - is_dir (bool): Whether the path is a folder.
+
+        Returns:
+        - bool: True if the path should not be uploaded.
+        """
+        parts = relative_path.replace("\\", "/").split("/")
+
+        for i in range(1, len(parts)):
+            if self.is_ignored("/".join(parts[:i]), True):
+                return True
+
+        return self.is_ignored(relative_path, is_dir)
+
+def get_ignore_rules(ignore=[]):
+    """
+    Get compiled rules for an ignore list.
+
+    Args:
+    - ignore: An IgnoreRules instance, or a list of patterns.
+
+    Returns:
+    - IgnoreRules: The compiled rules.
+    """
+    if isinstance(ignore, IgnoreRules):
+        return ignore
+    return IgnoreRules(ignore)
+
+def read_ignore_file(ignore_path=""):
+    """
+    Read the patterns in an ignore file.
+
+    Args:
+    - ignore_path (str): Path to the ignore file.
+
+    Returns:
+    - list: The lines of the file, or an empty list if it doesn't exist.
+    """
+    try:
+        with open(ignore_path, "r", encoding="utf-8") as file:
+            return file.read().splitlines()
+    except (IOError, UnicodeDecodeError):
+        return []
+
+def load_ignore_rules(local_path="", defaults=UPLOAD_IGNORE_DEFAULTS):
+    """
+    Load the ignore rules for a project: the defaults, then the user's ignore file, then the project's .nccaignore file.
+
+    Args:
+    - local_path (str): Path to the local project directory.
+    - defaults (list): The patterns used for every project.
+
+    Returns:
+    - IgnoreRules: The compiled rules.
+    """
+    patterns = list(defaults)
+    patterns += read_ignore_file(NCCA_IGNORE_PATH)
+    if os.path.isdir(local_path):
+        patterns += read_ignore_file(os.path.join(local_path, UPLOAD_IGNORE_FILE))
+
+    return IgnoreRules(patterns)
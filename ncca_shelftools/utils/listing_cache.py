@@ -0,0 +1,161 @@
+# The farm viewer keeps a local copy of every folder listing it has made, so it can show the user's farm straight away when it opens.
+# Listings are stored in a small SQLite database (NCCA_LISTING_CACHE_PATH, see /ncca_shelftools/config/__init__.py), keyed by user and remote path,
+# along with the modified time the folder had when it was listed. The viewer shows the cached listing first, then checks the folder's
+# modified time in the background and lists it again if it has changed. See /ncca_shelftools/ncca_renderfarm/viewer/qfarmsystemmodel.py for more info.
+#
+# The cache is kept under LISTING_CACHE_MAX_SIZE bytes by removing the listings that were used least recently.
+# Anything that changes the farm without the viewer seeing it, such as submitting a job or deleting a file, should call invalidate.
+# The cache is only a shortcut, so if it can't be read or written, the viewer lists the farm over the network as usual.
+
+import os, json, time, zlib
+from contextlib import closing
+
+from config import *
+from .sftp_utils import *
+
+LISTING_CACHE_VERSION = 1
+
+class ListingCache():
+    """
+    The cached folder listings of one user.
+    """
+
+    def __init__(self, username="", cache_path=NCCA_LISTING_CACHE_PATH, max_size=LISTING_CACHE_MAX_SIZE):
+        """
+        Initialize ListingCache instance.
+
+        Args:
+        - username (str): The user whose listings are cached.
+        - cache_path (str): Path to the cache database.
+        - max_size (int): The most bytes of listings to keep.
+        """
+        self.username = username
+        self.cache_path = cache_path
+        self.max_size = max_size
+
+    def connect(self):
+        """
+        Open the cache database, creating it if needed. Each call opens its own connection, so the cache can be used from worker threads.
+        """
+        # sqlite3 is only imported when the cache is used, as it slows down opening the tools, see 'Startup Time' in DEVEL.md
+        import sqlite3
+
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+
+        # Maya and Houdini may use the cache at the same time, so wait for the other one to finish writing
+        connection = sqlite3.connect(self.cache_path, timeout=5)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS listings ("
+            "username TEXT, path TEXT, version INTEGER, mtime INTEGER, entries BLOB, size INTEGER, used REAL, "
+            "PRIMARY KEY (username, path))"
+        )
+        return connection
+
+    def load(self, remote_path=""):
+        """
+        Load the cached listing of a folder.
+
+        Args:
+        - remote_path (str): Path to the remote folder.
+
+        Returns:
+        - tuple: (entries, mtime), where entries is a list of RemoteEntry and mtime is the folder's modified time when it was listed.
+                 None if the folder isn't cached.
+        """
+        import sqlite3
+
+        try:
+            with closing(self.connect()) as connection, connection:
+                row = connection.execute(
+                    "SELECT mtime, entries FROM listings WHERE username = ? AND path = ? AND version = ?",
+                    (self.username, remote_path, LISTING_CACHE_VERSION)
+                ).fetchone()
+
+                if row is None:
+                    return None
+
+                connection.execute("UPDATE listings SET used = ? WHERE username = ? AND path = ?", (time.time(), self.username, remote_path))
+
+            mtime, entries = row
+            return [RemoteEntry(*entry) for entry in json.loads(zlib.decompress(entries))], mtime
+        except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+            print(f"Failed to read the listing cache: {e}")
+            return None
+
+    def store(self, remote_path="", mtime=None, entries=[]):
+        """
+        Store the listing of a folder, then remove the least recently used listings if the cache is too large.
+
+        Args:
+        - remote_path (str): Path to the remote folder.
+        - mtime (int): The folder's modified time when it was listed, or None if it should always be listed again.
+        - entries (list): The SFTPAttributes of the folder's entries.
+        """
+        self.store_many([(remote_path, mtime, entries)])
+
+    def store_many(self, listings=[]):
+        """
+        Store the listings of many folders at once, e.g. from ssh_scan_tree, then remove the least recently used listings if the cache is too large.
+
+        Args:
+        - listings (list): (remote_path, mtime, entries) tuples, with the same meaning as the arguments of store.
+        """
+        import sqlite3
+
+        used = time.time()
+        rows = []
+        for remote_path, mtime, entries in listings:
+            data = zlib.compress(json.dumps([[entry.filename, entry.st_mode, entry.st_size, entry.st_mtime] for entry in entries]).encode())
+            rows.append((self.username, remote_path, LISTING_CACHE_VERSION, mtime, data, len(data), used))
+
+        try:
+            with closing(self.connect()) as connection, connection:
+                connection.executemany("INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self.evict(connection)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Failed to write the listing cache: {e}")
+
+    def evict(self, connection=None):
+        """
+        Remove the least recently used listings, of any user, until the cache is under its maximum size.
+        """
+        total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM listings").fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        for username, path, size in connection.execute("SELECT username, path, size FROM listings ORDER BY used").fetchall():
+            connection.execute("DELETE FROM listings WHERE username = ? AND path = ?", (username, path))
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+    def invalidate(self, remote_path="", recursive=True):
+        """
+        Forget the cached listings of a path that has changed, and of the folder it is in, as that listing holds its size and modified time.
+
+        Args:
+        - remote_path (str): Path to the remote file or folder that was uploaded, changed or deleted.
+        - recursive (bool): Also forget the listings of every folder inside it.
+        """
+        self.invalidate_many([remote_path], recursive)
+
+    def invalidate_many(self, remote_paths=[], recursive=True):
+        """
+        Like invalidate, for many paths at once, e.g. every frame of a deleted sequence.
+        """
+        import sqlite3
+
+        remote_paths = {remote_path.rstrip("/") for remote_path in remote_paths}
+        paths = remote_paths | {os.path.dirname(remote_path).replace("\\", "/") for remote_path in remote_paths}
+
+        try:
+            with closing(self.connect()) as connection, connection:
+                connection.executemany("DELETE FROM listings WHERE username = ? AND path = ?", [(self.username, path) for path in paths])
+                if recursive:
+                    # LIKE ignores case, so the start of each path is compared instead
+                    connection.executemany(
+                        "DELETE FROM listings WHERE username = ? AND substr(path, 1, ?) = ?",
+                        [(self.username, len(remote_path) + 1, remote_path + "/") for remote_path in remote_paths]
+                    )
+        except (sqlite3.Error, OSError) as e:
+            print(f"Failed to invalidate the listing cache: {e}")
@@ -1,17 +1,74 @@
+# install() is called every time a tool needs an optional package (paramiko, OpenEXR, numpy, cryptography, Pillow),
+# so checking a package has to be cheap. Each package is only checked once per process, and the packages themselves
+# are imported inside the functions that use them, so they don't slow down opening the tools.
+# The import time budget for the tools (STARTUP_IMPORT_BUDGET) can be found in /ncca_shelftools/config/software.py
+
 import sys
 import subprocess
 from PySide2 import QtWidgets, QtCore
-import pkg_resources
 import importlib
+import importlib.util
 from config import *
 
+# The packages that have already been found in this process
+installed_packages_cache = set()
+
 def is_package_installed(package_name):
-    """Check if a package is installed using pkg_resources."""
-    try:
-        pkg_resources.get_distribution(package_name)
+    """
+    Check if a package is installed. The result is remembered, so only the first check for each package reads the package metadata.
+
+    Args:
+    - package_name (str): The name the package is installed with, e.g. 'Pillow'.
+
+    Returns:
+    - bool: True if the package is installed.
+    """
+    if package_name in installed_packages_cache or package_name in sys.modules:
         return True
-    except pkg_resources.DistributionNotFound:
-        return importlib.util.find_spec(package_name) is not None
+
+    try:
+        # importlib.metadata is much faster than pkg_resources, which scans every installed package when it is imported.
+        # It was added in Python 3.8, so older versions of Maya fall back to pkg_resources.
+        from importlib import metadata
+        try:
+            metadata.distribution(package_name)
+            installed = True
+        except metadata.PackageNotFoundError:
+            installed = False
+    except ImportError:
+        import pkg_resources
+        try:
+            pkg_resources.get_distribution(package_name)
+            installed = True
+        except pkg_resources.DistributionNotFound:
+            installed = False
+
+    # Packages can also be importable without any metadata, e.g. when they come with Maya or Houdini
+    if not installed:
+        installed = importlib.util.find_spec(package_name) is not None
+
+    if installed:
+        installed_packages_cache.add(package_name)
+
+    return installed
+
+def get_python_executable():
+    """
+    Get the Python interpreter of the running application. Inside Maya or Houdini, sys.executable is the application itself, so mayapy or hython is used instead.
+
+    Returns:
+    - str: Path to the Python interpreter.
+    """
+    python_exe = sys.executable
+
+    if OPERATING_SYSTEM == "windows":
+        python_exe = python_exe.replace("houdini.exe", "hython.exe")
+        python_exe = python_exe.replace("maya.exe", "mayapy.exe")
+    else:
+        python_exe = python_exe.replace("houdini", "hython")
+        python_exe = python_exe.replace("maya.bin", "mayapy")
+
+    return python_exe
 
 def install(packages):
     installed_packages = []
@@ -28,18 +85,12 @@ def install(packages):
             dialog.exec_()
 
             try:
-                python_exe = sys.executable
-
-                if OPERATING_SYSTEM == "windows":
-                    python_exe = python_exe.replace("houdini.exe", "hython.exe")
-                    python_exe = python_exe.replace("maya.exe", "mayapy.exe")
-                else:
-                    python_exe = python_exe.replace("houdini", "hython")
-                    python_exe = python_exe.replace("maya.bin", "mayapy")
+                python_exe = get_python_executable()
 
                 result = subprocess.run([python_exe, "-m", "pip", "install", package])
                 if result.returncode == 0:
                     installed_packages.append(package)
+                    installed_packages_cache.add(package)
 
                     try:
                         #if package in sys.modules:
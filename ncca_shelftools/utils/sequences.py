@@ -0,0 +1,80 @@
+# Render output folders hold thousands of numbered files, e.g. beauty.0001.exr to beauty.0240.exr.
+# The farm viewer shows each group of numbered files as a single sequence, e.g. 'beauty.####.exr [1-240, 3 missing]', which can be
+# expanded to see the frames, and opened, downloaded or deleted as one. See /ncca_shelftools/ncca_renderfarm/viewer/qfarmsystemmodel.py for more info.
+
+import re
+
+from config import *
+from .sftp_utils import *
+
+# Splits a file name into the part before the frame number, the frame number, and the extensions after it, e.g. 'beauty.', '0001', '.exr'
+# The frame number is the last number before the extensions, so 'shot2.0001.bgeo.sc' is frame 1 of 'shot2.####.bgeo.sc'
+SEQUENCE_FRAME_PATTERN = re.compile(r"(?P<prefix>.*?)(?P<frame>\d+)(?P<suffix>(?:\.[A-Za-z][A-Za-z0-9_]*)*)")
+
+class FileSequence():
+    """
+    A group of numbered files in the same folder that only differ by their frame number.
+    """
+
+    __slots__ = ("name", "first", "last", "missing", "entries", "label")
+
+    def __init__(self, name="", first=0, last=0, missing=0, entries=[]):
+        """
+        Initialize FileSequence instance.
+
+        Args:
+        - name (str): The file name with the frame number replaced by '#', one per digit, e.g. beauty.####.exr
+        - first (int): The first frame.
+        - last (int): The last frame.
+        - missing (int): The number of frames between first and last that don't exist.
+        - entries (list): The SFTPAttributes of the frames, in frame order.
+        """
+        self.name = name
+        self.first = first
+        self.last = last
+        self.missing = missing
+        self.entries = entries
+
+        if missing:
+            self.label = NCCA_VIEWER_SEQUENCE_MISSING_LABEL.format(name, first, last, missing)
+        else:
+            self.label = NCCA_VIEWER_SEQUENCE_LABEL.format(name, first, last)
+
+def group_sequences(entries=[], min_frames=VIEWER_SEQUENCE_MIN_FRAMES):
+    """
+    Group the numbered files of a folder listing into sequences, in a single pass over the listing.
+
+    Args:
+    - entries (list): The SFTPAttributes of a folder's entries, from sftp_listdir_attr.
+    - min_frames (int): The fewest files that make a sequence. Smaller groups are left as single files.
+
+    Returns:
+    - tuple: (entries, sequences), where entries are the folders and files that aren't part of a sequence, and sequences is a list of FileSequence.
+    """
+    other_entries = []
+    groups = {}
+
+    for entry in entries:
+        match = None if sftp_entry_isdir(entry) else SEQUENCE_FRAME_PATTERN.fullmatch(entry.filename)
+        if match is None:
+            other_entries.append(entry)
+            continue
+
+        groups.setdefault((match.group("prefix"), match.group("suffix")), []).append((match.group("frame"), entry))
+
+    sequences = []
+    for (prefix, suffix), frames in groups.items():
+        if len(frames) < min_frames:
+            other_entries.extend(entry for frame, entry in frames)
+            continue
+
+        frames.sort(key=lambda frame: int(frame[0]))
+        numbers = {int(frame) for frame, entry in frames}
+        first, last = min(numbers), max(numbers)
+
+        # Frames that aren't padded have a different number of digits, so the name shows the fewest
+        padding = min(len(frame) for frame, entry in frames)
+
+        sequences.append(FileSequence(prefix + "#" * padding + suffix, first, last, last - first + 1 - len(numbers), [entry for frame, entry in frames]))
+
+    return other_entries, sequences
@@ -0,0 +1,238 @@
+# Some operations are much faster when they run on the renderfarm itself, instead of sending one SFTP request per file.
+# These functions open an SSH exec channel on the existing paramiko Transport and run a single shell command.
+# Not every server allows exec channels, so callers should always keep an SFTP fallback.
+
+import posixpath, shlex, stat
+
+from config import *
+from .sftp_utils import *
+
+# The fields printed by find for each file in ssh_scan_tree: type, permissions, size, modified time, folder and name,
+# then "r" for files that can be read, or "u" for folders that can't be listed.
+# Each field ends with a null byte, as it is the only character that can't be in a file name.
+SCAN_TREE_FORMAT = "%y\\0%m\\0%s\\0%T@\\0%h\\0%f\\0"
+SCAN_TREE_FIELDS = 7
+
+# The file type bits for each type letter printed by find's %y
+SCAN_TREE_TYPES = {
+    "f": stat.S_IFREG,
+    "d": stat.S_IFDIR,
+    "l": stat.S_IFLNK,
+    "p": stat.S_IFIFO,
+    "s": stat.S_IFSOCK,
+    "c": stat.S_IFCHR,
+    "b": stat.S_IFBLK
+}
+
+class NCCA_ExecUnavailableException(Exception):
+    """
+    Custom exception for when the renderfarm refuses to run commands over an SSH exec channel.
+    """
+    pass
+
+class NCCA_UnsafePathException(Exception):
+    """
+    Custom exception for remote paths that are outside of the user's farm directory.
+    """
+    pass
+
+def get_farm_dir(username=""):
+    """
+    Get the farm directory of a user on the renderfarm.
+
+    Args:
+    - username (str): The username of the farm directory.
+
+    Returns:
+    - str: /home/username/farm
+    """
+    return f"/home/{username}/farm"
+
+def is_farm_path(username="", remote_path=""):
+    """
+    Check if a remote path is inside of the user's farm directory. The farm directory itself is not counted as inside.
+
+    Args:
+    - username (str): The username of the farm directory.
+    - remote_path (str): The remote path to check.
+
+    Returns:
+    - bool: True if the path is inside /home/username/farm, False otherwise.
+    """
+    if not username or not remote_path:
+        return False
+
+    # normpath removes any '..' so the path can't escape the farm directory
+    normalized_path = posixpath.normpath(remote_path.replace("\\", "/"))
+    return normalized_path.startswith(get_farm_dir(username) + "/")
+
+def ssh_open_exec(transport=None, command="", timeout=None):
+    """
+    Start a shell command on the remote server and return its channel, so its input and output can be streamed.
+
+    Args:
+    - transport: paramiko Transport object.
+    - command (str): The command to run. Any paths must already be quoted with shlex.quote.
+    - timeout (float): Optional timeout in seconds for each read and write on the channel.
+
+    Returns:
+    - paramiko.Channel: The channel the command is running on. The caller must close it.
+
+    Raises:
+    - NCCA_ExecUnavailableException: If the server does not allow exec channels.
+    """
+    import paramiko
+
+    try:
+        channel = transport.open_session()
+    except paramiko.SSHException as e:
+        raise NCCA_ExecUnavailableException(str(e))
+
+    try:
+        channel.settimeout(timeout)
+        channel.exec_command(command)
+    except paramiko.SSHException as e:
+        channel.close()
+        raise NCCA_ExecUnavailableException(str(e))
+
+    return channel
+
+def ssh_exec(transport=None, command="", stdin_data=None, timeout=None):
+    """
+    Run a shell command on the remote server over an SSH exec channel.
+
+    Args:
+    - transport: paramiko Transport object.
+    - command (str): The command to run. Any paths must already be quoted with shlex.quote.
+    - stdin_data (bytes): Optional data to send to the command's standard input.
+    - timeout (float): Optional timeout in seconds for each read and write on the channel.
+
+    Returns:
+    - tuple: (exit_status, stdout, stderr), where stdout and stderr are bytes.
+
+    Raises:
+    - NCCA_ExecUnavailableException: If the server does not allow exec channels.
+    """
+    channel = ssh_open_exec(transport, command, timeout)
+
+    try:
+        if stdin_data:
+            channel.sendall(stdin_data)
+        channel.shutdown_write()
+
+        stdout = channel.makefile("rb").read()
+        stderr = channel.makefile_stderr("rb").read()
+        exit_status = channel.recv_exit_status()
+    finally:
+        channel.close()
+
+    return exit_status, stdout, stderr
+
+def ssh_delete(sftp=None, username="", remote_paths=[]):
+    """
+    Delete remote files or directories with a single 'rm -rf' on the renderfarm, however many there are.
+    If the server does not allow exec channels, the files are deleted one by one over SFTP instead.
+
+    Args:
+    - sftp: SFTP connection object.
+    - username (str): The username of the farm directory. Only paths inside /home/username/farm can be deleted.
+    - remote_paths (list): Paths to the remote files or directories to delete.
+
+    Returns:
+    - bool: True if everything was deleted, False otherwise.
+
+    Raises:
+    - NCCA_UnsafePathException: If any path is outside of the user's farm directory.
+    """
+    # Check every path before anything is deleted
+    for remote_path in remote_paths:
+        if not is_farm_path(username, remote_path):
+            raise NCCA_UnsafePathException(f"Refusing to delete {remote_path}, it is not inside {get_farm_dir(username)}")
+
+    if not remote_paths:
+        return True
+
+    normalized_paths = [posixpath.normpath(remote_path.replace("\\", "/")) for remote_path in remote_paths]
+
+    # The paths are sent on standard input, separated by null bytes, so deleting every frame of a long sequence doesn't make the command too long
+    stdin_data = b"\0".join(remote_path.encode() for remote_path in normalized_paths)
+
+    try:
+        exit_status, stdout, stderr = ssh_exec(sftp_get_transport(sftp), "xargs -0 rm -rf --", stdin_data)
+    except NCCA_ExecUnavailableException:
+        # Fall back to deleting over SFTP. This is much slower, but works on every server.
+        for remote_path in normalized_paths:
+            if sftp_exists(sftp, remote_path):
+                sftp_delete(sftp, remote_path)
+        return not any(sftp_exists(sftp, remote_path) for remote_path in normalized_paths)
+
+    if exit_status != 0:
+        print(f"Failed to delete {', '.join(normalized_paths)}: {stderr.decode(errors='replace')}")
+        return False
+
+    return True
+
+def ssh_scan_tree(sftp=None, remote_path="", stats=None):
+    """
+    List a remote directory and every directory inside it with a single 'find' on the renderfarm, so the whole tree is one round trip
+    instead of one per directory. The output is read as it arrives. Symbolic links are followed, like sftp_listdir_attr with follow_links.
+
+    Args:
+    - sftp: SFTP connection object.
+    - remote_path (str): Path to the remote directory to scan.
+    - stats (dict): Optional stats dictionary from sftp_new_stats.
+
+    Returns:
+    - dict: {dir_path: (mtime, entries)} for remote_path and every directory inside it, where mtime is the directory's modified time
+            and entries is a list of RemoteEntry, in the same format as sftp_listdir_attr. Directories that can't be listed are
+            left out, rather than returned as empty, so they aren't mistaken for empty directories.
+
+    Raises:
+    - NCCA_ExecUnavailableException: If the server does not allow exec channels. The directories should be listed over SFTP instead.
+    """
+    remote_path = posixpath.normpath(remote_path.replace("\\", "/"))
+    unreadable_format = shlex.quote(SCAN_TREE_FORMAT + "u\\0")
+    readable_format = shlex.quote(SCAN_TREE_FORMAT + "r\\0")
+    command = (f"find -L {shlex.quote(remote_path)} \\( -type d \\( ! -readable -o ! -executable \\) -printf {unreadable_format} \\)"
+               f" -o -printf {readable_format}")
+
+    sftp_count_round_trip(stats)
+    channel = ssh_open_exec(sftp_get_transport(sftp), command)
+
+    listings = {}
+
+    def add_entry(fields):
+        file_type, permissions, size, mtime, dir_path, filename, readable = [field.decode(errors="replace") for field in fields]
+        mode = SCAN_TREE_TYPES.get(file_type, 0) | int(permissions, 8)
+        # SFTP times are whole seconds, so they are rounded down the same way to compare them
+        entry = RemoteEntry(filename, mode, int(size), int(float(mtime)))
+
+        # find prints the directory itself first, then everything inside it, each directory before its contents
+        path = remote_path if not listings else posixpath.join(dir_path, filename)
+        if path != remote_path:
+            listings.setdefault(dir_path, (None, []))[1].append(entry)
+        if stat.S_ISDIR(mode) and readable == "r":
+            listings[path] = (entry.st_mtime, [])
+
+    try:
+        fields = []
+        remainder = b""
+        for chunk in iter(lambda: channel.recv(DOWNLOAD_BLOCK_SIZE), b""):
+            parts = (remainder + chunk).split(b"\0")
+            remainder = parts.pop()
+            for part in parts:
+                fields.append(part)
+                if len(fields) == SCAN_TREE_FIELDS:
+                    add_entry(fields)
+                    fields = []
+
+        exit_status = channel.recv_exit_status()
+        stderr = channel.makefile_stderr("rb").read()
+    finally:
+        channel.close()
+
+    # find carries on past folders it can't read. They were left out of the listings above, so only print why
+    if exit_status != 0:
+        print(f"Failed to scan part of {remote_path}: {stderr.decode(errors='replace')}")
+
+    return listings
@@ -0,0 +1,279 @@
+# Re-submitting a project after a small change should not upload the whole project again.
+# After every upload, a manifest is saved next to the remote project (/home/username/farm/projects/.project_name.ncca_manifest).
+# It records the size, modification time and (optionally) the content hash of every file that was uploaded.
+# On the next submit, the local project is compared against the manifest, and only new or changed files are uploaded.
+# Files that were removed locally are removed from the farm as well, unless only part of the project is uploaded (e.g. only the scene's files),
+# in which case the rest of the project is left on the farm and in the manifest.
+
+import os, json
+
+from config import *
+from .sftp_utils import *
+from .sftp_transfer import *
+from .sftp_exec import *
+from .sftp_objects import *
+
+MANIFEST_VERSION = 1
+
+def get_manifest_path(remote_path=""):
+    """
+    Get the path of the manifest that belongs to a remote project.
+
+    Args:
+    - remote_path (str): Path to the remote project directory.
+
+    Returns:
+    - str: The remote manifest path, a hidden file next to the project directory.
+    """
+    remote_path = remote_path.rstrip("/")
+    return os.path.join(os.path.dirname(remote_path), "." + os.path.basename(remote_path) + UPLOAD_MANIFEST_SUFFIX).replace("\\", "/")
+
+def build_local_manifest(local_path="", remote_path="", dirs=[], files=[], use_hash=UPLOAD_MANIFEST_HASH):
+    """
+    Build a manifest describing the local files that would be uploaded.
+
+    Args:
+    - local_path (str): Path to the local project directory.
+    - remote_path (str): Path to the remote project directory.
+    - dirs (list): Remote directories, as returned by collect_upload_tree.
+    - files (list): (local_path, remote_path) tuples, as returned by collect_upload_tree.
+    - use_hash (bool): Whether to store a content hash for every file.
+
+    Returns:
+    - dict: The manifest. Files and directories are keyed by their path relative to the project.
+    """
+    manifest = {"version": MANIFEST_VERSION, "hash": use_hash, "dirs": [], "files": {}}
+
+    for remote_dir in dirs:
+        manifest["dirs"].append(os.path.relpath(remote_dir, remote_path).replace("\\", "/"))
+
+    for local_item_path, remote_item_path in files:
+        file_stat = os.stat(local_item_path)
+        entry = {"size": file_stat.st_size, "mtime": file_stat.st_mtime, "hash": None}
+        if use_hash:
+            entry["hash"] = hash_file(local_item_path)
+        manifest["files"][os.path.relpath(remote_item_path, remote_path).replace("\\", "/")] = entry
+
+    return manifest
+
+def is_file_changed(local_entry, remote_entry):
+    """
+    Check if a file needs to be uploaded again.
+
+    Args:
+    - local_entry (dict): The local manifest entry of the file.
+    - remote_entry (dict): The remote manifest entry of the file, or None if it has never been uploaded.
+
+    Returns:
+    - bool: True if the file is new or has changed since the last upload.
+    """
+    if remote_entry is None or local_entry["size"] != remote_entry["size"]:
+        return True
+
+    # If both sides have a hash, trust it over the modification time
+    if local_entry.get("hash") and remote_entry.get("hash"):
+        return local_entry["hash"] != remote_entry["hash"]
+
+    return local_entry["mtime"] != remote_entry["mtime"]
+
+def diff_manifests(local_manifest, remote_manifest):
+    """
+    Compare a local manifest against the manifest of the last upload.
+
+    Args:
+    - local_manifest (dict): The manifest of the local project.
+    - remote_manifest (dict): The manifest of the last upload, or None if there isn't one.
+
+    Returns:
+    - tuple: (changed, removed, removed_dirs). changed and removed are lists of relative file paths.
+             removed_dirs is a list of relative directory paths, ordered so that children come before their parents.
+    """
+    remote_files = remote_manifest["files"] if remote_manifest else {}
+    remote_dirs = remote_manifest["dirs"] if remote_manifest else []
+
+    changed = [path for path, entry in local_manifest["files"].items() if is_file_changed(entry, remote_files.get(path))]
+    removed = [path for path in remote_files if path not in local_manifest["files"]]
+
+    local_dirs = set(local_manifest["dirs"])
+    removed_dirs = sorted((path for path in remote_dirs if path not in local_dirs), key=len, reverse=True)
+
+    return changed, removed, removed_dirs
+
+def sftp_scan_manifest(sftp=None, remote_path=""):
+    """
+    Build a manifest from the files that are on the farm, for a project whose manifest has been lost (e.g. a file was deleted in the viewer).
+    The entries have no hash and the farm's modified times, so they can only be used to find the files that were removed locally.
+
+    Args:
+    - sftp: SFTP connection object.
+    - remote_path (str): Path to the remote project directory.
+
+    Returns:
+    - dict: The manifest, in the same format as build_local_manifest.
+    """
+    remote_path = remote_path.rstrip("/")
+
+    # The whole project is listed with one command, or walked over SFTP if the renderfarm can't run it
+    try:
+        listings = {dir_path: entries for dir_path, (mtime, entries) in ssh_scan_tree(sftp, remote_path).items()}
+    except NCCA_ExecUnavailableException:
+        listings = {dir_path: dirs + files for dir_path, dirs, files in sftp_walk(sftp, remote_path, follow_links=True)}
+
+    manifest = {"version": MANIFEST_VERSION, "hash": False, "dirs": [], "files": {}}
+
+    for dir_path, entries in listings.items():
+        manifest["dirs"].append(os.path.relpath(dir_path, remote_path).replace("\\", "/"))
+        for entry in entries:
+            if not sftp_entry_isdir(entry):
+                relative_path = os.path.relpath(dir_path + "/" + entry.filename, remote_path).replace("\\", "/")
+                manifest["files"][relative_path] = {"size": entry.st_size, "mtime": entry.st_mtime, "hash": None}
+
+    return manifest
+
+def sftp_load_manifest(sftp=None, manifest_path=""):
+    """
+    Load a manifest from the remote SFTP server.
+
+    Args:
+    - sftp: SFTP connection object.
+    - manifest_path (str): Path to the remote manifest.
+
+    Returns:
+    - dict: The manifest, or None if it does not exist or can't be read.
+    """
+    try:
+        with sftp.open(manifest_path, "r") as file:
+            manifest = json.loads(file.read().decode())
+    except (IOError, ValueError):
+        return None
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+
+    return manifest
+
+def sftp_save_manifest(sftp=None, manifest_path="", manifest=None):
+    """
+    Save a manifest to the remote SFTP server.
+    The manifest is written to a temporary file first, so an interrupted save never leaves a broken manifest behind.
+
+    Args:
+    - sftp: SFTP connection object.
+    - manifest_path (str): Path to the remote manifest.
+    - manifest (dict): The manifest to save.
+    """
+    temp_path = manifest_path + ".tmp"
+
+    with sftp.open(temp_path, "w") as file:
+        file.write(json.dumps(manifest).encode())
+
+    sftp.posix_rename(temp_path, manifest_path)
+
+def sftp_upload_incremental(sftp=None, local_path="", remote_path="", ignore=[], workers=UPLOAD_WORKERS, use_hash=UPLOAD_MANIFEST_HASH, archive=None, progress=None, tree=None, store_path=None):
+    """
+    Upload only the files that are new or have changed since the last upload, and remove the files that were removed locally.
+
+    The manifest is updated with the files that were uploaded successfully, even if some files failed or the upload was cancelled.
+    This means the next upload will only retry the files that are still out of date.
+
+    Args:
+    - sftp: SFTP connection object.
+    - local_path (str): Path to the local project directory.
+    - remote_path (str): Path to the remote project directory.
+    - ignore: IgnoreRules, or a list of ignore patterns (see /ncca_shelftools/utils/ignore.py).
+    - workers (int): Maximum number of files uploaded at the same time.
+    - use_hash (bool): Whether to compare files by their content hash.
+    - archive (bool): Whether to upload the changed files as a single archive. If None, this is chosen automatically.
+    - progress (TransferProgress): Optional progress, updated as the upload runs. Cancelling it stops the upload.
+    - tree (tuple): Optional (dirs, files) to upload instead of the whole local project, e.g. from collect_dependency_tree. Files outside of it are left on the farm.
+    - store_path (str): Optional path to an object store, see /ncca_shelftools/utils/sftp_objects.py. Files are then linked from the store instead of uploaded into the project.
+
+    Returns:
+    - list: The per-file results from sftp_upload_tree, for the files that were uploaded.
+    """
+    manifest_path = get_manifest_path(remote_path)
+
+    if progress is not None:
+        progress.set_stage(NCCA_UPLOAD_STAGE_CHECKING)
+
+    dirs, files = tree if tree is not None else collect_upload_tree(local_path, remote_path, ignore)
+    local_manifest = build_local_manifest(local_path, remote_path, dirs, files, use_hash)
+
+    # A manifest without its project (e.g. the project was deleted from the viewer) is out of date
+    remote_manifest = None
+    scanned_manifest = None
+    if sftp_exists(sftp, remote_path):
+        remote_manifest = sftp_load_manifest(sftp, manifest_path)
+
+        # Without a manifest (e.g. it was deleted with one of the project's files in the viewer), the farm is listed instead,
+        # so files that were removed locally are still removed. Only part of the project is uploaded with a tree, so nothing is removed then
+        if remote_manifest is None and tree is None:
+            scanned_manifest = sftp_scan_manifest(sftp, remote_path)
+
+    changed, removed, removed_dirs = diff_manifests(local_manifest, remote_manifest)
+
+    # Every file is still uploaded, as the farm's modified times can't be compared with the local ones
+    if scanned_manifest is not None:
+        _, removed, removed_dirs = diff_manifests(local_manifest, scanned_manifest)
+
+    # Only part of the project is being uploaded, so files outside of it haven't been removed locally, they just aren't needed this time
+    if tree is not None:
+        removed, removed_dirs = [], []
+
+    # Files linked from the object store share their contents with the stored file, so they must be removed rather than written over
+    if remote_manifest and remote_manifest.get("objects") and store_path is None:
+        removed += [path for path in changed if path in remote_manifest["files"]]
+
+    # Remove the files and directories that no longer exist locally
+    if progress is not None:
+        progress.set_stage(NCCA_UPLOAD_STAGE_REMOVING)
+
+    for path in removed:
+        try:
+            sftp.remove(os.path.join(remote_path, path).replace("\\", "/"))
+        except IOError:
+            pass
+
+    for path in removed_dirs:
+        sftp_delete(sftp, os.path.join(remote_path, path).replace("\\", "/"))
+
+    # Only create the directories that were not there after the last upload
+    known_dirs = set(remote_manifest["dirs"]) if remote_manifest else set()
+    new_dirs = [remote_dir for remote_dir, path in zip(dirs, local_manifest["dirs"]) if path not in known_dirs]
+
+    remote_paths = {path: os.path.join(remote_path, path).replace("\\", "/") for path in changed}
+    local_paths = {remote_item_path: local_item_path for local_item_path, remote_item_path in files}
+
+    if progress is not None:
+        progress.set_stage(NCCA_UPLOAD_STAGE_UPLOADING)
+
+    changed_files = [(local_paths[remote_paths[path]], remote_paths[path]) for path in changed]
+
+    if store_path is not None:
+        digests = {local_paths[remote_paths[path]]: local_manifest["files"][path]["hash"] for path in changed if local_manifest["files"][path]["hash"]}
+        results = sftp_upload_objects(sftp, store_path, new_dirs, changed_files, workers, progress, digests)
+    else:
+        results = sftp_upload_tree(sftp, remote_path, new_dirs, changed_files, workers, archive, progress)
+
+    # Files that failed to upload are left out of the manifest, so they are retried next time
+    manifest = {"version": MANIFEST_VERSION, "hash": use_hash, "dirs": local_manifest["dirs"], "files": dict(local_manifest["files"]), "objects": store_path is not None}
+
+    # The files outside of a partial upload are still on the farm, so they are kept in the manifest
+    if tree is not None and remote_manifest:
+        manifest["dirs"] = remote_manifest["dirs"] + [path for path in local_manifest["dirs"] if path not in known_dirs]
+        manifest["files"] = {**remote_manifest["files"], **local_manifest["files"]}
+        manifest["objects"] = manifest["objects"] or bool(remote_manifest.get("objects"))
+
+    failed = False
+    for path, result in zip(changed, results):
+        if result["error"] is not None:
+            manifest["files"].pop(path)
+            failed = True
+
+    # If anything failed, it isn't certain that the new directories were created, so they are created again next time
+    if failed:
+        manifest["dirs"] = [path for path in manifest["dirs"] if path in known_dirs]
+
+    sftp_save_manifest(sftp, manifest_path, manifest)
+
+    return results
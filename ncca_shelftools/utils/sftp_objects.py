@@ -0,0 +1,250 @@
+# Students often submit several versions of the same shot as different projects, which all use the same textures and caches.
+# With UPLOAD_OBJECT_STORE turned on (see /ncca_shelftools/config/renderfarm.py), every file is stored once in /home/username/farm/.objects,
+# named after the hash of its contents. A project is then made of links to those files, created in one batch over an SSH exec channel.
+# Files that are already in the store, from this project or any other, are never uploaded again.
+#
+# When a project is deleted in the viewer, sftp_collect_garbage removes the stored files that no project links to anymore.
+# An upload can be running at the same time, so files that were uploaded or reused within OBJECT_STORE_GC_GRACE minutes are kept.
+# Reusing a stored file is recorded in a '.reused' file next to it, as touching the stored file would also change every project file linked to it.
+
+import os, hashlib, posixpath, shlex
+
+from config import *
+from .sftp_utils import *
+from .sftp_exec import *
+from .sftp_transfer import *
+
+def hash_file(local_path="", chunk_size=1024 * 1024):
+    """
+    Compute the content hash of a local file.
+
+    Args:
+    - local_path (str): Path to the local file.
+    - chunk_size (int): Number of bytes read at a time.
+
+    Returns:
+    - str: The hex digest of the file contents.
+    """
+    file_hash = hashlib.sha1()
+    with open(local_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+# Added to the path of a stored file for the file that records when an upload last reused it
+OBJECT_REUSED_SUFFIX = ".reused"
+
+def get_object_store_path(username=""):
+    """
+    Get the path of a user's object store on the renderfarm.
+
+    Args:
+    - username (str): The username of the farm directory.
+
+    Returns:
+    - str: /home/username/farm/.objects
+    """
+    return posixpath.join(get_farm_dir(username), OBJECT_STORE_DIR)
+
+def get_object_path(store_path="", digest=""):
+    """
+    Get the path of a stored file. Files are spread over folders named after the first two characters of their hash, so no folder gets too large.
+
+    Args:
+    - store_path (str): Path to the object store.
+    - digest (str): The content hash of the file.
+
+    Returns:
+    - str: The remote path of the stored file.
+    """
+    return posixpath.join(store_path, digest[:2], digest)
+
+def sftp_missing_objects(sftp=None, object_paths=[]):
+    """
+    Find which stored files don't exist yet.
+
+    Args:
+    - sftp: SFTP connection object.
+    - object_paths (list): Remote paths of the stored files to check.
+
+    Returns:
+    - set: The paths that don't exist.
+    """
+    if not object_paths:
+        return set()
+
+    # A single command checks every path, instead of one SFTP request per file.
+    # Files that exist are marked as reused, so sftp_collect_garbage doesn't remove them before the upload links them
+    command = f'while IFS= read -r path; do if [ -f "$path" ]; then : > "$path{OBJECT_REUSED_SUFFIX}"; else printf "%s\\n" "$path"; fi; done'
+    stdin_data = "".join(path + "\n" for path in object_paths).encode()
+
+    try:
+        exit_status, stdout, stderr = ssh_exec(sftp_get_transport(sftp), command, stdin_data)
+        if exit_status == 0:
+            return set(stdout.decode().splitlines())
+    except NCCA_ExecUnavailableException:
+        pass
+
+    return {path for path in object_paths if sftp_stat(sftp, path) is None}
+
+def sftp_link_objects(sftp=None, dirs=[], links=[], link_type=OBJECT_STORE_LINK):
+    """
+    Create the project's directories and link every project file to its stored file, with a single shell script.
+    If the server does not allow exec channels, symbolic links are made over SFTP instead, as SFTP can't make hard links.
+
+    Args:
+    - sftp: SFTP connection object.
+    - dirs (list): Remote directories to create. Parents must come before their children.
+    - links (list): List of (object_path, remote_path) tuples.
+    - link_type (str): 'hardlink' or 'symlink'.
+
+    Returns:
+    - dict: The error for every remote path that could not be linked.
+    """
+    link_command = "ln -sf" if link_type == "symlink" else "ln -f"
+
+    script = []
+    for remote_dir in dirs:
+        script.append(f"mkdir -p -- {shlex.quote(remote_dir)}")
+    for object_path, remote_path in links:
+        # A file that couldn't be linked is printed, so it can be reported as failed
+        script.append(f"{link_command} -- {shlex.quote(object_path)} {shlex.quote(remote_path)} || printf '%s\\n' {shlex.quote(remote_path)}")
+
+    try:
+        exit_status, stdout, stderr = ssh_exec(sftp_get_transport(sftp), "sh -s", "\n".join(script).encode() + b"\n")
+    except NCCA_ExecUnavailableException:
+        sftp_makedirs(sftp, dirs)
+
+        errors = {}
+        for object_path, remote_path in links:
+            try:
+                # An existing file has to be removed first, writing into it would change the stored file too
+                if sftp_stat(sftp, remote_path) is not None:
+                    sftp.remove(remote_path)
+                sftp.symlink(object_path, remote_path)
+            except IOError as e:
+                errors[remote_path] = e
+        return errors
+
+    error = IOError(f"Failed to link to the object store: {stderr.decode(errors='replace')}")
+    return {remote_path: error for remote_path in stdout.decode().splitlines()}
+
+def sftp_upload_objects(sftp=None, store_path="", dirs=[], files=[], workers=UPLOAD_WORKERS, progress=None, digests={}, link_type=OBJECT_STORE_LINK):
+    """
+    Upload files through the object store. Only files whose contents aren't in the store yet are uploaded, then every file is linked into the project.
+
+    Args:
+    - sftp: SFTP connection object.
+    - store_path (str): Path to the object store, see get_object_store_path.
+    - dirs (list): List of remote directories.
+    - files (list): List of (local_path, remote_path) tuples.
+    - workers (int): Maximum number of files uploaded at the same time.
+    - progress (TransferProgress): Optional progress, updated as bytes are sent. Cancelling it stops the upload.
+    - digests (dict): Content hashes that are already known, keyed by local path.
+    - link_type (str): 'hardlink' or 'symlink'.
+
+    Returns:
+    - list: One result per file, in the same order as files, in the same format as sftp_upload_files.
+    """
+    if progress is not None:
+        progress.set_stage(NCCA_UPLOAD_STAGE_HASHING)
+
+    results = [{"local_path": local_item_path, "remote_path": remote_item_path, "size": 0, "error": None} for local_item_path, remote_item_path in files]
+
+    # Hash every file, so files with the same contents are only uploaded once
+    object_paths = []
+    for result in results:
+        try:
+            if progress is not None:
+                progress.check_cancelled()
+            result["size"] = os.path.getsize(result["local_path"])
+            digest = digests.get(result["local_path"]) or hash_file(result["local_path"])
+            object_paths.append(get_object_path(store_path, digest))
+        except Exception as e:
+            result["error"] = e
+            object_paths.append(None)
+
+    unique_objects = {}
+    for result, object_path in zip(results, object_paths):
+        if object_path is not None and object_path not in unique_objects:
+            unique_objects[object_path] = result["local_path"]
+
+    missing = sftp_missing_objects(sftp, list(unique_objects))
+
+    if progress is not None:
+        progress.set_stage(NCCA_UPLOAD_STAGE_UPLOADING)
+
+    # Stored files are uploaded to a '.part' file first, so a cancelled upload never leaves a broken file in the store
+    sftp_makedirs(sftp, [store_path] + sorted({posixpath.dirname(object_path) for object_path in missing}))
+    uploads = [(unique_objects[object_path], object_path + ".part") for object_path in sorted(missing)]
+
+    object_errors = {}
+    for upload_result in sftp_upload_files(sftp, uploads, workers, progress):
+        object_path = upload_result["remote_path"][:-len(".part")]
+        if upload_result["error"] is None:
+            try:
+                sftp.posix_rename(upload_result["remote_path"], object_path)
+            except IOError as e:
+                upload_result["error"] = e
+        if upload_result["error"] is not None:
+            object_errors[object_path] = upload_result["error"]
+
+    # Link every file whose contents made it into the store
+    links = []
+    for result, object_path in zip(results, object_paths):
+        if result["error"] is not None:
+            continue
+        if object_path in object_errors:
+            result["error"] = object_errors[object_path]
+        elif progress is not None and progress.cancelled:
+            result["error"] = NCCA_TransferCancelledException("The upload was cancelled.")
+        else:
+            links.append((object_path, result["remote_path"]))
+
+    link_errors = sftp_link_objects(sftp, dirs, links, link_type)
+    for result in results:
+        if result["remote_path"] in link_errors:
+            result["error"] = link_errors[result["remote_path"]]
+
+    return results
+
+def sftp_collect_garbage(sftp=None, username=""):
+    """
+    Remove the stored files that no project links to anymore.
+    A stored file is in use if it has another hard link, or a symbolic link in the farm directory points to it.
+    Files uploaded or reused within OBJECT_STORE_GC_GRACE minutes are kept, as an upload may not have linked them yet.
+
+    Args:
+    - sftp: SFTP connection object.
+    - username (str): The username of the farm directory.
+
+    Returns:
+    - bool: True if the store was cleaned, False if the server does not allow exec channels.
+    """
+    farm_dir = shlex.quote(get_farm_dir(username))
+    store_path = shlex.quote(get_object_store_path(username))
+
+    script = f"""
+[ -d {store_path} ] || exit 0
+refs=$(mktemp) || exit 1
+find {farm_dir} -path {store_path} -prune -o -type l -printf '%l\\n' | sort -u > "$refs"
+find {store_path} -type f -links 1 ! -name '*.part' ! -name '*{OBJECT_REUSED_SUFFIX}' -mmin +{OBJECT_STORE_GC_GRACE} | sort | comm -23 - "$refs" | while IFS= read -r path; do
+    [ -n "$(find "$path{OBJECT_REUSED_SUFFIX}" -mmin -{OBJECT_STORE_GC_GRACE} 2>/dev/null)" ] && continue
+    rm -f -- "$path" "$path{OBJECT_REUSED_SUFFIX}"
+done
+find {store_path} -type f -name '*{OBJECT_REUSED_SUFFIX}' -mmin +{OBJECT_STORE_GC_GRACE} -exec rm -f -- {{}} +
+rm -f "$refs"
+# Uploads that were cancelled. A '.part' file that is still being written is newer than the grace period
+find {store_path} -type f -name '*.part' -mmin +{OBJECT_STORE_GC_GRACE} -exec rm -f -- {{}} +
+"""
+
+    try:
+        exit_status, stdout, stderr = ssh_exec(sftp_get_transport(sftp), "sh -s", script.encode())
+    except NCCA_ExecUnavailableException:
+        return False
+
+    if exit_status != 0:
+        print(f"Failed to clean the object store: {stderr.decode(errors='replace')}")
+        return False
+
+    return True
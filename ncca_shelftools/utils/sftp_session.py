@@ -0,0 +1,444 @@
+# Every tool used to log in with its own paramiko Transport, so each launch paid for a new SSH handshake, and an idle connection
+# would time out part way through browsing the viewer.
+# The session manager keeps one authenticated Transport per user for the whole Maya or Houdini session, shared by every tool.
+# The Transport sends keepalives so it isn't dropped while idle, and SFTP channels are handed out from a small pool.
+#
+# Tools are given a SessionSFTPClient, which behaves like a paramiko SFTPClient but reconnects if the connection has died.
+# paramiko SFTPClients are not thread-safe, so each thread that uses it is given its own channel from the pool.
+#
+# Every step of connecting has a timeout, so an unreachable renderfarm fails quickly instead of waiting for the operating system to give up.
+# Failed connections are tried again with exponential backoff, and the time spent in each step is printed, to help tell a slow network from a slow server.
+# The settings can be found in /ncca_shelftools/config/renderfarm.py
+
+import atexit, random, socket, threading, time, weakref
+
+from config import *
+import profiling
+
+def get_backoff_delay(attempt=0):
+    """
+    Get the delay before trying to connect again. The delay doubles after each attempt, and a random part is added
+    so tools that lost their connection at the same time don't all reconnect at the same time.
+
+    Args:
+    - attempt (int): The number of the attempt that just failed, starting at 0.
+
+    Returns:
+    - float: The delay in seconds.
+    """
+    delay = min(CONNECTION_BACKOFF_MAX, CONNECTION_BACKOFF * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def format_timings(timings={}):
+    """
+    Format the time spent in each step of connecting, e.g. 'DNS lookup 0.01s, TCP connect 0.02s'.
+    """
+    return ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items())
+
+class RenderFarmSession():
+    """
+    An authenticated connection to the renderfarm, with a pool of SFTP channels.
+    """
+
+    def __init__(self, username="", password="", address=RENDERFARM_ADDRESS, port=RENDERFARM_PORT):
+        """
+        Initialize RenderFarmSession instance. Call connect to log in.
+
+        Args:
+        - username (str): The username to log in with.
+        - password (str): The password to log in with. It is kept in memory so the session can reconnect.
+        - address (str): The address of the renderfarm.
+        - port (int): The SSH port of the renderfarm.
+        """
+        self.username = username
+        self.password = password
+        self.address = address
+        self.port = port
+
+        self.lock = threading.RLock()
+        self.transport = None
+        self.timings = {}
+        self.pool = []
+        self.sftp = SessionSFTPClient(self)
+
+    def connect(self, progress=None):
+        """
+        Open a new Transport and log in, replacing the old one.
+
+        Args:
+        - progress: Optional function called with a message as each step of connecting starts.
+
+        Raises:
+        - paramiko.AuthenticationException: If the username or password is wrong.
+        - paramiko.SSHException, socket.error: If the renderfarm can't be reached, or a step took too long.
+        """
+        import paramiko
+
+        report = progress if progress is not None else (lambda message: None)
+
+        with self.lock, profiling.section("connect", "network"):
+            self.close()
+
+            timings = {}
+            transport = None
+            connection = None
+            step = None
+            step_start = time.perf_counter()
+
+            def start_step(name, message):
+                # Record how long the previous step took
+                nonlocal step, step_start
+                now = time.perf_counter()
+                if step is not None:
+                    timings[step] = now - step_start
+                step, step_start = name, now
+                report(message)
+
+            try:
+                start_step("DNS lookup", NCCA_LOGIN_STAGE_LOOKUP.format(self.address))
+                addresses = socket.getaddrinfo(self.address, self.port, 0, socket.SOCK_STREAM)
+
+                start_step("TCP connect", NCCA_LOGIN_STAGE_CONNECTING.format(self.address))
+                connection = self.open_socket(addresses)
+
+                start_step("key exchange", NCCA_LOGIN_STAGE_HANDSHAKE)
+                transport = paramiko.Transport(connection)
+                transport.banner_timeout = CONNECT_TIMEOUT
+                transport.set_keepalive(SESSION_KEEPALIVE_INTERVAL)
+
+                # start_client returns quietly when its own timeout runs out, so wait for the key exchange here instead
+                negotiated = threading.Event()
+                transport.start_client(event=negotiated)
+                if not negotiated.wait(CONNECT_TIMEOUT):
+                    raise paramiko.SSHException(f"The key exchange took longer than {CONNECT_TIMEOUT} seconds")
+                if not transport.is_active():
+                    raise transport.get_exception() or paramiko.SSHException("The key exchange failed")
+
+                start_step("authentication", NCCA_LOGIN_STAGE_AUTHENTICATING)
+                transport.auth_timeout = AUTH_TIMEOUT
+                transport.auth_password(self.username, self.password)
+
+                timings[step] = time.perf_counter() - step_start
+            except Exception as e:
+                timings[step] = time.perf_counter() - step_start
+                if transport is not None:
+                    transport.close()
+                elif connection is not None:
+                    connection.close()
+                print(f"Failed to connect to {self.address} during {step} ({format_timings(timings)}): {e}")
+                raise
+
+            print(f"Connected to {self.address} in {sum(timings.values()):.2f}s ({format_timings(timings)})")
+
+            self.transport = transport
+            self.timings = timings
+
+    def open_socket(self, addresses=[]):
+        """
+        Open a TCP connection to the first address that answers within CONNECT_TIMEOUT seconds.
+
+        Args:
+        - addresses (list): The addresses from socket.getaddrinfo.
+
+        Returns:
+        - socket.socket: The connected socket.
+        """
+        error = socket.error(f"No addresses found for {self.address}")
+
+        for family, socket_type, protocol, canonical_name, address in addresses:
+            connection = socket.socket(family, socket_type, protocol)
+            connection.settimeout(CONNECT_TIMEOUT)
+            try:
+                connection.connect(address)
+                return connection
+            except socket.error as e:
+                connection.close()
+                error = e
+
+        raise error
+
+    def is_active(self):
+        """
+        Check if the Transport is still connected.
+
+        Returns:
+        - bool: True if the session is connected and logged in.
+        """
+        return self.transport is not None and self.transport.is_active() and self.transport.is_authenticated()
+
+    def ensure_connected(self, progress=None):
+        """
+        Reconnect if the Transport has died, trying up to MAX_CONNECTION_ATTEMPTS times with a growing delay between attempts.
+
+        Args:
+        - progress: Optional function called with a message as each step of connecting starts.
+        """
+        import paramiko
+
+        with self.lock:
+            if self.is_active():
+                return
+
+            for attempt in range(MAX_CONNECTION_ATTEMPTS):
+                try:
+                    self.connect(progress)
+                    return
+                except paramiko.AuthenticationException:
+                    raise
+                except (paramiko.SSHException, socket.error):
+                    if attempt >= MAX_CONNECTION_ATTEMPTS - 1:
+                        raise
+
+                delay = get_backoff_delay(attempt)
+                if progress is not None:
+                    progress(NCCA_LOGIN_STAGE_RETRYING.format(delay, attempt + 2, MAX_CONNECTION_ATTEMPTS))
+                time.sleep(delay)
+
+    def get_transport(self):
+        """
+        Get the Transport, reconnecting first if it has died.
+
+        Returns:
+        - paramiko.Transport: The session's Transport.
+        """
+        self.ensure_connected()
+        return self.transport
+
+    def is_channel_usable(self, client=None):
+        """
+        Check if an SFTP channel belongs to the current Transport and is still open.
+        """
+        channel = client.get_channel()
+        return self.is_active() and not channel.closed and channel.get_transport() is self.transport
+
+    def acquire_sftp(self):
+        """
+        Get an SFTP channel from the pool, or open a new one. Give it back with release_sftp when it is no longer needed.
+
+        Returns:
+        - paramiko.SFTPClient: The SFTP channel.
+        """
+        import paramiko
+
+        with self.lock:
+            self.ensure_connected()
+
+            while self.pool:
+                client = self.pool.pop()
+                if self.is_channel_usable(client):
+                    return client
+                client.close()
+
+            return paramiko.SFTPClient.from_transport(self.transport)
+
+    def release_sftp(self, client=None):
+        """
+        Give an SFTP channel from acquire_sftp back to the pool. It is closed if the pool is full or the channel has died.
+        """
+        with self.lock:
+            if len(self.pool) < SESSION_POOL_SIZE and self.is_channel_usable(client):
+                self.pool.append(client)
+                return
+
+        client.close()
+
+    def get_login_info(self):
+        """
+        Get the login info that the tools are created with.
+
+        Returns:
+        - dict: Dictionary containing 'username', 'sftp' and 'session' keys.
+        """
+        return {"username": self.username, "sftp": self.sftp, "session": self}
+
+    def close(self):
+        """
+        Close every channel and the Transport.
+        """
+        with self.lock:
+            for client in self.pool:
+                client.close()
+            self.pool = []
+
+            self.sftp.close_client()
+
+            if self.transport is not None:
+                self.transport.close()
+                self.transport = None
+
+# SFTP calls that only read, so they can safely be sent again after the connection drops.
+# Other calls, such as put, remove or mkdir, may have reached the renderfarm before the connection died, so the caller decides what to do.
+RETRY_SFTP_METHODS = {"stat", "lstat", "listdir", "listdir_attr", "listdir_iter", "normalize", "readlink"}
+
+class ThreadSFTPChannel():
+    """
+    The SFTP channel one thread uses through SessionSFTPClient. When the thread finishes, the channel is given back to the session's pool.
+    """
+
+    def __init__(self, session=None, client=None):
+        """
+        Initialize ThreadSFTPChannel instance.
+
+        Args:
+        - session (RenderFarmSession): The session the channel came from.
+        - client (paramiko.SFTPClient): The SFTP channel, from acquire_sftp.
+        """
+        self.session = session
+        self.client = client
+
+    def __del__(self):
+        # Called when the thread's local storage is cleared, which may be during interpreter shutdown
+        try:
+            self.session.release_sftp(self.client)
+        except Exception:
+            pass
+
+class SessionSFTPClient():
+    """
+    Stands in for a paramiko SFTPClient. Every method is passed on to an SFTP channel of the session, reconnecting first if the connection has died.
+    If a call in RETRY_SFTP_METHODS fails because the connection died while it was running, it is tried once more on a new channel.
+    A paramiko SFTPClient can't be used by two threads at once, so each thread gets its own channel from the session's pool.
+    """
+
+    def __init__(self, session=None):
+        """
+        Initialize SessionSFTPClient instance.
+
+        Args:
+        - session (RenderFarmSession): The session to open channels on.
+        """
+        self.session = session
+        self.local = threading.local()
+        self.channels = weakref.WeakSet()  # The ThreadSFTPChannel of every thread, so close_client can close them all
+
+    def get_client(self):
+        """
+        Get the calling thread's SFTP channel, taking a new one from the pool if it doesn't have one or the old one has died.
+
+        Returns:
+        - paramiko.SFTPClient: The SFTP channel.
+        """
+        channel = getattr(self.local, "channel", None)
+        if channel is not None and self.session.is_channel_usable(channel.client):
+            return channel.client
+
+        # The old channel is given back to the pool as it is replaced, which closes it as it has died
+        channel = ThreadSFTPChannel(self.session, self.session.acquire_sftp())
+        self.local.channel = channel
+        with self.session.lock:
+            self.channels.add(channel)
+        return channel.client
+
+    def close_client(self):
+        """
+        Close the SFTP channel of every thread. Each thread takes a new one on its next call.
+        """
+        with self.session.lock:
+            for channel in list(self.channels):
+                channel.client.close()
+
+    def get_channel(self):
+        """
+        Get the channel of the SFTP connection, reconnecting first if it has died. See sftp_get_transport in /ncca_shelftools/utils/sftp_utils.py
+        """
+        return self.get_client().get_channel()
+
+    def __getattr__(self, name):
+        # Only called for attributes SessionSFTPClient doesn't have itself
+        if name.startswith("__") or name in ("session", "local", "channels"):
+            raise AttributeError(name)
+
+        attribute = getattr(self.get_client(), name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            client = self.get_client()
+            try:
+                with profiling.section_once("first SFTP call", "network"):
+                    return getattr(client, name)(*args, **kwargs)
+            except Exception:
+                # Errors such as a missing file are passed on, only a read on a dead connection is retried.
+                # The next call gets a new channel either way
+                if name not in RETRY_SFTP_METHODS or self.session.is_channel_usable(client):
+                    raise
+            return getattr(self.get_client(), name)(*args, **kwargs)
+
+        return call
+
+class RenderFarmSessionManager():
+    """
+    Keeps one RenderFarmSession per user for the whole process.
+    """
+
+    def __init__(self):
+        """
+        Initialize RenderFarmSessionManager instance.
+        """
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.last_username = None
+
+    def login(self, username="", password="", progress=None):
+        """
+        Get the session for a user, logging in if there isn't one yet.
+
+        Args:
+        - username (str): The username to log in with.
+        - password (str): The password to log in with.
+        - progress: Optional function called with a message as each step of connecting starts.
+
+        Returns:
+        - RenderFarmSession: The logged in session.
+
+        Raises:
+        - paramiko.AuthenticationException: If the username or password is wrong.
+        - paramiko.SSHException, socket.error: If the renderfarm can't be reached.
+        """
+        with self.lock:
+            session = self.sessions.get(username)
+
+            if session is None or session.password != password:
+                if session is not None:
+                    session.close()
+                session = RenderFarmSession(username, password)
+                session.ensure_connected(progress)
+                self.sessions[username] = session
+            else:
+                session.ensure_connected(progress)
+
+            self.last_username = username
+            return session
+
+    def get_active_session(self):
+        """
+        Get the session of the user that logged in last, so a new tool doesn't have to log in again.
+        This is called on the main thread when a tool opens, so a session whose connection has dropped isn't reconnected here,
+        which could freeze Maya or Houdini for the whole timeout. SessionSFTPClient reconnects when the connection is next used.
+
+        Returns:
+        - RenderFarmSession: The session, or None if nobody has logged in.
+        """
+        with self.lock:
+            return self.sessions.get(self.last_username)
+
+    def close_all(self):
+        """
+        Close every session. This is called when Maya or Houdini exits.
+        """
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+session_manager = RenderFarmSessionManager()
+atexit.register(session_manager.close_all)
+
+def get_session_manager():
+    """
+    Get the session manager that is shared by every tool in this process.
+
+    Returns:
+    - RenderFarmSessionManager: The session manager.
+    """
+    return session_manager
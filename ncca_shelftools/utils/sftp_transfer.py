@@ -0,0 +1,620 @@
+# The transfer engine moves whole projects between the user's machine and the renderfarm.
+# A single SFTP channel can only wait on one file at a time, so large projects spend most of their time waiting on network round trips.
+# Instead, several SFTP channels are opened on the existing paramiko Transport (the one created in /ncca_shelftools/ncca_renderfarm/login.py)
+# and the files are spread across a small pool of worker threads. The number of workers can be found in /ncca_shelftools/config/renderfarm.py
+#
+# For projects made of many tiny files, the cost of each SFTP request is larger than the file itself.
+# These projects are instead sent as a single tar stream through an SSH exec channel, straight into 'tar -x' on the farm.
+# The archive is built on the fly while it is being sent, so it is never written to the local disk.
+#
+# Downloads ask for the blocks of a file ahead of time (prefetching), instead of waiting for each block before asking for the next.
+# They are written to a '.part' file first, so a dropped connection on a large render can resume from where it stopped.
+
+import os, json, threading, time, shlex, socket
+from concurrent.futures import ThreadPoolExecutor
+
+from config import *
+from .sftp_utils import *
+from .sftp_exec import *
+from .ignore import *
+
+class NCCA_TransferCancelledException(Exception):
+    """
+    Custom exception for files that were not transferred because the user cancelled.
+    """
+    pass
+
+class TransferProgress:
+    """
+    Keeps track of how far an upload has got, so it can be shown to the user while it runs.
+
+    The upload functions below update it from their worker threads, and it calls callback with a snapshot
+    (see snapshot) at most once every interval seconds. It is also used to cancel an upload that is running.
+    """
+
+    def __init__(self, callback=None, interval=0.1):
+        """
+        Initialize TransferProgress instance.
+
+        Args:
+        - callback: Optional function called with a snapshot dictionary whenever the progress changes.
+        - interval (float): Minimum number of seconds between two calls to callback.
+        """
+        self.callback = callback
+        self.interval = interval
+        self.lock = threading.Lock()
+
+        self.stage = ""
+        self.total_files = 0
+        self.total_bytes = 0
+        self.files_done = 0
+        self.bytes_sent = 0
+        self.start_time = time.time()
+        self.last_report = 0
+        self.cancelled = False
+
+    def set_stage(self, stage=""):
+        """
+        Set the text describing what the upload is currently doing, e.g. 'Checking for changes'.
+        """
+        self.stage = stage
+        self.report(force=True)
+
+    def begin(self, files=[]):
+        """
+        Start counting a new list of files to transfer.
+
+        Args:
+        - files (list): List of (local_path, remote_path) tuples.
+        """
+        total_bytes = 0
+        for local_item_path, remote_item_path in files:
+            try:
+                total_bytes += os.path.getsize(local_item_path)
+            except OSError:
+                pass
+
+        with self.lock:
+            self.total_files = len(files)
+            self.total_bytes = total_bytes
+            self.files_done = 0
+            self.bytes_sent = 0
+            self.start_time = time.time()
+
+        self.report(force=True)
+
+    def add_bytes(self, count=0):
+        """
+        Add to the number of bytes sent.
+        """
+        with self.lock:
+            self.bytes_sent += count
+        self.report()
+
+    def file_done(self):
+        """
+        Add one to the number of files sent.
+        """
+        with self.lock:
+            self.files_done += 1
+        self.report()
+
+    def cancel(self):
+        """
+        Ask the upload to stop. Files that are already uploaded are kept, so the next incremental upload can continue from here.
+        """
+        self.cancelled = True
+
+    def check_cancelled(self):
+        """
+        Raise NCCA_TransferCancelledException if the upload has been cancelled.
+        """
+        if self.cancelled:
+            raise NCCA_TransferCancelledException("The upload was cancelled.")
+
+    def throughput(self):
+        """
+        Get the average number of bytes sent per second since begin was called.
+        """
+        elapsed = time.time() - self.start_time
+        return self.bytes_sent / elapsed if elapsed > 0 else 0
+
+    def eta(self):
+        """
+        Get the estimated number of seconds left, or None if nothing has been sent yet.
+        """
+        throughput = self.throughput()
+        if throughput <= 0:
+            return None
+        return max(0, self.total_bytes - self.bytes_sent) / throughput
+
+    def snapshot(self):
+        """
+        Get the current progress as a dictionary, which is safe to pass to another thread.
+        """
+        with self.lock:
+            return {
+                "stage": self.stage,
+                "total_files": self.total_files,
+                "total_bytes": self.total_bytes,
+                "files_done": self.files_done,
+                "bytes_sent": self.bytes_sent,
+                "throughput": self.throughput(),
+                "eta": self.eta(),
+                "cancelled": self.cancelled
+            }
+
+    def report(self, force=False):
+        """
+        Call callback with a snapshot, unless it was already called less than interval seconds ago.
+        """
+        if self.callback is None:
+            return
+
+        now = time.time()
+        if not force and now - self.last_report < self.interval:
+            return
+
+        self.last_report = now
+        self.callback(self.snapshot())
+
+def collect_upload_tree(local_path="", remote_path="", ignore=[]):
+    """
+    Walk a local file or directory and work out what needs to be created on the remote SFTP server.
+
+    Args:
+    - local_path (str): Path to the local file or directory.
+    - remote_path (str): Path the file or directory will be uploaded to on the remote server.
+    - ignore: IgnoreRules, or a list of ignore patterns (see /ncca_shelftools/utils/ignore.py).
+
+    Returns:
+    - tuple: (dirs, files). dirs is a list of remote directories, ordered so that parents come before their children.
+             files is a list of (local_path, remote_path) tuples.
+    """
+    dirs = []
+    files = []
+    rules = get_ignore_rules(ignore)
+
+    if not os.path.isdir(local_path):
+        if not rules.is_ignored(os.path.basename(local_path)):
+            files.append((local_path, remote_path))
+        return dirs, files
+
+    # os.walk is top-down, so every directory is listed before anything inside of it
+    for root, dir_names, file_names in os.walk(local_path):
+        relative_root = os.path.relpath(root, local_path)
+        relative_prefix = "" if relative_root == "." else relative_root.replace("\\", "/") + "/"
+
+        # Prune ignored directories in place so that os.walk never descends into them
+        dir_names[:] = [d for d in dir_names if not rules.is_ignored(relative_prefix + d, True)]
+
+        remote_root = remote_path if relative_root == "." else os.path.join(remote_path, relative_root).replace("\\", "/")
+        dirs.append(remote_root)
+
+        for file_name in file_names:
+            if rules.is_ignored(relative_prefix + file_name):
+                continue
+            files.append((os.path.join(root, file_name), os.path.join(remote_root, file_name).replace("\\", "/")))
+
+    return dirs, files
+
+def sftp_makedirs(sftp=None, dirs=[]):
+    """
+    Create remote directories, skipping any that already exist.
+
+    Args:
+    - sftp: SFTP connection object.
+    - dirs (list): List of remote directories. Parents must come before their children.
+    """
+    for remote_dir in dirs:
+        try:
+            sftp.mkdir(remote_dir)
+        except IOError:
+            # Directory already exists or error occurred (skip creating)
+            pass
+
+def sftp_upload_files(sftp=None, files=[], workers=UPLOAD_WORKERS, progress=None):
+    """
+    Upload a list of files in parallel over several SFTP channels that share the same Transport.
+    The remote directories must already exist, see sftp_makedirs.
+
+    Args:
+    - sftp: SFTP connection object. Its Transport is used to open the extra channels.
+    - files (list): List of (local_path, remote_path) tuples.
+    - workers (int): Maximum number of files uploaded at the same time.
+    - progress (TransferProgress): Optional progress, updated as bytes are sent. Cancelling it stops the upload.
+
+    Returns:
+    - list: One result per file, in the same order as files. Each result is a dictionary with the keys
+            'local_path', 'remote_path', 'size' and 'error' (None if the file was uploaded successfully).
+    """
+    if sftp is None:
+        raise ValueError("SFTP connection object cannot be None.")
+
+    # Every worker thread gets its own SFTP channel, as a channel can only serve one request at a time
+    thread_data = threading.local()
+    channels = []
+    channels_lock = threading.Lock()
+
+    def get_channel():
+        if getattr(thread_data, "sftp", None) is None:
+            thread_data.sftp = sftp_open_channel(sftp)
+            with channels_lock:
+                channels.append(thread_data.sftp)
+        return thread_data.sftp
+
+    def upload(local_path, remote_path):
+        result = {"local_path": local_path, "remote_path": remote_path, "size": 0, "error": None}
+        bytes_sent = [0]
+
+        def callback(transferred, total):
+            progress.add_bytes(transferred - bytes_sent[0])
+            bytes_sent[0] = transferred
+            # Raising here stops the file part way through. It is not added to the manifest, so it is uploaded again next time.
+            progress.check_cancelled()
+
+        try:
+            if progress is not None:
+                progress.check_cancelled()
+
+            result["size"] = os.path.getsize(local_path)
+            get_channel().put(local_path, remote_path, callback=callback if progress is not None else None)
+
+            if progress is not None:
+                progress.file_done()
+        except Exception as e:
+            # A failed file should not stop the rest of the upload, so the error is stored in the result instead
+            result["error"] = e
+        return result
+
+    if progress is not None:
+        progress.begin(files)
+
+    try:
+        if workers <= 1 or len(files) <= 1:
+            thread_data.sftp = sftp
+            return [upload(local_item_path, remote_item_path) for local_item_path, remote_item_path in files]
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            futures = [executor.submit(upload, local_item_path, remote_item_path) for local_item_path, remote_item_path in files]
+            return [future.result() for future in futures]
+    finally:
+        # Only close the channels that were opened here, the login channel is still in use
+        for channel in channels:
+            sftp_close_channel(sftp, channel)
+
+def should_archive_upload(files=[]):
+    """
+    Check if a list of files would upload faster as a single archive.
+
+    Args:
+    - files (list): List of (local_path, remote_path) tuples.
+
+    Returns:
+    - bool: True if there are many files and they are small on average, see ARCHIVE_UPLOAD_MIN_FILES in /ncca_shelftools/config/renderfarm.py
+    """
+    if len(files) < ARCHIVE_UPLOAD_MIN_FILES:
+        return False
+
+    total_size = 0
+    for local_item_path, remote_item_path in files:
+        try:
+            total_size += os.path.getsize(local_item_path)
+        except OSError:
+            pass
+
+    return total_size / len(files) < ARCHIVE_UPLOAD_MAX_AVERAGE_SIZE
+
+def should_compress_archive(files=[]):
+    """
+    Check if an archive of the given files is worth compressing, based on their file types.
+
+    Args:
+    - files (list): List of (local_path, remote_path) tuples.
+
+    Returns:
+    - bool: True if most of the bytes are in files that aren't already compressed, see ARCHIVE_COMPRESSED_EXTENSIONS.
+    """
+    total_size = 0
+    compressible_size = 0
+
+    for local_item_path, remote_item_path in files:
+        try:
+            size = os.path.getsize(local_item_path)
+        except OSError:
+            continue
+
+        total_size += size
+        if os.path.splitext(local_item_path)[1].lower() not in ARCHIVE_COMPRESSED_EXTENSIONS:
+            compressible_size += size
+
+    return compressible_size * 2 >= total_size
+
+def sftp_upload_archive(sftp=None, remote_path="", dirs=[], files=[], compress=None, progress=None):
+    """
+    Upload files as a single tar stream, extracted on the farm by 'tar -x' over an SSH exec channel.
+    If the server does not allow exec channels, the files are uploaded with sftp_upload_files instead.
+
+    Args:
+    - sftp: SFTP connection object.
+    - remote_path (str): The remote directory the archive is extracted into. All dirs and files must be inside of it.
+    - dirs (list): List of remote directories, as returned by collect_upload_tree.
+    - files (list): List of (local_path, remote_path) tuples, as returned by collect_upload_tree.
+    - compress (bool): Whether to gzip the stream. If None, this is chosen with should_compress_archive.
+    - progress (TransferProgress): Optional progress, updated as bytes are sent. Cancelling it stops adding files to the archive.
+
+    Returns:
+    - list: One result per file, in the same format as sftp_upload_files.
+    """
+    if compress is None:
+        compress = should_compress_archive(files)
+
+    quoted_path = shlex.quote(remote_path)
+    command = f"mkdir -p {quoted_path} && tar -x{'z' if compress else ''}f - -C {quoted_path}"
+
+    # Only needed for archive uploads, so they are imported here rather than when the tools open
+    import gzip, tarfile
+
+    try:
+        channel = ssh_open_exec(sftp_get_transport(sftp), command)
+    except NCCA_ExecUnavailableException:
+        sftp_makedirs(sftp, dirs)
+        return sftp_upload_files(sftp, files, progress=progress)
+
+    results = [{"local_path": local_item_path, "remote_path": remote_item_path, "size": 0, "error": None} for local_item_path, remote_item_path in files]
+
+    if progress is not None:
+        progress.begin(files)
+
+    try:
+        channel_file = channel.makefile("wb")
+        # A low compression level keeps the CPU from becoming the bottleneck
+        stream = gzip.GzipFile(fileobj=channel_file, mode="wb", compresslevel=1) if compress else channel_file
+
+        # 'w|' writes the archive as a stream, so nothing is kept in memory or on disk
+        with tarfile.open(fileobj=stream, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+            for remote_dir in dirs:
+                arcname = os.path.relpath(remote_dir, remote_path).replace("\\", "/")
+                if arcname == ".":
+                    continue
+
+                # Add the directories too, so that empty directories are created
+                dir_info = tarfile.TarInfo(arcname)
+                dir_info.type = tarfile.DIRTYPE
+                dir_info.mode = 0o755
+                dir_info.mtime = time.time()
+                tar.addfile(dir_info)
+
+            for result in results:
+                arcname = os.path.relpath(result["remote_path"], remote_path).replace("\\", "/")
+
+                # A file that can't be read only fails itself. Opening it first means the archive is never left half written.
+                try:
+                    if progress is not None:
+                        # After cancelling, the archive is closed normally, so the files already in it are still extracted
+                        progress.check_cancelled()
+                    file = open(result["local_path"], "rb")
+                except (OSError, NCCA_TransferCancelledException) as e:
+                    result["error"] = e
+                    continue
+
+                with file:
+                    # Using the open file follows symbolic links, just like sftp.put does
+                    file_info = tar.gettarinfo(arcname=arcname, fileobj=file)
+                    result["size"] = file_info.size
+                    tar.addfile(file_info, file)
+
+                if progress is not None:
+                    progress.add_bytes(file_info.size)
+                    progress.file_done()
+
+        if compress:
+            stream.close()
+        channel_file.close()
+        channel.shutdown_write()
+
+        exit_status = channel.recv_exit_status()
+        if exit_status != 0:
+            raise IOError(channel.makefile_stderr("rb").read().decode(errors="replace"))
+    except Exception as e:
+        # If the stream breaks, it isn't known which files made it, so every file is marked as failed
+        for result in results:
+            if result["error"] is None:
+                result["error"] = e
+    finally:
+        channel.close()
+
+    return results
+
+def sftp_upload_tree(sftp=None, remote_path="", dirs=[], files=[], workers=UPLOAD_WORKERS, archive=None, progress=None):
+    """
+    Upload the directories and files returned by collect_upload_tree, picking the fastest way to send them.
+
+    Args:
+    - sftp: SFTP connection object.
+    - remote_path (str): The remote directory that all dirs and files are inside of.
+    - dirs (list): List of remote directories.
+    - files (list): List of (local_path, remote_path) tuples.
+    - workers (int): Maximum number of files uploaded at the same time, when not uploading as an archive.
+    - archive (bool): Whether to upload as a single archive. If None, this is chosen with should_archive_upload.
+    - progress (TransferProgress): Optional progress, updated as bytes are sent.
+
+    Returns:
+    - list: The per-file results.
+    """
+    if archive is None:
+        archive = should_archive_upload(files)
+
+    if archive:
+        return sftp_upload_archive(sftp, remote_path, dirs, files, progress=progress)
+
+    sftp_makedirs(sftp, dirs)
+
+    return sftp_upload_files(sftp, files, workers, progress)
+
+def sftp_upload(sftp=None, local_path="", remote_path="", ignore=[], workers=UPLOAD_WORKERS, archive=None, progress=None):
+    """
+    Upload a file or directory from the local machine to the remote SFTP server,
+    with the option to ignore specific files or directories.
+
+    Remote directories are created before their files, and the files are then uploaded in parallel,
+    or as a single archive if the project is made of many small files.
+
+    Args:
+    - sftp: SFTP connection object.
+    - local_path (str): Path to the local file or directory.
+    - remote_path (str): Path to save the uploaded file or directory on the remote server.
+    - ignore: IgnoreRules, or a list of ignore patterns (see /ncca_shelftools/utils/ignore.py).
+    - workers (int): Maximum number of files uploaded at the same time.
+    - archive (bool): Whether to upload as a single archive. If None, this is chosen automatically.
+    - progress (TransferProgress): Optional progress, updated as bytes are sent.
+
+    Returns:
+    - list: The per-file results from sftp_upload_tree.
+    """
+    dirs, files = collect_upload_tree(local_path, remote_path, ignore)
+
+    # A single file can't be extracted into a directory, so it is always uploaded directly
+    if not os.path.isdir(local_path):
+        return sftp_upload_files(sftp, files, workers, progress)
+
+    return sftp_upload_tree(sftp, remote_path, dirs, files, workers, archive, progress)
+
+def sftp_upload_failures(results=[]):
+    """
+    Get the results of the files that failed to upload.
+
+    Args:
+    - results (list): The per-file results from sftp_upload, sftp_upload_files or sftp_upload_archive.
+
+    Returns:
+    - list: The results that have an error.
+    """
+    return [result for result in results if result["error"] is not None]
+
+def read_part_info(info_path=""):
+    """
+    Read the size and modified time of the remote file that a '.part' file was downloaded from.
+
+    Args:
+    - info_path (str): Path to the '.part.info' file next to the '.part' file.
+
+    Returns:
+    - dict: {'size': int, 'mtime': int}, or None if there is no info, e.g. the '.part' file was left by an older version of the tools.
+    """
+    try:
+        with open(info_path, "r") as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return None
+
+def sftp_download_file(sftp=None, remote_path="", local_path="", remote_size=None, retries=DOWNLOAD_RETRIES, block_size=DOWNLOAD_BLOCK_SIZE, remote_mtime=None):
+    """
+    Download a single file from the remote SFTP server, with read-ahead and resuming.
+
+    The file is written to local_path + '.part', and only renamed to local_path once its size has been verified.
+    If a '.part' file already exists, the download continues from the end of it, but only if the remote file still has the size and
+    modified time it had when the '.part' file was started (kept in a '.part.info' file), so a re-rendered frame is never joined onto the old one.
+    If the connection drops, a new SFTP channel is opened and the download resumes, up to retries times.
+
+    Args:
+    - sftp: SFTP connection object.
+    - remote_path (str): Path to the remote file.
+    - local_path (str): Path to save the downloaded file locally.
+    - remote_size (int): Size of the remote file, if it is already known (e.g. from sftp_listdir_attr).
+    - retries (int): Number of times to reconnect and resume if the connection drops.
+    - block_size (int): Number of bytes read and written at a time.
+    - remote_mtime (int): Modified time of the remote file, if it is already known.
+
+    Raises:
+    - IOError: If the file can't be downloaded, or the downloaded size does not match the remote size.
+    """
+    import paramiko
+
+    part_path = local_path + ".part"
+    info_path = part_path + ".info"
+    channel = sftp
+    opened_channels = []
+
+    try:
+        for attempt in range(retries + 1):
+            try:
+                if attempt:
+                    # Reconnect on a fresh channel. The '.part' file is kept, so this attempt resumes from its end.
+                    # If the connection can't be opened again yet, this attempt fails like any other.
+                    channel = sftp_open_channel(sftp)
+                    opened_channels.append(channel)
+
+                if remote_size is None or remote_mtime is None:
+                    remote_stat = channel.stat(remote_path)
+                    remote_size, remote_mtime = remote_stat.st_size, remote_stat.st_mtime
+                remote_info = {"size": remote_size, "mtime": remote_mtime}
+
+                # Resume from the end of the partial download, unless the remote file has changed since it was started
+                offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                if offset > remote_size or read_part_info(info_path) != remote_info:
+                    offset = 0
+
+                if not offset:
+                    with open(info_path, "w") as info_file:
+                        json.dump(remote_info, info_file)
+
+                with channel.open(remote_path, "rb") as remote_file, open(part_path, "ab" if offset else "wb") as local_file:
+                    remote_file.seek(offset)
+                    # Queue read requests for the rest of the file, so the server is always sending data
+                    remote_file.prefetch(remote_size)
+
+                    while offset < remote_size:
+                        data = remote_file.read(min(block_size, remote_size - offset))
+                        if not data:
+                            break
+                        local_file.write(data)
+                        offset += len(data)
+                break
+            except (EOFError, socket.timeout, ConnectionError, paramiko.SSHException):
+                if attempt >= retries:
+                    raise
+    finally:
+        for opened_channel in opened_channels:
+            sftp_close_channel(sftp, opened_channel)
+
+    downloaded_size = os.path.getsize(part_path)
+    if downloaded_size != remote_size:
+        raise IOError(f"Downloaded {downloaded_size} of {remote_size} bytes of {remote_path}")
+
+    os.replace(part_path, local_path)
+    os.remove(info_path)
+
+def sftp_download(sftp=None, remote_path="", local_path="", stats=None):
+    """
+    Download a file or directory from the remote SFTP server to the local machine.
+
+    Args:
+    - sftp: SFTP connection object.
+    - remote_path (str): Path to the remote file or directory.
+    - local_path (str): Path to save the downloaded file or directory locally.
+    - stats (dict): Optional stats dictionary from sftp_new_stats.
+
+    Raises:
+    - IOError: If the remote path doesn't exist, or a file can't be downloaded, see sftp_download_file.
+    """
+    # Ensure the SFTP connection object is valid
+    if sftp is None:
+        raise ValueError("SFTP connection object cannot be None.")
+
+    # Failures are raised rather than printed, so the caller can tell the user the download didn't finish
+    remote_stat = sftp_stat(sftp, remote_path, stats)
+    if sftp_entry_isdir(remote_stat):
+        # If it's a directory, create the local directory, and download its contents
+        for dir_path, dirs, files in sftp_walk(sftp, remote_path, stats=stats, follow_links=True):
+            local_dir_path = os.path.join(local_path, os.path.relpath(dir_path, remote_path))
+            os.makedirs(local_dir_path, exist_ok=True)
+
+            # The listing already has the size of each file, so it doesn't need to be requested again
+            for entry in files:
+                sftp_download_file(sftp, dir_path + "/" + entry.filename, os.path.join(local_dir_path, entry.filename), entry.st_size, remote_mtime=entry.st_mtime)
+    elif remote_stat is not None:
+        # If it's a file, download it
+        sftp_download_file(sftp, remote_path, local_path, remote_stat.st_size, remote_mtime=remote_stat.st_mtime)
+    else:
+        raise IOError(f"{remote_path} does not exist")
@@ -1,4 +1,4 @@
-import os, stat
+import stat, threading
 
 def sftp_exists(sftp=None, remote_path=""):
     """
@@ -55,92 +55,201 @@ def sftp_isfile(sftp=None, remote_path=""):
     except FileNotFoundError:
         return False
 
-def sftp_download(sftp=None, remote_path="", local_path=""):
+def sftp_get_transport(sftp=None):
     """
-    Download a file or directory from the remote SFTP server to the local machine.
+    Get the paramiko Transport that an SFTP connection is running on.
+
+    Args:
+    - sftp: SFTP connection object.
+
+    Returns:
+    - paramiko.Transport: The transport the SFTP channel was opened on.
+    """
+    return sftp.get_channel().get_transport()
+
+def sftp_open_channel(sftp=None):
+    """
+    Open another SFTP channel on the same connection as sftp, e.g. for a worker thread.
+    Shared sessions hand out spare channels from their pool instead (see /ncca_shelftools/utils/sftp_session.py).
+
+    Args:
+    - sftp: SFTP connection object.
+
+    Returns:
+    - paramiko.SFTPClient: The new channel. Close it with sftp_close_channel.
+    """
+    import paramiko
+
+    session = getattr(sftp, "session", None)
+    if session is not None:
+        return session.acquire_sftp()
+
+    return paramiko.SFTPClient.from_transport(sftp_get_transport(sftp))
+
+def sftp_close_channel(sftp=None, channel=None):
+    """
+    Close a channel opened with sftp_open_channel, or give it back to the session's pool.
+
+    Args:
+    - sftp: The SFTP connection object the channel was opened from.
+    - channel: The channel to close.
+    """
+    session = getattr(sftp, "session", None)
+    if session is not None:
+        session.release_sftp(channel)
+    else:
+        channel.close()
+
+def sftp_new_stats():
+    """
+    Create a dictionary for counting the network round trips made by the walking functions below.
+
+    Returns:
+    - dict: {'round_trips': 0}. Pass it as the stats argument, and it will be updated as requests are made.
+    """
+    return {"round_trips": 0}
+
+# Stats dictionaries can be shared by several threads, e.g. the viewer's workers
+STATS_LOCK = threading.Lock()
+
+def sftp_count_round_trip(stats=None):
+    """
+    Add one network round trip to a stats dictionary created by sftp_new_stats.
+
+    Args:
+    - stats (dict): The stats dictionary, or None if round trips are not being counted.
+    """
+    if stats is not None:
+        with STATS_LOCK:
+            stats["round_trips"] += 1
+
+class RemoteEntry():
+    """
+    A remote folder entry that didn't come from SFTP, e.g. from the listing cache or ssh_scan_tree.
+    It has the same attributes as the SFTPAttributes returned by sftp_listdir_attr.
+    """
+
+    __slots__ = ("filename", "st_mode", "st_size", "st_mtime")
+
+    def __init__(self, filename="", st_mode=None, st_size=None, st_mtime=None):
+        self.filename = filename
+        self.st_mode = st_mode
+        self.st_size = st_size
+        self.st_mtime = st_mtime
+
+def sftp_entry_isdir(entry=None):
+    """
+    Check if an entry returned by sftp_listdir_attr is a directory. Unlike sftp_isdir, this does not touch the network.
+
+    Args:
+    - entry: SFTPAttributes object.
+
+    Returns:
+    - bool: True if the entry is a directory, False otherwise.
+    """
+    return entry is not None and entry.st_mode is not None and stat.S_ISDIR(entry.st_mode)
+
+def sftp_stat(sftp=None, remote_path="", stats=None):
+    """
+    Get the attributes of a path on the remote SFTP server.
 
     Args:
     - sftp: SFTP connection object.
     - remote_path (str): Path to the remote file or directory.
-    - local_path (str): Path to save the downloaded file or directory locally.
+    - stats (dict): Optional stats dictionary from sftp_new_stats.
+
+    Returns:
+    - SFTPAttributes: The attributes of the path, or None if it does not exist.
     """
-    # Ensure the SFTP connection object is valid
-    if sftp is None:
-        raise ValueError("SFTP connection object cannot be None.")
+    sftp_count_round_trip(stats)
+    try:
+        return sftp.stat(remote_path)
+    except IOError:
+        return None
+
+def sftp_listdir_attr(sftp=None, remote_path="", stats=None, follow_links=False, raise_errors=False):
+    """
+    List a remote directory, with the attributes (mode, size, mtime) of every entry attached.
+    This is one network round trip, where listdir followed by a stat per entry is N+1.
 
+    Args:
+    - sftp: SFTP connection object.
+    - remote_path (str): Path to the remote directory.
+    - stats (dict): Optional stats dictionary from sftp_new_stats.
+    - follow_links (bool): Replace the attributes of symbolic links with the attributes of their target. Each link costs an extra round trip.
+    - raise_errors (bool): Raise the IOError if the directory can't be listed, so a failed listing isn't mistaken for an empty directory.
+
+    Returns:
+    - list: SFTPAttributes objects, with the entry name in their filename attribute. Empty if the directory can't be listed.
+    """
+    sftp_count_round_trip(stats)
     try:
-        # Check if the remote path is a directory
-        if sftp_isdir(sftp, remote_path):  # Directory mode check
-            # If it's a directory, create the local directory
-            os.makedirs(local_path, exist_ok=True)
-            
-            # List contents of the remote directory
-            for item in sftp.listdir(remote_path):
-                remote_item_path = os.path.join(remote_path, item).replace("\\", "/")
-                local_item_path = os.path.join(local_path, item)
-                
-                # Recursively download each item
-                sftp_download(sftp, remote_item_path, local_item_path)
-        else:
-            # If it's a file, download it
-            sftp.get(remote_path, local_path)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        entries = sftp.listdir_attr(remote_path)
+    except IOError as e:
+        if raise_errors:
+            raise
+        print(f"An error occurred: {e}")
+        return []
+
+    if follow_links:
+        for i, entry in enumerate(entries):
+            if entry.st_mode is not None and stat.S_ISLNK(entry.st_mode):
+                target = sftp_stat(sftp, remote_path + "/" + entry.filename, stats)
+                if target is not None:
+                    target.filename = entry.filename
+                    entries[i] = target
+
+    return entries
 
-def sftp_upload(sftp=None, local_path="", remote_path="", ignore=[]):
+def sftp_walk(sftp=None, remote_path="", topdown=True, stats=None, follow_links=False):
     """
-    Recursively upload a file or directory from the local machine to the remote SFTP server,
-    with the option to ignore specific files or directories.
+    Walk a remote directory tree, similar to os.walk. Each directory is listed exactly once with sftp_listdir_attr,
+    so no extra requests are needed to tell files and directories apart.
 
     Args:
     - sftp: SFTP connection object.
-    - local_path (str): Path to the local file or directory.
-    - remote_path (str): Path to save the uploaded file or directory on the remote server.
-    - ignore (list): List of filenames or directory names to ignore during the upload.
-    """
-    # Check if the local path is a directory
-    if os.path.isdir(local_path):
-        # Ensure the remote directory exists
-        try:
-            sftp.mkdir(remote_path)
-        except IOError:
-            # Directory already exists or error occurred (skip creating)
-            pass
-
-        # Iterate over the directory contents
-        for item in os.listdir(local_path):
-            local_item_path = os.path.join(local_path, item)
-            remote_item_path = os.path.join(remote_path, item).replace("\\", "/")
-
-            # Skip the item if it is in the ignore list
-            if item in ignore:
-                continue
-
-            # Recursively upload each file or directory
-            sftp_upload(sftp, local_item_path, remote_item_path, ignore)
-    else:
-        # Upload the file if it is not in the ignore list
-        if os.path.basename(local_path) not in ignore:
-            sftp.put(local_path, remote_path)
+    - remote_path (str): Path to the remote directory to walk.
+    - topdown (bool): If True, a directory is yielded before its subdirectories. If False, after them.
+    - stats (dict): Optional stats dictionary from sftp_new_stats.
+    - follow_links (bool): Treat symbolic links to directories as directories.
+
+    Yields:
+    - tuple: (dir_path, dirs, files), where dirs and files are lists of SFTPAttributes.
+             When topdown is True, entries can be removed from dirs to stop the walk descending into them.
+    """
+    entries = sftp_listdir_attr(sftp, remote_path, stats, follow_links)
+
+    dirs = [entry for entry in entries if sftp_entry_isdir(entry)]
+    files = [entry for entry in entries if not sftp_entry_isdir(entry)]
 
+    if topdown:
+        yield remote_path, dirs, files
 
-def sftp_delete(sftp, remote_path):
+    for entry in dirs:
+        yield from sftp_walk(sftp, remote_path.rstrip("/") + "/" + entry.filename, topdown, stats, follow_links)
+
+    if not topdown:
+        yield remote_path, dirs, files
+
+def sftp_delete(sftp, remote_path, stats=None):
     """
     Recursively delete a file or directory on the remote SFTP server.
 
     Args:
     - sftp: SFTP connection object.
     - remote_path (str): Path to the remote file or directory to delete.
+    - stats (dict): Optional stats dictionary from sftp_new_stats.
     """
     try:
-        if sftp_isdir(sftp, remote_path):
-            # If it's a directory, list all its contents
-            for item in sftp.listdir(remote_path):
-                item_path = remote_path + "/" + item
-                sftp_delete(sftp, item_path)  # Recursively delete each item
-            
-            # After all contents are deleted, remove the directory itself
-            sftp.rmdir(remote_path)
+        # Symbolic links are deleted, not followed, so lstat is used here
+        sftp_count_round_trip(stats)
+        if stat.S_ISDIR(sftp.lstat(remote_path).st_mode):
+            # Walk bottom-up, so every directory is already empty by the time it is removed
+            for dir_path, dirs, files in sftp_walk(sftp, remote_path, topdown=False, stats=stats):
+                for entry in files:
+                    sftp.remove(dir_path + "/" + entry.filename)
+
+                sftp.rmdir(dir_path)
         else:
             # If it's a file, delete it
             sftp.remove(remote_path)
@@ -173,16 +282,20 @@ def sftp_setup(sftp=None, username=""):
     PROJECT_DIR = FARM_DIR + "/projects"
     OUTPUT_DIR = FARM_DIR + "/output"
 
-    # Check if the farm directory exists, and create it if it does not
-    if not sftp_exists(sftp, FARM_DIR):
+    # Listing the farm directory checks for all three directories in a single request
+    try:
+        farm_entries = [entry.filename for entry in sftp.listdir_attr(FARM_DIR) if sftp_entry_isdir(entry)]
+    except IOError:
+        # Create the farm directory if it does not exist
         sftp.mkdir(FARM_DIR)
+        farm_entries = []
 
     # Check if the project directory exists, and create it if it does not
-    if not sftp_exists(sftp, PROJECT_DIR):
+    if "projects" not in farm_entries:
         sftp.mkdir(PROJECT_DIR)
     
     # Check if the output directory exists, and create it if it does not
-    if not sftp_exists(sftp, OUTPUT_DIR):
+    if "output" not in farm_entries:
         sftp.mkdir(OUTPUT_DIR)
 
 